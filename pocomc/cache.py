@@ -0,0 +1,188 @@
+import os
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+
+class LikelihoodCache:
+    """
+    Persistent on-disk cache of log-likelihood values.
+
+    Values are stored in an SQLite database and keyed by a hash of the
+    parameter vector together with a user-supplied likelihood version tag,
+    so that a run that crashed between checkpoints, or a rerun with different
+    sampler settings, does not pay again for likelihood evaluations that have
+    already been computed. Changing the version tag invalidates all previous
+    entries without deleting them.
+
+    Parameters
+    ----------
+    path : ``str`` or ``Path``
+        Path of the database file. The file is created if it does not exist.
+    version : ``str``
+        Likelihood version tag (default is ``version=""``). Entries written
+        with a different tag are never returned.
+    timeout : ``float``
+        Number of seconds to wait for a lock held by another process before
+        raising an error (default is ``timeout=60.0``).
+
+    Attributes
+    ----------
+    hits : ``int``
+        Number of parameter vectors found in the cache.
+    misses : ``int``
+        Number of parameter vectors not found in the cache.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pocomc.cache import LikelihoodCache
+    >>> cache = LikelihoodCache("logl.db", version="v1")
+    >>> x = np.random.randn(4, 2)
+    >>> cache.put(x, np.zeros(4))
+    >>> logl, found = cache.get(x)
+    >>> found
+    array([ True,  True,  True,  True])
+
+    Notes
+    -----
+    The database is opened lazily and separately in every process, and the
+    connection is dropped when the object is pickled, so the cache can be
+    shipped to pool workers or saved along with the sampler state. Writes use
+    SQLite's write-ahead log so that concurrent readers and writers from
+    different processes do not corrupt the file.
+    """
+
+    _max_variables = 500
+
+    def __init__(self,
+                 path: Union[str, Path],
+                 version: str = "",
+                 timeout: float = 60.0):
+        self.path = str(path)
+        self.version = str(version)
+        self.timeout = float(timeout)
+        self.hits = 0
+        self.misses = 0
+
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        """
+        Return a connection to the database, opening it if needed.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS logl (key BLOB PRIMARY KEY, value REAL NOT NULL)")
+            connection.commit()
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def keys(self, x: np.ndarray):
+        """
+        Compute the cache keys of a batch of parameter vectors.
+
+        Parameters
+        ----------
+        x : ``np.ndarray``
+            Array of shape ``(n, n_dim)`` of parameter vectors.
+
+        Returns
+        -------
+        keys : ``list``
+            List of ``n`` keys.
+        """
+        x = np.ascontiguousarray(np.atleast_2d(x), dtype=np.float64)
+        tag = self.version.encode() + b"\x00"
+        return [hashlib.blake2b(tag + row.tobytes(), digest_size=16).digest() for row in x]
+
+    def get(self, x: np.ndarray):
+        """
+        Look up a batch of parameter vectors.
+
+        Parameters
+        ----------
+        x : ``np.ndarray``
+            Array of shape ``(n, n_dim)`` of parameter vectors.
+
+        Returns
+        -------
+        logl : ``np.ndarray``
+            Array of shape ``(n,)`` with the cached log-likelihood values
+            (``nan`` for vectors that are not in the cache).
+        found : ``np.ndarray``
+            Boolean array of shape ``(n,)`` that is True for cached vectors.
+        """
+        keys = self.keys(x)
+        values = dict()
+        connection = self._connect()
+        for i in range(0, len(keys), self._max_variables):
+            chunk = keys[i:i + self._max_variables]
+            query = "SELECT key, value FROM logl WHERE key IN (%s)" % ",".join("?" * len(chunk))
+            values.update(connection.execute(query, chunk).fetchall())
+
+        logl = np.array([values.get(key, np.nan) for key in keys], dtype=np.float64)
+        found = np.array([key in values for key in keys], dtype=bool)
+
+        self.hits += int(np.sum(found))
+        self.misses += int(np.sum(~found))
+
+        return logl, found
+
+    def put(self, x: np.ndarray, logl: np.ndarray):
+        """
+        Store a batch of log-likelihood values.
+
+        Parameters
+        ----------
+        x : ``np.ndarray``
+            Array of shape ``(n, n_dim)`` of parameter vectors.
+        logl : ``np.ndarray``
+            Array of shape ``(n,)`` of log-likelihood values.
+        """
+        keys = self.keys(x)
+        logl = np.asarray(logl, dtype=np.float64).reshape(-1)
+        if len(keys) == 0:
+            return
+        connection = self._connect()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO logl (key, value) VALUES (?, ?)",
+                                   zip(keys, logl.tolist()))
+
+    def clear(self):
+        """
+        Remove all entries from the cache, regardless of their version tag.
+        """
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM logl")
+
+    def close(self):
+        """
+        Close the database connection of the current process.
+        """
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+    def __len__(self):
+        connection = self._connect()
+        return connection.execute("SELECT COUNT(*) FROM logl").fetchone()[0]
+
+    def __getstate__(self):
+        """
+        Get state information for pickling.
+        """
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
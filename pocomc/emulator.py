@@ -0,0 +1,228 @@
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+
+
+class Emulator:
+    """
+    Surrogate model of the log-likelihood.
+
+    The emulator is a Bayesian linear regression on random Fourier features
+    (plus linear and quadratic terms), trained on the ``(x, logl)`` pairs of
+    the particle history. It predicts the log-likelihood together with its
+    uncertainty and is used as the approximate likelihood of delayed acceptance
+    MCMC.
+
+    Parameters
+    ----------
+    n_dim : ``int``
+        Number of parameters/dimensions.
+    n_features : ``int``
+        Number of random Fourier features (default is ``n_features=256``).
+    max_samples : ``int``
+        Maximum number of (most recent) samples used for training
+        (default is ``max_samples=4096``; ``Sampler`` uses ``8 * n_effective``).
+    validation_split : ``float``
+        Fraction of samples held out to estimate the prediction error
+        (default is ``validation_split=0.2``).
+    tolerance : ``float``
+        Maximum tolerated prediction error of the tempered log-likelihood, i.e.
+        ``beta`` times the error of the log-likelihood, in nats (default is
+        ``tolerance=1.0``). Above it the emulator is not used.
+    regularization : ``float``
+        Ridge regularization strength per training sample (default is ``regularization=1e-4``).
+    random_state : ``int`` or ``None``
+        Random seed used to draw the random features.
+
+    Attributes
+    ----------
+    trained : ``bool``
+        Whether the emulator has been trained.
+    error : ``float``
+        Root mean squared prediction error of the log-likelihood on held-out samples.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pocomc.emulator import Emulator
+    >>> x = np.random.randn(1000, 2)
+    >>> logl = -0.5 * np.sum(x ** 2, axis=1)
+    >>> emulator = Emulator(2)
+    >>> emulator.fit(x, logl)
+    >>> mean, std = emulator.predict(x[:5], return_std=True)
+    """
+
+    _length_scales = (0.5, 1.0, 2.0)
+
+    def __init__(self,
+                 n_dim: int,
+                 n_features: int = 256,
+                 max_samples: int = 4096,
+                 validation_split: float = 0.2,
+                 tolerance: float = 1.0,
+                 regularization: float = 1e-4,
+                 random_state: int = None):
+        self.n_dim = int(n_dim)
+        self.n_features = int(n_features)
+        self.max_samples = int(max_samples)
+        self.validation_split = validation_split
+        self.tolerance = tolerance
+        self.regularization = regularization
+        self.rng = np.random.default_rng(random_state)
+
+        self.trained = False
+        self.error = np.inf
+
+        self.x_mean = None
+        self.x_std = None
+        self.y_mean = None
+        self.y_std = None
+        self.omega = None
+        self.phase = None
+        self.weights = None
+        self.chol = None
+        self.noise = None
+
+    def _features(self, x: np.ndarray, omega: np.ndarray, phase: np.ndarray):
+        """
+        Compute regression features of standardized inputs.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            Standardized inputs of shape ``(n, n_dim)``.
+        omega : np.ndarray
+            Random frequencies of shape ``(n_dim, n_features)``.
+        phase : np.ndarray
+            Random phases of shape ``(n_features,)``.
+
+        Returns
+        -------
+        phi : np.ndarray
+            Features of shape ``(n, 1 + 2 * n_dim + n_features)``.
+        """
+        rff = np.sqrt(2.0 / self.n_features) * np.cos(x @ omega + phase)
+        return np.hstack([np.ones((len(x), 1)), x, x ** 2, rff])
+
+    def _solve(self, phi: np.ndarray, y: np.ndarray):
+        """
+        Solve the regularized least squares problem.
+
+        Parameters
+        ----------
+        phi : np.ndarray
+            Features.
+        y : np.ndarray
+            Standardized targets.
+
+        Returns
+        -------
+        weights : np.ndarray
+            Regression weights.
+        chol : tuple
+            Cholesky factorization of the regularized normal matrix.
+        """
+        A = phi.T @ phi
+        A[np.diag_indices_from(A)] += self.regularization * len(phi)
+        chol = cho_factor(A, lower=True)
+        return cho_solve(chol, phi.T @ y), chol
+
+    def fit(self, x: np.ndarray, logl: np.ndarray):
+        """
+        Train the emulator.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            Array of shape ``(n, n_dim)`` of parameter values.
+        logl : np.ndarray
+            Array of shape ``(n,)`` of log-likelihood values.
+        """
+        finite = np.isfinite(logl) & np.all(np.isfinite(x), axis=1)
+        x = x[finite][-self.max_samples:]
+        y = logl[finite][-self.max_samples:]
+
+        n_valid = int(self.validation_split * len(x))
+        if len(x) - n_valid < 2 * self.n_dim + 2 or n_valid < 1:
+            self.trained = False
+            self.error = np.inf
+            return
+
+        self.x_mean = np.mean(x, axis=0)
+        self.x_std = np.std(x, axis=0) + 1e-12
+        self.y_mean = np.mean(y)
+        self.y_std = np.std(y) + 1e-12
+        xs = (x - self.x_mean) / self.x_std
+        ys = (y - self.y_mean) / self.y_std
+
+        idx = self.rng.permutation(len(x))
+        idx_valid, idx_train = idx[:n_valid], idx[n_valid:]
+
+        # Choose the length scale of the random features on held-out samples
+        best_error = np.inf
+        for length_scale in self._length_scales:
+            omega = self.rng.standard_normal((self.n_dim, self.n_features)) / (length_scale * np.sqrt(self.n_dim))
+            phase = self.rng.uniform(0.0, 2.0 * np.pi, self.n_features)
+            try:
+                weights, _ = self._solve(self._features(xs[idx_train], omega, phase), ys[idx_train])
+            except np.linalg.LinAlgError:
+                continue
+            residuals = self._features(xs[idx_valid], omega, phase) @ weights - ys[idx_valid]
+            error = np.sqrt(np.mean(residuals ** 2))
+            if error < best_error:
+                best_error, self.omega, self.phase = error, omega, phase
+
+        if not np.isfinite(best_error):
+            self.trained = False
+            self.error = np.inf
+            return
+
+        # Refit on all samples
+        phi = self._features(xs, self.omega, self.phase)
+        self.weights, self.chol = self._solve(phi, ys)
+        self.noise = np.mean((phi @ self.weights - ys) ** 2)
+        self.error = best_error * self.y_std
+        self.trained = True
+
+    def predict(self, x: np.ndarray, return_std: bool = False):
+        """
+        Predict the log-likelihood.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            Array of shape ``(n, n_dim)`` of parameter values.
+        return_std : bool
+            Whether to also return the predictive standard deviation
+            (default is ``return_std=False``).
+
+        Returns
+        -------
+        mean : np.ndarray
+            Predicted log-likelihood.
+        std : np.ndarray
+            Predictive standard deviation (only if ``return_std=True``).
+        """
+        if not self.trained:
+            raise RuntimeError("The emulator has not been trained yet.")
+        phi = self._features((x - self.x_mean) / self.x_std, self.omega, self.phase)
+        mean = phi @ self.weights * self.y_std + self.y_mean
+        if not return_std:
+            return mean
+        var = self.noise * (1.0 + np.sum(phi * cho_solve(self.chol, phi.T).T, axis=1))
+        return mean, np.sqrt(var) * self.y_std
+
+    def usable(self, beta: float):
+        """
+        Whether the emulator is accurate enough at a given inverse temperature.
+
+        Parameters
+        ----------
+        beta : float
+            Inverse temperature.
+
+        Returns
+        -------
+        usable : bool
+            True if the emulator is trained and ``beta * error < tolerance``.
+        """
+        return self.trained and beta * self.error < self.tolerance
@@ -1,11 +1,9 @@
 from typing import Union, Optional, Tuple, Dict, List
 
 import numpy as np
-import copy
 import time 
 import zuko
 import torch
-from torch.utils.data import DataLoader, TensorDataset
 from torch.optim.lr_scheduler import ReduceLROnPlateau
 
 from .tools import torch_double_to_float
@@ -29,6 +27,12 @@ class Flow:
         Normalizing flow model.
     transform : ``zuko.transforms.Transform``
         Transformation object.
+    optimizer : ``torch.optim.Optimizer`` or ``None``
+        Optimizer of the last call to ``fit``, reused by warm-started fits.
+    scheduler : ``torch.optim.lr_scheduler.ReduceLROnPlateau`` or ``None``
+        Learning rate scheduler of the last call to ``fit``, reused by warm-started fits.
+    best_state : list of ``torch.Tensor`` or ``None``
+        Shadow buffers holding the parameters and buffers of the best model during ``fit``.
     
     Examples
     --------
@@ -45,6 +49,9 @@ class Flow:
 
     def __init__(self, n_dim, flow='nsf3'):
         self.n_dim = n_dim
+        self.optimizer = None
+        self.scheduler = None
+        self.best_state = None
 
         def next_power_of_2(n):
             return 1 if n == 0 else 2**(n - 1).bit_length()
@@ -89,6 +96,63 @@ class Flow:
         else:
             raise ValueError('Invalid flow type. Choose from: maf3, maf6, maf12, nsf3, nsf6, nsf12, or provide a zuko.flows.Flow object.')
 
+    def __getstate__(self):
+        """
+        Get state information for pickling. The optimizer and scheduler are
+        stored through their state dictionaries.
+        """
+        state = self.__dict__.copy()
+        state['optimizer'] = None if self.optimizer is None else self.optimizer.state_dict()
+        state['scheduler'] = None if self.scheduler is None else self.scheduler.state_dict()
+        state['best_state'] = None
+        return state
+
+    def __setstate__(self, state):
+        """
+        Set state information after unpickling, rebuilding the optimizer and scheduler.
+        States pickled before the optimizer was kept have neither of them.
+        """
+        optimizer_state, scheduler_state = state.get('optimizer'), state.get('scheduler')
+        self.__dict__.update(state)
+        self.optimizer = None
+        self.scheduler = None
+        self.best_state = None
+        if optimizer_state is not None:
+            self.optimizer = torch.optim.AdamW(self.flow.parameters())
+            self.optimizer.load_state_dict(optimizer_state)
+        if scheduler_state is not None:
+            self.scheduler = ReduceLROnPlateau(self.optimizer)
+            self.scheduler.load_state_dict(scheduler_state)
+
+    @torch.no_grad()
+    def _snapshot(self, tensors):
+        """
+        Copy the parameters and buffers of the flow into the preallocated shadow buffers.
+
+        Parameters
+        ----------
+        tensors : list of ``torch.Tensor``
+            Parameters and buffers of the flow, as in its state dictionary.
+        """
+        if self.best_state is None or len(self.best_state) != len(tensors) \
+                or any(b.shape != t.shape or b.dtype != t.dtype for b, t in zip(self.best_state, tensors)):
+            self.best_state = [torch.empty_like(t) for t in tensors]
+        for b, t in zip(self.best_state, tensors):
+            b.copy_(t)
+
+    @torch.no_grad()
+    def _restore(self, tensors):
+        """
+        Copy the shadow buffers back into the parameters and buffers of the flow.
+
+        Parameters
+        ----------
+        tensors : list of ``torch.Tensor``
+            Parameters and buffers of the flow, as in its state dictionary.
+        """
+        for b, t in zip(self.best_state, tensors):
+            t.copy_(b)
+
     @property
     def transform(self):
         """
@@ -177,6 +241,9 @@ class Flow:
             noise=None,
             shuffle=True,
             clip_grad_norm=1.0,
+            validation_frequency=1,
+            warm_start=False,
+            time_limit=None,
             verbose=0,
             ):
         """
@@ -211,6 +278,18 @@ class Flow:
             Whether to shuffle samples. Default: ``True``.
         clip_grad_norm : ``float``, optional
             Maximum gradient norm. Default: 1.0.
+        validation_frequency : ``int``, optional
+            Number of epochs between evaluations of the validation loss. Early stopping and
+            learning rate annealing are based on the validation epochs only. Default: 1.
+        warm_start : ``bool``, optional
+            Whether to keep the optimizer and scheduler state of the previous call to ``fit``, so
+            that the moment estimates of the optimizer carry over. The learning rate restarts at
+            ``learning_rate`` and, since losses on different samples are not comparable, the
+            plateau tracking of the scheduler restarts too. Default: ``False``.
+        time_limit : ``float``, optional
+            Wall-clock time budget in seconds. Once it is exhausted, training stops and the
+            best model so far is restored. If no validation epoch has run yet, the current model
+            is kept. Default: ``None`` (no budget).
         verbose : ``int``, optional
             Verbosity level. Default: 0.
 
@@ -238,47 +317,68 @@ class Flow:
                 weights = weights[rand_indx]
 
         if noise is not None:
-            min_dists = torch.empty(n_samples)
-            for i in range(n_samples):
-                min_dist = torch.linalg.norm(x[i] - x, axis=1)
-                min_dists[i] = torch.min(min_dist[min_dist > 0.0])
-            mean_min_dist = torch.mean(min_dist)
+            min_dists = nearest_neighbour_distances(x)
+            mean_min_dist = torch.mean(min_dists[torch.isfinite(min_dists)])
 
         if validation_split > 0.0:
-            x_train = x[:int(validation_split * n_samples)]
-            x_valid = x[int(validation_split * n_samples):]
-            if weights is None:
-                train_dl = DataLoader(TensorDataset(x_train), batch_size, shuffle)
-                val_dl = DataLoader(TensorDataset(x_valid), batch_size, shuffle)
-            else:
-                weights_train = weights[:int(validation_split * n_samples)]
-                weights_valid = weights[int(validation_split * n_samples):]
-                train_dl = DataLoader(TensorDataset(x_train, weights_train), batch_size, shuffle)
-                val_dl = DataLoader(TensorDataset(x_valid, weights_valid), batch_size, shuffle)
+            n_train = int(validation_split * n_samples)
+            x_train, x_valid = x[:n_train], x[n_train:]
+            if weights is not None:
+                weights_train, weights_valid = weights[:n_train], weights[n_train:]
             validation = True
         else:
             x_train = x
-            if weights is None:
-                train_dl = DataLoader(TensorDataset(x_train), batch_size, shuffle)
-            else:
-                weights_train = weights
-                train_dl = DataLoader(TensorDataset(x_train, weights_train), batch_size, shuffle)
+            weights_train = weights
             validation = False
-
-        optimizer = torch.optim.AdamW(self.flow.parameters(), 
-                                      learning_rate,
-                                      weight_decay=weight_decay,
-                                      )
+        batch_size = int(batch_size)
+        validation_frequency = max(int(validation_frequency), 1)
+
+        def batch_loss(x_, weights_):
+            if noise is not None:
+                x_ = x_ + noise * mean_min_dist * torch.randn_like(x_)
+            if weights_ is None:
+                loss = -self.flow().log_prob(x_).sum()
+            else:
+                loss = -self.flow().log_prob(x_) * weights_ * 1000.0
+                loss = loss.sum() / weights_.sum()
+
+            if laplace_scale is not None or gaussian_scale is not None:
+                loss -= regularization_loss(self.flow, laplace_scale, gaussian_scale)
+            return loss
+
+        warm_start = warm_start and self.optimizer is not None \
+            and self.optimizer.param_groups[0]['params'][0] is next(self.flow.parameters())
+        if warm_start:
+            optimizer = self.optimizer
+            for group in optimizer.param_groups:
+                group['lr'] = learning_rate
+                group['weight_decay'] = weight_decay
+        else:
+            optimizer = torch.optim.AdamW(self.flow.parameters(), 
+                                          learning_rate,
+                                          weight_decay=weight_decay,
+                                          )
+            self.optimizer = optimizer
+            self.scheduler = None
 
         if annealing:
-            scheduler = ReduceLROnPlateau(optimizer, 
-                                          mode='min',
-                                          factor=0.2,
-                                          patience=patience, 
-                                          threshold=0.0001, 
-                                          threshold_mode='abs', 
-                                          min_lr=1e-6,
-                                         )
+            # The scheduler only steps on epochs with a validation loss
+            scheduler_patience = int(np.ceil(patience / validation_frequency)) if validation else patience
+            if self.scheduler is None:
+                self.scheduler = ReduceLROnPlateau(optimizer, 
+                                                   mode='min',
+                                                   factor=0.2,
+                                                   patience=scheduler_patience, 
+                                                   threshold=0.0001, 
+                                                   threshold_mode='abs', 
+                                                   min_lr=1e-6,
+                                                  )
+            else:
+                self.scheduler.patience = scheduler_patience
+                self.scheduler.best = self.scheduler.mode_worse
+                self.scheduler.num_bad_epochs = 0
+                self.scheduler.cooldown_counter = 0
+            scheduler = self.scheduler
 
         history = dict()  # Collects per-epoch loss
         history['loss'] = []
@@ -290,88 +390,84 @@ class Flow:
 
         best_epoch = 0
         best_loss = np.inf
-        best_model = copy.deepcopy(self.flow.state_dict())
+        # The best model is kept in shadow buffers that are allocated once and updated in place
+        tensors = list(self.flow.state_dict().values())
+        self._snapshot(tensors)
 
         start_time_sec = time.time()
 
+        n_train = len(x_train)
         for epoch in range(epochs):
             self.flow.train()
-            train_loss = 0.0
+            # Accumulate the loss on the device to avoid a synchronization per batch
+            train_loss = torch.zeros((), dtype=torch.float64, device=x.device)
 
-            for batch in train_dl:
+            if shuffle:
+                perm = torch.randperm(n_train, device=x.device)
+            else:
+                perm = torch.arange(n_train, device=x.device)
+            for i in range(0, n_train, batch_size):
+                idx = perm[i:i + batch_size]
 
                 optimizer.zero_grad()
-                if noise is None:
-                    x_ = batch[0]
-                else:
-                    x_ = batch[0] + noise * mean_min_dist * torch.randn_like(batch[0])
-                if weights is None:
-                    loss = -self.flow().log_prob(x_).sum()
-                else:
-                    loss = -self.flow().log_prob(x_) * batch[1] * 1000.0
-                    loss = loss.sum() / batch[1].sum()
-
-                if laplace_scale is not None or gaussian_scale is not None:
-                    loss -= regularization_loss(self.flow, laplace_scale, gaussian_scale)
-
+                loss = batch_loss(x_train[idx], None if weights is None else weights_train[idx])
                 loss.backward()
                 torch.nn.utils.clip_grad_norm_(self.flow.parameters(), clip_grad_norm)
                 optimizer.step()
 
-                train_loss += loss.data.item()
+                train_loss += loss.detach()
 
-            train_loss = train_loss / len(train_dl.dataset)
+            train_loss = train_loss.item() / n_train
 
             history['loss'].append(train_loss)
-            
-            if validation:
-                self.flow.eval()
-                val_loss = 0.0
-
-                for batch in val_dl:
 
-                    if noise is None:
-                        x_ = batch[0]
-                    else:
-                        x_ = batch[0] + noise * mean_min_dist * torch.randn_like(batch[0])
-                    if weights is None:
-                        loss = -self.flow().log_prob(x_).sum()
-                    else:
-                        loss = -self.flow().log_prob(x_) * batch[1] * 1000.0
-                        loss = loss.sum() / batch[1].sum()
-                    
-                    if laplace_scale is not None or gaussian_scale is not None:
-                        loss -= regularization_loss(self.flow, laplace_scale, gaussian_scale)
+            validate = validation and (epoch + 1) % validation_frequency == 0
+            if validate:
+                self.flow.eval()
+                val_loss = torch.zeros((), dtype=torch.float64, device=x.device)
 
-                    val_loss += loss.data.item()
+                with torch.no_grad():
+                    for i in range(0, len(x_valid), batch_size):
+                        val_loss += batch_loss(x_valid[i:i + batch_size],
+                                               None if weights is None else weights_valid[i:i + batch_size])
 
-                val_loss = val_loss / len(val_dl.dataset)
+                val_loss = val_loss.item() / len(x_valid)
 
                 history['val_loss'].append(val_loss)
         
-            if annealing and validation:
+            if annealing and validate:
                 scheduler.step(val_loss)
-            elif annealing:
+            elif annealing and not validation:
                 scheduler.step(train_loss)
 
             if verbose > 1:
-                try:
+                if validate:
                     print('Epoch %3d/%3d, train loss: %5.2f, val loss: %5.2f' % (epoch + 1, epochs, train_loss, val_loss))
-                except:  # TODO specify type of exception
+                else:
                     print('Epoch %3d/%3d, train loss: %5.2f' % (epoch + 1, epochs, train_loss))
 
             # Monitor loss
-            if history[monitor][-1] < best_loss:
+            if (validate or not validation) and history[monitor][-1] < best_loss:
                 best_loss = history[monitor][-1]
                 best_epoch = epoch
-                best_model = copy.deepcopy(self.flow.state_dict())
+                self._snapshot(tensors)
 
             if epoch - best_epoch >= int(1.5 * patience):
-                self.flow.load_state_dict(best_model)
+                if np.isfinite(best_loss):
+                    self._restore(tensors)
                 if verbose > 0:
                     print('Finished early after %3d epochs' % best_epoch)
                     print('Best loss achieved %5.2f' % best_loss)
                 break
+
+            if time_limit is not None and time.time() - start_time_sec > time_limit:
+                # Without a monitored epoch yet, the snapshot still holds the untrained model
+                if np.isfinite(best_loss):
+                    self._restore(tensors)
+                if verbose > 0:
+                    print('Time limit reached after %3d epochs' % (epoch + 1))
+                    print('Best loss achieved %5.2f' % best_loss)
+                break
         
         if verbose > 0:
             end_time_sec = time.time()
@@ -384,6 +480,38 @@ class Flow:
         return history
 
 
+@torch.no_grad()
+def nearest_neighbour_distances(x, max_elements=2**22):
+    """
+    Compute the distance of every sample to its nearest distinct neighbour.
+
+    Duplicate samples are merged first, so that identical samples are not neighbours
+    of each other. The pairwise distances are then computed in chunks of rows, so that
+    at most ``max_elements`` distances are held in memory at once.
+
+    Parameters
+    ----------
+    x : ``torch.Tensor``
+        Samples with shape ``(n_samples, n_dim)``.
+    max_elements : ``int``, optional
+        Maximum number of pairwise distances per chunk. Default: ``2**22``.
+
+    Returns
+    -------
+    Nearest neighbour distances with shape ``(n_samples,)``.
+    """
+    x_unique, inverse = torch.unique(x, dim=0, return_inverse=True)
+    n_unique = len(x_unique)
+    chunk_size = max(max_elements // n_unique, 1)
+    min_dists = torch.full((n_unique,), torch.inf, dtype=x.dtype, device=x.device)
+    for i in range(0, n_unique, chunk_size):
+        dists = torch.cdist(x_unique[i:i + chunk_size], x_unique)
+        rows = torch.arange(len(dists), device=x.device)
+        dists[rows, rows + i] = torch.inf
+        min_dists[i:i + chunk_size] = torch.min(dists, dim=1).values
+    return min_dists[inverse]
+
+
 def regularization_loss(model, laplace_scale=None, gaussian_scale=None):
     """
     Compute regularization loss.
@@ -1,33 +1,100 @@
 import numpy as np
+import torch
+from scipy.special import logsumexp
 
-from .student import fit_mvstud
-from .tools import systematic_resample
+from .student import fit_mvstud_weighted, fit_mixture_mvstud_weighted, mvstud_logpdf
+from .student import fit_mvstud_lowrank_weighted, lowrank_factor
 
 class Geometry:
     """
     Geometry class for the POCOMC algorithm.
 
+    Parameters
+    ----------
+    max_components : int
+        Maximum number of components of the mixture of t distributions (default is
+        ``max_components=1``, i.e. a single t distribution). If larger than one, mixtures
+        with an increasing number of components are fitted and the number of components
+        that minimizes the Bayesian Information Criterion is kept.
+    covariance : str
+        Structure of the covariance matrices (default is ``covariance="full"``). If
+        ``covariance="lowrank"``, the covariance matrices are diagonal plus rank ``rank``,
+        fitted by weighted probabilistic PCA, and the dense matrices are never formed.
+        Only a single t distribution is supported in this case.
+    rank : int
+        Rank of the low-rank term if ``covariance="lowrank"`` (default is ``rank=10``).
+
     Attributes
     ----------
     normal_mean : array_like
         Mean of the normal distribution.
     normal_cov : array_like
-        Covariance matrix of the normal distribution.
+        Covariance matrix of the normal distribution (``None`` if ``covariance="lowrank"``).
+    normal_cov_diag, normal_cov_factor : array_like
+        Diagonal term and low-rank factor of the covariance matrix of the normal distribution
+        (only if ``covariance="lowrank"``).
     t_mean : array_like
         Mean of the t distribution.
     t_cov : array_like
-        Covariance matrix of the t distribution.
+        Covariance matrix of the t distribution (``None`` if ``covariance="lowrank"``).
+    t_cov_diag, t_cov_factor : array_like
+        Diagonal term and low-rank factor of the covariance matrix of the t distribution
+        (only if ``covariance="lowrank"``).
     t_nu : float
         Degrees of freedom of the t distribution.
+    n_components : int
+        Number of components of the mixture of t distributions.
+    mixture_weights : array_like
+        Weights of the mixture components.
+    mixture_means : array_like
+        Means of the mixture components.
+    mixture_covs : array_like
+        Covariance matrices of the mixture components.
+    mixture_nus : array_like
+        Degrees of freedom of the mixture components.
     """
 
-    def __init__(self):
+    def __init__(self, max_components: int = 1, covariance: str = "full", rank: int = 10):
+        if covariance not in ["full", "lowrank"]:
+            raise ValueError(f"Invalid covariance {covariance}. Options are 'full' or 'lowrank'.")
+        if covariance == "lowrank" and max_components > 1:
+            raise ValueError("A mixture of t distributions requires covariance='full'.")
+        self.covariance = covariance
+        self.rank = int(rank)
+
         self.normal_mean = None
         self.normal_cov = None
+        self.normal_cov_diag = None
+        self.normal_cov_factor = None
         self.t_mean = None
         self.t_cov = None
+        self.t_cov_diag = None
+        self.t_cov_factor = None
         self.t_nu = None
 
+        self.max_components = int(max_components)
+        self.n_components = 1
+        self.mixture_weights = None
+        self.mixture_means = None
+        self.mixture_covs = None
+        self.mixture_nus = None
+
+    def __setstate__(self, state):
+        """
+        Set state information after unpickling, with the defaults of ``__init__`` for the
+        attributes of the mixture and low-rank options that older states do not have. A
+        fitted t distribution of such a state becomes a mixture with a single component.
+        """
+        defaults = dict(covariance="full", rank=10, normal_cov_diag=None, normal_cov_factor=None,
+                        t_cov_diag=None, t_cov_factor=None, max_components=1, n_components=1,
+                        mixture_weights=None, mixture_means=None, mixture_covs=None, mixture_nus=None)
+        self.__dict__.update({**defaults, **state})
+        if self.mixture_weights is None and self.t_cov is not None:
+            self.mixture_weights = np.ones(1)
+            self.mixture_means = self.t_mean[None, :]
+            self.mixture_covs = self.t_cov[None, :, :]
+            self.mixture_nus = np.array([self.t_nu])
+
     def fit(self, theta, weights=None):
         """
 
@@ -38,7 +105,10 @@ class Geometry:
         weights : array_like, optional
             Array of weights. The default is None.
         """
-        
+        if self.covariance == "lowrank":
+            self._fit_lowrank(theta, weights)
+            return
+
         # Learn normal distribution
         if weights is None:
             self.normal_mean = np.mean(theta, axis=0)
@@ -47,13 +117,168 @@ class Geometry:
             self.normal_mean = np.average(theta, axis=0, weights=weights)
             self.normal_cov = np.cov(theta.T, aweights=weights)
 
-        # Learn t distribution
-        if weights is not None:
-            idx_resampled = systematic_resample(len(theta), weights=weights)
-            theta_resampled = theta[idx_resampled]
-            self.t_mean, self.t_cov, self.t_nu = fit_mvstud(theta_resampled)
+        # Learn t distribution using the weights directly, warm-started from the previous fit
+        self.t_mean, self.t_cov, self.t_nu = fit_mvstud_weighted(theta, weights,
+                                                                 mu=self.t_mean, Sigma=self.t_cov, nu=self.t_nu)
+
+        if ~np.isfinite(self.t_nu):
+            self.t_nu = 1e6
+
+        # Learn mixture of t distributions, choosing the number of components with the BIC
+        n_dim = len(self.t_mean)
+        if weights is None:
+            n_eff = len(theta)
+            log_w = np.full(len(theta), -np.log(len(theta)))
+        else:
+            w = weights / np.sum(weights)
+            n_eff = 1.0 / np.sum(w ** 2)
+            with np.errstate(divide='ignore'):
+                log_w = np.log(w)
+        n_params = n_dim + n_dim * (n_dim + 1) // 2 + 2
+
+        best = (np.ones(1), self.t_mean[None, :], self.t_cov[None, :, :], np.array([self.t_nu]))
+        if self.max_components > 1:
+            mask = np.isfinite(log_w)
+            loglike = np.sum(np.exp(log_w[mask]) * mvstud_logpdf(theta[mask], self.t_mean, self.t_cov, self.t_nu))
+            best_bic = -2.0 * n_eff * loglike + (n_params - 1) * np.log(n_eff)
+            previous = None
+            if self.mixture_weights is not None:
+                previous = (self.mixture_weights, self.mixture_means, self.mixture_covs, self.mixture_nus)
+            for n_components in range(2, self.max_components + 1):
+                pi, mu, cov, nu, loglike = fit_mixture_mvstud_weighted(theta, weights, n_components=n_components,
+                                                                       init=previous)
+                bic = -2.0 * n_eff * loglike + (n_components * n_params - 1) * np.log(n_eff)
+                if not bic < best_bic:
+                    break
+                best_bic = bic
+                best = (pi, mu, cov, nu)
+
+        self.mixture_weights, self.mixture_means, self.mixture_covs, self.mixture_nus = best
+        self.n_components = len(self.mixture_weights)
+
+    def _fit_lowrank(self, theta, weights=None):
+        """
+        Fit the normal and t distributions with low-rank plus diagonal covariance matrices.
+
+        Parameters
+        ----------
+        theta : array_like
+            Array of samples.
+        weights : array_like, optional
+            Array of weights. The default is None.
+        """
+        if weights is None:
+            w = np.full(len(theta), 1.0 / len(theta))
         else:
-            self.t_mean, self.t_cov, self.t_nu = fit_mvstud(theta)
+            w = weights / np.sum(weights)
+
+        # Learn normal distribution
+        self.normal_mean = np.dot(w, theta)
+        self.normal_cov_diag, self.normal_cov_factor = lowrank_factor((theta - self.normal_mean) * np.sqrt(w)[:, None],
+                                                                      self.rank)
+
+        # Learn t distribution, warm-started from the previous fit
+        self.t_mean, self.t_cov_diag, self.t_cov_factor, self.t_nu = fit_mvstud_lowrank_weighted(
+            theta, w, self.rank, mu=self.t_mean, D=self.t_cov_diag, W=self.t_cov_factor, nu=self.t_nu)
 
         if ~np.isfinite(self.t_nu):
-            self.t_nu = 1e6
\ No newline at end of file
+            self.t_nu = 1e6
+
+    def cov_factor(self, distribution="t"):
+        """
+        Factor of a covariance matrix used by the MCMC kernels.
+
+        Parameters
+        ----------
+        distribution : str
+            Either ``"t"`` (default) or ``"normal"``.
+
+        Returns
+        -------
+        factor : array_like or tuple
+            Lower Cholesky factor of the covariance matrix, or the tuple ``(diag, factor)``
+            of its diagonal term and low-rank factor if ``covariance="lowrank"``.
+        """
+        if self.covariance == "lowrank":
+            return getattr(self, distribution + "_cov_diag"), getattr(self, distribution + "_cov_factor")
+        return np.linalg.cholesky(getattr(self, distribution + "_cov"))
+
+    def log_density(self, theta):
+        """
+        Log probability density of the mixture of t distributions.
+
+        Parameters
+        ----------
+        theta : array_like
+            Array of samples of shape ``(n, n_dim)``.
+
+        Returns
+        -------
+        log_density : array_like
+            Array of shape ``(n,)``.
+        """
+        return logsumexp(self._log_components(theta), axis=1)
+
+    def sample_components(self, theta):
+        """
+        Assign every sample to a mixture component with probability equal to its responsibility.
+
+        Parameters
+        ----------
+        theta : array_like
+            Array of samples of shape ``(n, n_dim)``.
+
+        Returns
+        -------
+        components : array_like
+            Array of shape ``(n,)`` with the component indices.
+        """
+        log_r = self._log_components(theta)
+        r = np.exp(log_r - logsumexp(log_r, axis=1, keepdims=True))
+        return np.sum(np.cumsum(r, axis=1)[:, :-1] < np.random.rand(len(theta), 1), axis=1)
+
+    def _log_components(self, theta):
+        """
+        Log of the mixture weights times the densities of the components.
+
+        Parameters
+        ----------
+        theta : array_like
+            Array of samples of shape ``(n, n_dim)``.
+
+        Returns
+        -------
+        log_components : array_like
+            Array of shape ``(n, n_components)``.
+        """
+        return np.log(self.mixture_weights) + np.stack(
+            [mvstud_logpdf(theta, self.mixture_means[k], self.mixture_covs[k], self.mixture_nus[k])
+             for k in range(self.n_components)], axis=1)
+
+    def to_torch(self, dtype=torch.float64):
+        """
+        Return the parameters of the normal and t distributions as torch tensors.
+
+        Parameters
+        ----------
+        dtype : torch.dtype
+            Data type of the tensors (default is ``torch.float64``).
+
+        Returns
+        -------
+        params : dict
+            Dictionary with the means (``normal_mean``, ``t_mean``), covariance matrices
+            (``normal_cov``, ``t_cov``), their Cholesky factors (``normal_chol``, ``t_chol``),
+            the inverse covariance matrix of the t distribution (``t_inv_cov``) and its
+            degrees of freedom (``t_nu``).
+        """
+        normal_cov = torch.as_tensor(np.atleast_2d(self.normal_cov), dtype=dtype)
+        t_cov = torch.as_tensor(np.atleast_2d(self.t_cov), dtype=dtype)
+        return dict(normal_mean=torch.as_tensor(self.normal_mean, dtype=dtype),
+                    normal_cov=normal_cov,
+                    normal_chol=torch.linalg.cholesky(normal_cov),
+                    t_mean=torch.as_tensor(self.t_mean, dtype=dtype),
+                    t_cov=t_cov,
+                    t_chol=torch.linalg.cholesky(t_cov),
+                    t_inv_cov=torch.linalg.inv(t_cov),
+                    t_nu=float(self.t_nu))
@@ -22,35 +22,56 @@ def assert_arrays_equal_shape(x: np.ndarray,
         raise ValueError(f"Inputs should have equal shape, but got {x.shape} and {y.shape}")
 
 
+def array_within_interval(x: np.ndarray,
+                          left: np.ndarray,
+                          right: np.ndarray,
+                          left_open: bool = False,
+                          right_open: bool = False):
+    """
+    Check that every column of ``x`` lies within the corresponding interval.
+
+    Only the column-wise minima and maxima are compared with the bounds, so no
+    element-wise boolean arrays are built. The bounds must not contain NaN
+    (use ``-np.inf``/``np.inf`` for missing bounds). Inputs containing NaN fail the check.
+
+    Returns
+    -------
+    within : bool
+        True if all values are within the interval.
+    """
+    if np.size(x) == 0:
+        return True
+    x_min = np.min(x, axis=0)
+    x_max = np.max(x, axis=0)
+    lower = np.all(left < x_min) if left_open else np.all(left <= x_min)
+    upper = np.all(x_max < right) if right_open else np.all(x_max <= right)
+    return bool(lower and upper)
+
+
 def assert_array_within_interval(x: np.ndarray,
                                  left: np.ndarray,
                                  right: np.ndarray,
                                  left_open: bool = False,
                                  right_open: bool = False):
-    left = left.copy()
-    left[np.isnan(left)] = -np.inf
-
-    right = right.copy()
-    right[np.isnan(right)] = np.inf
-
-    if left_open and right_open:
-        condition = (left < x) & (x < right)
-        interval_string = f'({left}, {right})'
-    elif left_open and not right_open:
-        condition = (left < x) & (x <= right)
-        interval_string = f'({left}, {right}]'
-    elif not left_open and right_open:
-        condition = (left <= x) & (x < right)
-        interval_string = f'[{left}, {right})'
-    else:
-        condition = (left <= x) & (x <= right)
-        interval_string = f'[{left}, {right}]'
-
-    if not np.all(condition):
-        x_min = np.min(x)
-        x_max = np.max(x)
-        raise ValueError(f"Expected input to be within interval {interval_string}, "
-                         f"but got minimum = {x_min} and maximum = {x_max}")
+    left_nan = np.isnan(left)
+    if np.any(left_nan):
+        left = np.where(left_nan, -np.inf, left)
+
+    right_nan = np.isnan(right)
+    if np.any(right_nan):
+        right = np.where(right_nan, np.inf, right)
+
+    if array_within_interval(x, left, right, left_open, right_open):
+        return
+
+    # Diagnostics are only built on failure
+    left_bracket = '(' if left_open else '['
+    right_bracket = ')' if right_open else ']'
+    interval_string = f'{left_bracket}{left}, {right}{right_bracket}'
+    x_min = np.min(x)
+    x_max = np.max(x)
+    raise ValueError(f"Expected input to be within interval {interval_string}, "
+                     f"but got minimum = {x_min} and maximum = {x_max}")
 
 
 def assert_array_float(x: np.ndarray):
@@ -1,8 +1,369 @@
 import numpy as np
 import torch
+from scipy.linalg import solve_triangular
 
 from .tools import numpy_to_torch, torch_to_numpy, flow_numpy_wrapper
-from .student import fit_mvstud
+from .student import fit_mvstud, lowrank_mahalanobis
+
+
+def _metropolis(x_prime: np.ndarray,
+                finite_mask: np.ndarray,
+                log_ratio: np.ndarray,
+                logl: np.ndarray,
+                logp: np.ndarray,
+                beta: float,
+                log_like: callable,
+                log_prior: callable,
+                blobs: np.ndarray = None,
+                threshold: bool = False,
+                log_like_approx: callable = None,
+                logl_approx: np.ndarray = None):
+    """
+    Evaluate proposed points and apply the Metropolis criterion.
+
+    The log-prior is evaluated first and the log-likelihood is only evaluated
+    for proposals with finite coordinates and finite log-prior. Proposals with
+    zero prior density (e.g. outside of custom constraints imposed by the prior)
+    never reach the likelihood.
+
+    Since the uniform random numbers of the Metropolis criterion are drawn before
+    the likelihood is evaluated, the minimum log-likelihood that each proposal needs
+    in order to be accepted is known in advance. If ``threshold=True`` it is passed
+    to the likelihood, which is then allowed to stop early and return any value
+    below it (e.g. ``-np.inf``) once rejection is certain. The acceptance probabilities
+    of such proposals are computed from the truncated values, so the kernels adapt
+    their proposal scales from the acceptance mask instead. The acceptance decisions,
+    and therefore the chains, are the same with and without the threshold.
+
+    If an approximate log-likelihood is provided, delayed acceptance is used. Proposals
+    are first screened with a Metropolis criterion in which the likelihood is replaced
+    by its approximation, and only the survivors are evaluated with the likelihood and
+    accepted with probability ``min(1, exp(beta * (logl' - logl) - beta * (logl_approx' - logl_approx)))``,
+    which corrects for the error of the approximation and leaves the target invariant.
+
+    Parameters
+    ----------
+    x_prime : np.ndarray
+        Proposed points in the original parameter space.
+    finite_mask : np.ndarray
+        Boolean mask of proposals with finite coordinates and Jacobian.
+    log_ratio : np.ndarray
+        Log of the Metropolis ratio excluding the likelihood and prior terms
+        (i.e. Jacobians and proposal density corrections).
+    logl : np.ndarray
+        Log-likelihood of the current points.
+    logp : np.ndarray
+        Log-prior of the current points.
+    beta : float
+        Inverse temperature.
+    log_like : callable
+        Log-likelihood function returning log-likelihood values and blobs.
+    log_prior : callable
+        Log-prior function.
+    blobs : np.ndarray or None
+        Blobs of the current state, used to infer the blobs data type.
+    threshold : bool
+        Pass the acceptance threshold to the likelihood (default is ``threshold=False``).
+    log_like_approx : callable or None
+        Cheap approximate log-likelihood function used for delayed acceptance
+        (default is ``None``).
+    logl_approx : np.ndarray or None
+        Approximate log-likelihood of the current points.
+
+    Returns
+    -------
+    Results dictionary with the log-likelihood (``logl``), approximate log-likelihood
+    (``logl_approx``), log-prior (``logp``) and blobs (``blobs``) of the proposals, the
+    acceptance probabilities (``alpha``), the acceptance mask (``accept``), the number
+    of likelihood calls (``calls``), the number of approximate likelihood calls
+    (``calls_approx``), the number of proposals that survived the first stage of
+    delayed acceptance (``screened``), the errors ``logl - logl_approx`` of the
+    approximation at the proposals evaluated with both, leaving out likelihood values
+    that do not exceed the threshold (``residuals``), and the number
+    of proposals rejected by the likelihood threshold (``threshold_rejections``). These are
+    the proposals that were not evaluated at all because they cannot be accepted, and
+    those whose returned log-likelihood does not exceed the threshold, whether or not
+    the likelihood actually stopped early.
+    """
+    n_walkers = len(x_prime)
+
+    u_rand = np.random.rand(n_walkers)
+
+    # Compute log-prior first
+    logp_prime = np.full(n_walkers, -np.inf)
+    if np.any(finite_mask):
+        logp_prime[finite_mask] = log_prior(x_prime[finite_mask])
+    eval_mask = finite_mask & np.isfinite(logp_prime)
+
+    # Log of the Metropolis ratio excluding the likelihood term
+    log_ratio_rest = logp_prime - logp + log_ratio
+
+    # First stage of delayed acceptance using the approximate likelihood
+    logl_approx_prime = None
+    alpha_approx = None
+    n_calls_approx = 0
+    if log_like_approx is not None:
+        logl_approx_prime = np.full(n_walkers, -np.inf)
+        if np.any(eval_mask):
+            logl_approx_prime[eval_mask] = log_like_approx(x_prime[eval_mask])
+        n_calls_approx = np.sum(eval_mask)
+
+        with np.errstate(invalid='ignore'):
+            delta_approx = logl_approx_prime * beta - logl_approx * beta
+            alpha_approx = np.minimum(np.ones(n_walkers), np.exp(delta_approx + log_ratio_rest))
+        alpha_approx[np.isnan(alpha_approx)] = 0.0
+
+        screened_mask = np.random.rand(n_walkers) < alpha_approx
+        eval_mask &= screened_mask
+
+        # The second stage only corrects for the error of the approximation
+        log_ratio_rest = -delta_approx
+
+    # Compute minimum log-likelihood required for acceptance
+    logl_min = None
+    n_skipped = 0
+    if threshold:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if beta > 0.0:
+                logl_min = logl + (np.log(u_rand) - log_ratio_rest) / beta
+            else:
+                logl_min = np.where(np.log(u_rand) < log_ratio_rest, -np.inf, np.inf)
+        logl_min[np.isnan(logl_min)] = -np.inf
+        # Proposals that cannot be accepted for any likelihood value are not evaluated
+        n_skipped = np.sum(eval_mask & (logl_min == np.inf))
+        eval_mask &= logl_min < np.inf
+
+    # Compute log-likelihood only where needed
+    logl_prime = np.full(n_walkers, -np.inf)
+    if blobs is not None:
+        blobs_prime = np.empty(n_walkers, dtype=np.dtype((blobs[0].dtype, blobs[0].shape)))
+    else:
+        blobs_prime = None
+    if np.any(eval_mask):
+        if threshold:
+            results = log_like(x_prime[eval_mask], threshold=logl_min[eval_mask])
+        else:
+            results = log_like(x_prime[eval_mask])
+        logl_prime[eval_mask] = results[0]
+        if blobs is not None:
+            blobs_prime[eval_mask] = results[1]
+
+    n_threshold_rejections = n_skipped
+    if threshold:
+        n_threshold_rejections += np.sum(eval_mask & ~(logl_prime > logl_min))
+
+    # Compute Metropolis factors
+    with np.errstate(invalid='ignore'):
+        alpha = np.minimum(
+            np.ones(n_walkers),
+            np.exp(logl_prime * beta - logl * beta + log_ratio_rest)
+        )
+    alpha[np.isnan(alpha)] = 0.0
+
+    # Metropolis criterion
+    mask = u_rand < alpha
+    if threshold:
+        # Values below the threshold may be bounds returned by a likelihood that stopped early
+        mask &= logl_prime > logl_min
+
+    n_screened = n_walkers
+    residuals = None
+    if log_like_approx is not None:
+        mask &= screened_mask
+        n_screened = np.sum(screened_mask)
+        # Overall acceptance probability, assuming second stage acceptance for unscreened proposals
+        alpha = alpha_approx * np.where(screened_mask, alpha, 1.0)
+        # Likelihood values that do not exceed the threshold may be truncated and are left out
+        complete_mask = eval_mask if logl_min is None else eval_mask & (logl_prime > logl_min)
+        residuals = logl_prime[complete_mask] - logl_approx_prime[complete_mask]
+        residuals = residuals[np.isfinite(residuals)]
+
+    return dict(logl=logl_prime, logl_approx=logl_approx_prime, logp=logp_prime, blobs=blobs_prime,
+                alpha=alpha, accept=mask, calls=np.sum(eval_mask), calls_approx=n_calls_approx,
+                screened=n_screened, residuals=residuals, threshold_rejections=n_threshold_rejections)
+
+
+def _metropolis_torch(x_prime: torch.Tensor,
+                      finite_mask: torch.Tensor,
+                      log_ratio: torch.Tensor,
+                      logl: torch.Tensor,
+                      logp: torch.Tensor,
+                      beta: float,
+                      log_like: callable,
+                      log_prior: callable,
+                      threshold: bool = False):
+    """
+    Evaluate proposed points and apply the Metropolis criterion with torch tensors.
+
+    Torch counterpart of ``_metropolis`` used with torch likelihoods. The log-prior is
+    evaluated first (with numpy, on a view of ``x_prime``) and the log-likelihood is only
+    evaluated for proposals with finite coordinates and finite log-prior. Delayed
+    acceptance and blobs are not supported.
+
+    Parameters
+    ----------
+    x_prime : torch.Tensor
+        Proposed points in the original parameter space.
+    finite_mask : torch.Tensor
+        Boolean mask of proposals with finite coordinates and Jacobian.
+    log_ratio : torch.Tensor
+        Log of the Metropolis ratio excluding the likelihood and prior terms.
+    logl : torch.Tensor
+        Log-likelihood of the current points.
+    logp : torch.Tensor
+        Log-prior of the current points.
+    beta : float
+        Inverse temperature.
+    log_like : callable
+        Torch log-likelihood function.
+    log_prior : callable
+        Log-prior function.
+    threshold : bool
+        Pass the acceptance threshold to the likelihood (default is ``threshold=False``).
+
+    Returns
+    -------
+    Results dictionary with the log-likelihood (``logl``) and log-prior (``logp``) of the
+    proposals, the acceptance probabilities (``alpha``), the acceptance mask (``accept``),
+    the number of likelihood calls (``calls``) and the number of proposals rejected by the
+    likelihood threshold (``threshold_rejections``), see ``_metropolis``.
+    """
+    n_walkers = len(x_prime)
+
+    u_rand = torch.rand(n_walkers, dtype=torch.float64)
+
+    # Compute log-prior first
+    logp_prime = torch.full((n_walkers,), -np.inf, dtype=torch.float64)
+    if torch.any(finite_mask):
+        logp_prime[finite_mask] = torch.as_tensor(log_prior(torch_to_numpy(x_prime[finite_mask])), dtype=torch.float64)
+    eval_mask = finite_mask & torch.isfinite(logp_prime)
+
+    # Log of the Metropolis ratio excluding the likelihood term
+    log_ratio_rest = logp_prime - logp + log_ratio
+
+    # Compute minimum log-likelihood required for acceptance
+    logl_min = None
+    n_skipped = 0
+    if threshold:
+        if beta > 0.0:
+            logl_min = logl + (torch.log(u_rand) - log_ratio_rest) / beta
+        else:
+            logl_min = torch.where(torch.log(u_rand) < log_ratio_rest, -np.inf, np.inf).double()
+        logl_min[torch.isnan(logl_min)] = -np.inf
+        # Proposals that cannot be accepted for any likelihood value are not evaluated
+        n_skipped = int(torch.sum(eval_mask & (logl_min == np.inf)))
+        eval_mask &= logl_min < np.inf
+
+    # Compute log-likelihood only where needed
+    logl_prime = torch.full((n_walkers,), -np.inf, dtype=torch.float64)
+    if torch.any(eval_mask):
+        if threshold:
+            results = log_like.call_with_threshold((x_prime[eval_mask], logl_min[eval_mask]))
+        else:
+            results = log_like(x_prime[eval_mask])
+        logl_prime[eval_mask] = torch.as_tensor(results, dtype=torch.float64).reshape(-1)
+
+    n_threshold_rejections = n_skipped
+    if threshold:
+        n_threshold_rejections += int(torch.sum(eval_mask & ~(logl_prime > logl_min)))
+
+    # Compute Metropolis factors
+    alpha = torch.clamp(torch.exp(logl_prime * beta - logl * beta + log_ratio_rest), max=1.0)
+    alpha[torch.isnan(alpha)] = 0.0
+
+    # Metropolis criterion
+    mask = u_rand < alpha
+    if threshold:
+        # Values below the threshold may be bounds returned by a likelihood that stopped early
+        mask &= logl_prime > logl_min
+
+    return dict(logl=logl_prime, logp=logp_prime, alpha=alpha, accept=mask,
+                calls=int(torch.sum(eval_mask)), threshold_rejections=n_threshold_rejections)
+
+
+def _tpcn_propose(theta: np.ndarray,
+                  mu: np.ndarray,
+                  chol_cov,
+                  nu: float,
+                  sigma: float):
+    """
+    Draw t-preconditioned Crank-Nicolson proposals for all walkers at once.
+
+    Parameters
+    ----------
+    theta : np.ndarray
+        Current points of shape ``(n_walkers, n_dim)``.
+    mu : np.ndarray
+        Mean of the t distribution.
+    chol_cov : np.ndarray or tuple
+        Lower Cholesky factor of the covariance matrix of the t distribution, or the tuple
+        ``(diag, factor)`` of a low-rank plus diagonal covariance matrix.
+    nu : float
+        Degrees of freedom of the t distribution.
+    sigma : float
+        Proposal scale.
+
+    Returns
+    -------
+    theta_prime : np.ndarray
+        Proposed points of shape ``(n_walkers, n_dim)``.
+    delta : np.ndarray
+        Squared Mahalanobis distances of the current points from the mean.
+    """
+    n_walkers, n_dim = theta.shape
+    diff = theta - mu
+    delta = _mahalanobis(diff, chol_cov)
+    s = 1. / np.random.gamma((n_dim + nu) / 2, 2.0 / (nu + delta))
+    theta_prime = mu + (1.0 - sigma ** 2.0) ** 0.5 * diff \
+        + sigma * np.sqrt(s)[:, None] * _correlated_normal(n_walkers, chol_cov)
+    return theta_prime, delta
+
+
+def _mahalanobis(diff: np.ndarray, chol_cov):
+    """
+    Squared Mahalanobis distances.
+
+    Parameters
+    ----------
+    diff : np.ndarray
+        Differences from the mean of shape ``(n, n_dim)``.
+    chol_cov : np.ndarray or tuple
+        Lower Cholesky factor of the covariance matrix, or the tuple ``(diag, factor)``
+        of a low-rank plus diagonal covariance matrix.
+
+    Returns
+    -------
+    delta : np.ndarray
+        Array of shape ``(n,)``.
+    """
+    if isinstance(chol_cov, tuple):
+        return lowrank_mahalanobis(diff, *chol_cov)
+    return np.sum(solve_triangular(chol_cov, diff.T, lower=True, check_finite=False) ** 2, axis=0)
+
+
+def _correlated_normal(n: int, chol_cov):
+    """
+    Draw samples of a zero-mean normal distribution.
+
+    Parameters
+    ----------
+    n : int
+        Number of samples.
+    chol_cov : np.ndarray or tuple
+        Lower Cholesky factor of the covariance matrix, or the tuple ``(diag, factor)``
+        of a low-rank plus diagonal covariance matrix, in which case the samples are
+        drawn in ``O(n * n_dim * rank)``.
+
+    Returns
+    -------
+    z : np.ndarray
+        Array of shape ``(n, n_dim)``.
+    """
+    if isinstance(chol_cov, tuple):
+        diag, factor = chol_cov
+        return np.sqrt(diag) * np.random.randn(n, len(diag)) + np.dot(np.random.randn(n, factor.shape[1]), factor.T)
+    return np.dot(np.random.randn(n, len(chol_cov)), chol_cov.T)
+
 
 @torch.no_grad()
 def preconditioned_pcn(state_dict: dict,
@@ -24,8 +385,12 @@ def preconditioned_pcn(state_dict: dict,
     -------
     Results dictionary
     """
-    # Likelihood call counter
+    # Likelihood call counters
     n_calls = 0
+    n_threshold_rejections = 0
+    n_calls_approx = 0
+    n_screened = 0
+    n_accepted = 0
 
     # Clone state variables
     u = np.copy(state_dict.get('u'))
@@ -43,6 +408,7 @@ def preconditioned_pcn(state_dict: dict,
     # Get functions
     log_like = function_dict.get('loglike')
     log_prior = function_dict.get('logprior')
+    log_like_approx = function_dict.get('loglike_approx')
     scaler = function_dict.get('scaler')
     flow = flow_numpy_wrapper(function_dict.get('flow'))
     geometry = function_dict.get('theta_geometry')
@@ -51,83 +417,109 @@ def preconditioned_pcn(state_dict: dict,
     n_max = option_dict.get('n_max')
     n_steps = option_dict.get('n_steps')
     progress_bar = option_dict.get('progress_bar')
+    termination = option_dict.get('termination')
+    threshold = option_dict.get('threshold', False)
+    approx_tolerance = option_dict.get('approx_tolerance')
     sigma = np.minimum(option_dict.get('proposal_scale'), 0.99)
 
     # Get number of particles and parameters/dimensions
     n_walkers, n_dim = x.shape
 
+    # Approximate log-likelihood of the current state for delayed acceptance
+    if log_like_approx is not None:
+        logl_approx = log_like_approx(x)
+        n_calls_approx += n_walkers
+    else:
+        logl_approx = None
+    approx_residuals = []
+
     # Transform u to theta
     theta, logdetj_flow = flow.forward(u)
 
+    # Output arrays of the inverse flow and scaler, reused at every step
+    u_prime = np.empty((n_walkers, n_dim))
+    logdetj_flow_prime = np.empty(n_walkers)
+    x_prime = np.empty((n_walkers, n_dim))
+    logdetj_prime = np.empty(n_walkers)
+
 
     mu = geometry.t_mean
-    cov = geometry.t_cov
     nu = geometry.t_nu
 
-    inv_cov = np.linalg.inv(cov)
-    chol_cov = np.linalg.cholesky(cov)
+    chol_cov = geometry.cov_factor('t')
+
+    # With a mixture of t distributions, each walker proposes relative to a component drawn
+    # from its responsibilities. The resulting proposal is reversible with respect to the
+    # mixture density, which replaces the t density in the Metropolis ratio.
+    mixture = geometry.n_components > 1
+    if mixture:
+        mixture_chols = np.linalg.cholesky(geometry.mixture_covs)
+        log_t = geometry.log_density(theta)
 
     logp2_val = np.mean(logl + logp)
     cnt = 0
 
+    if termination is not None:
+        termination.reset(theta)
+
     i = 0
     while True:
         i += 1
 
-        diff = theta - mu
-        s = np.empty(n_walkers)
-        for k in range(n_walkers):
-            s[k] = 1./np.random.gamma((n_dim + nu) / 2, 2.0/(nu + np.dot(diff[k],np.dot(inv_cov,diff[k]))))
-
         # Propose new points in theta space
-        theta_prime = np.empty((n_walkers, n_dim))
-        for k in range(n_walkers):
-            theta_prime[k] = mu + (1.0 - sigma ** 2.0) ** 0.5 * diff[k] + sigma * np.sqrt(s[k]) * np.dot(chol_cov, np.random.randn(n_dim))      
+        if mixture:
+            components = geometry.sample_components(theta)
+            theta_prime = np.empty((n_walkers, n_dim))
+            for k in range(geometry.n_components):
+                idx = components == k
+                theta_prime[idx] = _tpcn_propose(theta[idx], geometry.mixture_means[k], mixture_chols[k],
+                                                 geometry.mixture_nus[k], sigma)[0]
+        else:
+            theta_prime, delta = _tpcn_propose(theta, mu, chol_cov, nu, sigma)
 
         # Transform to u space
-        u_prime, logdetj_flow_prime = flow.inverse(theta_prime)
+        flow.inverse(theta_prime, out=(u_prime, logdetj_flow_prime))
 
         # Transform to x space
-        x_prime, logdetj_prime = scaler.inverse(u_prime)
+        x_prime, logdetj_prime = scaler.inverse(u_prime, out=(x_prime, logdetj_prime))
 
         # Compute finite mask
         finite_mask_logdetj_prime = np.isfinite(logdetj_prime)
         finite_mask_x_prime = np.isfinite(x_prime).all(axis=1)
         finite_mask = finite_mask_logdetj_prime & finite_mask_x_prime
 
-        # Compute log-likelihood, log-prior, and log-posterior
-        u_rand = np.random.rand(n_walkers)
-        logl_prime = np.empty(n_walkers)
-        logp_prime = np.empty(n_walkers)
-        if have_blobs:
-            blobs_prime = np.empty(n_walkers, dtype=np.dtype((blobs[0].dtype, blobs[0].shape)))
-            logl_prime[finite_mask], blobs_prime[finite_mask] = log_like(x_prime[finite_mask])
+        # Compute Metropolis factors (excluding likelihood and prior terms)
+        if mixture:
+            log_t_prime = geometry.log_density(theta_prime)
+            log_ratio = logdetj_prime - logdetj + logdetj_flow_prime - logdetj_flow - log_t_prime + log_t
         else:
-            logl_prime[finite_mask], _ = log_like(x_prime[finite_mask])
-        logp_prime[finite_mask] = log_prior(x_prime[finite_mask])
-        logl_prime[~finite_mask] = -np.inf
-        logp_prime[~finite_mask] = -np.inf
-
-        n_calls += np.sum(finite_mask)
-
-        # Compute Metropolis factors
-        diff_prime = theta_prime-mu
-        A = np.empty(n_walkers)
-        B = np.empty(n_walkers)
-        for k in range(n_walkers):
-            A[k] = -(n_dim+nu)/2*np.log(1+np.dot(diff_prime[k],np.dot(inv_cov,diff_prime[k]))/nu)
-            B[k] = -(n_dim+nu)/2*np.log(1+np.dot(diff[k],np.dot(inv_cov,diff[k]))/nu)
-        alpha = np.minimum(
-            np.ones(n_walkers),
-            np.exp(logl_prime * beta - logl * beta + logp_prime - logp + logdetj_prime - logdetj + logdetj_flow_prime - logdetj_flow - A + B)
-        )
-        alpha[np.isnan(alpha)] = 0.0
-
-        # Metropolis criterion
-        mask = u_rand < alpha
+            A = -(n_dim+nu)/2*np.log(1+_mahalanobis(theta_prime - mu, chol_cov)/nu)
+            B = -(n_dim+nu)/2*np.log(1+delta/nu)
+            log_ratio = logdetj_prime - logdetj + logdetj_flow_prime - logdetj_flow - A + B
+
+        # Compute log-prior first, log-likelihood only where needed, and apply Metropolis criterion
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, beta, log_like, log_prior, blobs, threshold,
+                           log_like_approx, logl_approx)
+        logl_prime, logp_prime, blobs_prime = step['logl'], step['logp'], step['blobs']
+        mask = step['accept']
+
+        n_calls += step['calls']
+        n_threshold_rejections += step['threshold_rejections']
+        n_calls_approx += step['calls_approx']
+        n_screened += step['screened']
+        n_accepted += np.sum(mask)
+
+        # Fall back to standard Metropolis if the approximate likelihood is too inaccurate
+        if logl_approx is not None and approx_tolerance is not None:
+            approx_residuals.extend(step['residuals'])
+            if len(approx_residuals) >= n_walkers and beta * np.std(approx_residuals) > approx_tolerance:
+                log_like_approx = None
+                logl_approx = None
 
         # Accept new points
         theta[mask] = theta_prime[mask]
+        if mixture:
+            log_t[mask] = log_t_prime[mask]
         u[mask] = u_prime[mask]
         x[mask] = x_prime[mask]
         logdetj[mask] = logdetj_prime[mask]
@@ -136,19 +528,22 @@ def preconditioned_pcn(state_dict: dict,
         logp[mask] = logp_prime[mask]
         if have_blobs:
             blobs[mask] = blobs_prime[mask]
+        if logl_approx is not None:
+            logl_approx[mask] = step['logl_approx'][mask]
 
         # Adapt scale parameter using diminishing adaptation
-        sigma = np.abs(np.minimum(sigma + 1 / (i + 1)**0.75 * (np.mean(alpha) - 0.234), np.minimum(2.38 / n_dim**0.5, 0.99)))
-        #sigma = np.minimum(sigma + 1 / (i + 1)**0.5 * (np.mean(alpha) - 0.234), 0.99)
+        sigma = np.abs(np.minimum(sigma + 1 / (i + 1)**0.75 * (np.mean(mask) - 0.234), np.minimum(2.38 / n_dim**0.5, 0.99)))
+        #sigma = np.minimum(sigma + 1 / (i + 1)**0.5 * (np.mean(mask) - 0.234), 0.99)
 
         # Adapt mean parameter using diminishing adaptation
-        mu = mu + 1.0 / (i + 1.0) * (np.mean(theta, axis=0) - mu)
+        if not mixture:
+            mu = mu + 1.0 / (i + 1.0) * (np.mean(theta, axis=0) - mu)
 
         # Update progress bar if available
         if progress_bar is not None:
             progress_bar.update_stats(
-                dict(calls=progress_bar.info['calls'] + np.sum(finite_mask),
-                    acc=np.mean(alpha),
+                dict(calls=progress_bar.info['calls'] + step['calls'],
+                    acc=np.mean(mask),
                     steps=i,
                     logP=np.mean(logl + logp),
                     eff=sigma / (2.38 / np.sqrt(n_dim)),
@@ -156,20 +551,27 @@ def preconditioned_pcn(state_dict: dict,
             )
 
         # Loop termination criteria:
-        logp2_val_new = np.mean(logl + logp)
-        if logp2_val_new > logp2_val:
-            cnt = 0
-            logp2_val = logp2_val_new
-        else:
-            cnt += 1
-            if cnt >= n_steps * ((2.38 / n_dim**0.5) / sigma)**2.0:
+        if termination is not None:
+            if termination.update(theta):
                 break
+        else:
+            logp2_val_new = np.mean(logl + logp)
+            if logp2_val_new > logp2_val:
+                cnt = 0
+                logp2_val = logp2_val_new
+            else:
+                cnt += 1
+                if cnt >= n_steps * ((2.38 / n_dim**0.5) / sigma)**2.0:
+                    break
 
         if i >= n_max:
             break
 
     return dict(u=u, x=x, logdetj=logdetj, logl=logl, logp=logp, blobs=blobs, efficiency=sigma, 
-                accept=np.mean(alpha), steps=i, calls=n_calls, proposal_scale=sigma)
+                accept=np.mean(mask), steps=i, calls=n_calls, calls_approx=n_calls_approx,
+                threshold_rejections=n_threshold_rejections,
+                accept_stage1=n_screened / (i * n_walkers), accept_stage2=n_accepted / np.maximum(n_screened, 1),
+                proposal_scale=sigma)
 
 @torch.no_grad()
 def preconditioned_rwm(state_dict: dict,
@@ -191,8 +593,12 @@ def preconditioned_rwm(state_dict: dict,
     -------
     Results dictionary
     """
-    # Likelihood call counter
+    # Likelihood call counters
     n_calls = 0
+    n_threshold_rejections = 0
+    n_calls_approx = 0
+    n_screened = 0
+    n_accepted = 0
 
     # Clone state variables
     u = np.copy(state_dict.get('u'))
@@ -210,6 +616,7 @@ def preconditioned_rwm(state_dict: dict,
     # Get functions
     log_like = function_dict.get('loglike')
     log_prior = function_dict.get('logprior')
+    log_like_approx = function_dict.get('loglike_approx')
     scaler = function_dict.get('scaler')
     flow = flow_numpy_wrapper(function_dict.get('flow'))
     geometry = function_dict.get('theta_geometry')
@@ -218,65 +625,79 @@ def preconditioned_rwm(state_dict: dict,
     n_max = option_dict.get('n_max')
     n_steps = option_dict.get('n_steps')
     progress_bar = option_dict.get('progress_bar')
+    termination = option_dict.get('termination')
+    threshold = option_dict.get('threshold', False)
+    approx_tolerance = option_dict.get('approx_tolerance')
     sigma = option_dict.get('proposal_scale')
 
     # Get number of particles and parameters/dimensions
     n_walkers, n_dim = x.shape
 
+    # Approximate log-likelihood of the current state for delayed acceptance
+    if log_like_approx is not None:
+        logl_approx = log_like_approx(x)
+        n_calls_approx += n_walkers
+    else:
+        logl_approx = None
+    approx_residuals = []
+
 
-    cov = geometry.normal_cov
-    chol = np.linalg.cholesky(cov)
+    chol = geometry.cov_factor('normal')
 
     # Transform u to theta
     theta, logdetj_flow = flow.forward(u)
 
+    # Output arrays of the inverse flow and scaler, reused at every step
+    u_prime = np.empty((n_walkers, n_dim))
+    logdetj_flow_prime = np.empty(n_walkers)
+    x_prime = np.empty((n_walkers, n_dim))
+    logdetj_prime = np.empty(n_walkers)
+
     logp2_val = np.mean(logl + logp + logdetj)
     cnt = 0
 
+    if termination is not None:
+        termination.reset(theta)
+
     i = 0
     while True:
         i += 1
 
         # Propose new points in theta space
-        theta_prime = np.empty((n_walkers, n_dim))
-        for k in range(n_walkers):
-            theta_prime[k] = theta[k] + sigma * np.dot(chol, np.random.randn(n_dim))
+        theta_prime = theta + sigma * _correlated_normal(n_walkers, chol)
 
         # Transform to u space
-        u_prime, logdetj_flow_prime = flow.inverse(theta_prime)
+        flow.inverse(theta_prime, out=(u_prime, logdetj_flow_prime))
 
         # Transform to x space
-        x_prime, logdetj_prime = scaler.inverse(u_prime)
+        x_prime, logdetj_prime = scaler.inverse(u_prime, out=(x_prime, logdetj_prime))
 
         # Compute finite mask
         finite_mask_logdetj_prime = np.isfinite(logdetj_prime)
         finite_mask_x_prime = np.isfinite(x_prime).all(axis=1)
         finite_mask = finite_mask_logdetj_prime & finite_mask_x_prime
 
-        # Compute log-likelihood, log-prior, and log-posterior
-        u_rand = np.random.rand(n_walkers)
-        logl_prime = np.empty(n_walkers)
-        logp_prime = np.empty(n_walkers)
-        if have_blobs:
-            blobs_prime = np.empty(n_walkers, dtype=np.dtype((blobs[0].dtype, blobs[0].shape)))
-            logl_prime[finite_mask], blobs_prime[finite_mask] = log_like(x_prime[finite_mask])
-        else:
-            logl_prime[finite_mask], _ = log_like(x_prime[finite_mask])
-        logp_prime[finite_mask] = log_prior(x_prime[finite_mask])
-        logl_prime[~finite_mask] = -np.inf
-        logp_prime[~finite_mask] = -np.inf
+        # Compute Metropolis factors (excluding likelihood and prior terms)
+        log_ratio = logdetj_prime - logdetj + logdetj_flow_prime - logdetj_flow
 
-        n_calls += np.sum(finite_mask)
+        # Compute log-prior first, log-likelihood only where needed, and apply Metropolis criterion
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, beta, log_like, log_prior, blobs, threshold,
+                           log_like_approx, logl_approx)
+        logl_prime, logp_prime, blobs_prime = step['logl'], step['logp'], step['blobs']
+        mask = step['accept']
 
-        # Compute Metropolis factors
-        alpha = np.minimum(
-            np.ones(n_walkers),
-            np.exp(logl_prime * beta - logl * beta + logp_prime - logp + logdetj_prime - logdetj + logdetj_flow_prime - logdetj_flow)
-        )
-        alpha[np.isnan(alpha)] = 0.0
+        n_calls += step['calls']
+        n_threshold_rejections += step['threshold_rejections']
+        n_calls_approx += step['calls_approx']
+        n_screened += step['screened']
+        n_accepted += np.sum(mask)
 
-        # Metropolis criterion
-        mask = u_rand < alpha
+        # Fall back to standard Metropolis if the approximate likelihood is too inaccurate
+        if logl_approx is not None and approx_tolerance is not None:
+            approx_residuals.extend(step['residuals'])
+            if len(approx_residuals) >= n_walkers and beta * np.std(approx_residuals) > approx_tolerance:
+                log_like_approx = None
+                logl_approx = None
 
         # Accept new points
         theta[mask] = theta_prime[mask]
@@ -288,36 +709,275 @@ def preconditioned_rwm(state_dict: dict,
         logp[mask] = logp_prime[mask]
         if have_blobs:
             blobs[mask] = blobs_prime[mask]
+        if logl_approx is not None:
+            logl_approx[mask] = step['logl_approx'][mask]
 
         # Adapt scale parameter using diminishing adaptation
-        sigma = sigma + 1 / (i + 1) * (np.mean(alpha) - 0.234)
+        sigma = sigma + 1 / (i + 1) * (np.mean(mask) - 0.234)
 
         # Update progress bar if available
         if progress_bar is not None:
             progress_bar.update_stats(
-                dict(calls=progress_bar.info['calls'] + np.sum(finite_mask),
-                    acc=np.mean(alpha),
+                dict(calls=progress_bar.info['calls'] + step['calls'],
+                    acc=np.mean(mask),
                     steps=i,
                     logP=np.mean(logl + logp),
                     eff=sigma / (2.38 / np.sqrt(n_dim)))
             )
 
         # Loop termination criteria:
-        logp2_val_new = np.mean(logl + logp + logdetj)
-        if logp2_val_new > logp2_val:
-            cnt = 0
-            logp2_val = logp2_val_new
-        else:
-            cnt += 1
-            if cnt >= n_steps * (np.minimum(1.0, (2.38 / n_dim**0.5) / sigma))**2.0:
+        if termination is not None:
+            if termination.update(theta):
                 break
+        else:
+            logp2_val_new = np.mean(logl + logp + logdetj)
+            if logp2_val_new > logp2_val:
+                cnt = 0
+                logp2_val = logp2_val_new
+            else:
+                cnt += 1
+                if cnt >= n_steps * (np.minimum(1.0, (2.38 / n_dim**0.5) / sigma))**2.0:
+                    break
 
         if i >= n_max:
             break
 
 
     return dict(u=u, x=x, logdetj=logdetj, logl=logl, logp=logp, blobs=blobs, efficiency=sigma, 
-                accept=np.mean(alpha), steps=i, calls=n_calls, proposal_scale=sigma)
+                accept=np.mean(mask), steps=i, calls=n_calls, calls_approx=n_calls_approx,
+                threshold_rejections=n_threshold_rejections,
+                accept_stage1=n_screened / (i * n_walkers), accept_stage2=n_accepted / np.maximum(n_screened, 1),
+                proposal_scale=sigma)
+
+
+@torch.no_grad()
+def preconditioned_independence(state_dict: dict,
+                                function_dict: dict,
+                                option_dict: dict):
+    """
+    Flow independence sampler mixed with doubly preconditioned Crank-Nicolson
+
+    At every step each walker proposes, with probability equal to the mixture
+    weight, a new point drawn from the base distribution of the normalizing flow
+    (i.e. a new sample of the flow) that is accepted with the independence
+    Metropolis-Hastings ratio, and a tpCN move otherwise. Both moves leave the
+    target invariant and so does their mixture. An accepted independence proposal
+    decorrelates a walker in a single step, so the mixture weight is adapted from
+    the measured acceptance rates of the two moves towards the one that gives the
+    most decorrelation per step.
+
+    Parameters
+    ----------
+    state_dict : dict
+        Dictionary of current state
+    function_dict : dict
+        Dictionary of functions.
+    option_dict : dict
+        Dictionary of options.
+
+    Returns
+    -------
+    Results dictionary
+    """
+    # Likelihood call counters
+    n_calls = 0
+    n_threshold_rejections = 0
+    n_calls_approx = 0
+    n_screened = 0
+    n_accepted = 0
+
+    # Clone state variables
+    u = np.copy(state_dict.get('u'))
+    x = np.copy(state_dict.get('x'))
+    logdetj = np.copy(state_dict.get('logdetj'))
+    logl = np.copy(state_dict.get('logl'))
+    logp = np.copy(state_dict.get('logp'))
+    beta = state_dict.get('beta')
+    blobs = state_dict.get('blobs')
+    if blobs is None:
+        have_blobs = False
+    else:
+        have_blobs = True
+
+    # Get functions
+    log_like = function_dict.get('loglike')
+    log_prior = function_dict.get('logprior')
+    log_like_approx = function_dict.get('loglike_approx')
+    scaler = function_dict.get('scaler')
+    flow = flow_numpy_wrapper(function_dict.get('flow'))
+    base = function_dict.get('flow').flow().base
+    geometry = function_dict.get('theta_geometry')
+
+    # Get MCMC options
+    n_max = option_dict.get('n_max')
+    n_steps = option_dict.get('n_steps')
+    progress_bar = option_dict.get('progress_bar')
+    termination = option_dict.get('termination')
+    threshold = option_dict.get('threshold', False)
+    approx_tolerance = option_dict.get('approx_tolerance')
+    sigma = np.minimum(option_dict.get('proposal_scale'), 0.99)
+    weight = option_dict.get('independence_weight', 0.5)
+    weight_min, weight_max = 0.05, 0.95
+
+    # Get number of particles and parameters/dimensions
+    n_walkers, n_dim = x.shape
+
+    # Approximate log-likelihood of the current state for delayed acceptance
+    if log_like_approx is not None:
+        logl_approx = log_like_approx(x)
+        n_calls_approx += n_walkers
+    else:
+        logl_approx = None
+    approx_residuals = []
+
+    # Transform u to theta
+    theta, logdetj_flow = flow.forward(u)
+    theta = theta.astype(np.float64)
+    logq = torch_to_numpy(base.log_prob(numpy_to_torch(theta))).astype(np.float64)
+
+    # Output arrays of the inverse flow and scaler, reused at every step
+    u_prime = np.empty((n_walkers, n_dim))
+    logdetj_flow_prime = np.empty(n_walkers)
+    x_prime = np.empty((n_walkers, n_dim))
+    logdetj_prime = np.empty(n_walkers)
+
+    mu = geometry.t_mean
+    nu = geometry.t_nu
+
+    chol_cov = geometry.cov_factor('t')
+
+    # Acceptance statistics of the two moves
+    sum_accept_independence, n_independence = 0.0, 0
+    sum_accept_pcn, n_pcn = 0.0, 0
+
+    logp2_val = np.mean(logl + logp)
+    cnt = 0
+
+    if termination is not None:
+        termination.reset(theta)
+
+    i = 0
+    while True:
+        i += 1
+
+        # Choose the move of each walker
+        independence_mask = np.random.rand(n_walkers) < weight
+
+        # tpCN proposals
+        theta_prime, quad = _tpcn_propose(theta, mu, chol_cov, nu, sigma)
+
+        # Independence proposals from the base distribution of the flow
+        theta_prime[independence_mask] = torch_to_numpy(base.sample((np.sum(independence_mask),)))
+        logq_prime = torch_to_numpy(base.log_prob(numpy_to_torch(theta_prime))).astype(np.float64)
+
+        # Transform to u space
+        flow.inverse(theta_prime, out=(u_prime, logdetj_flow_prime))
+
+        # Transform to x space
+        x_prime, logdetj_prime = scaler.inverse(u_prime, out=(x_prime, logdetj_prime))
+
+        # Compute finite mask
+        finite_mask_logdetj_prime = np.isfinite(logdetj_prime)
+        finite_mask_x_prime = np.isfinite(x_prime).all(axis=1)
+        finite_mask = finite_mask_logdetj_prime & finite_mask_x_prime
+
+        # Compute Metropolis factors (excluding likelihood and prior terms)
+        quad_prime = _mahalanobis(theta_prime - mu, chol_cov)
+        A = -(n_dim + nu) / 2 * np.log(1 + quad_prime / nu)
+        B = -(n_dim + nu) / 2 * np.log(1 + quad / nu)
+        log_ratio = logdetj_prime - logdetj + logdetj_flow_prime - logdetj_flow
+        log_ratio += np.where(independence_mask, logq - logq_prime, B - A)
+
+        # Compute log-prior first, log-likelihood only where needed, and apply Metropolis criterion
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, beta, log_like, log_prior, blobs, threshold,
+                           log_like_approx, logl_approx)
+        logl_prime, logp_prime, blobs_prime = step['logl'], step['logp'], step['blobs']
+        mask = step['accept']
+
+        n_calls += step['calls']
+        n_threshold_rejections += step['threshold_rejections']
+        n_calls_approx += step['calls_approx']
+        n_screened += step['screened']
+        n_accepted += np.sum(mask)
+
+        # Fall back to standard Metropolis if the approximate likelihood is too inaccurate
+        if logl_approx is not None and approx_tolerance is not None:
+            approx_residuals.extend(step['residuals'])
+            if len(approx_residuals) >= n_walkers and beta * np.std(approx_residuals) > approx_tolerance:
+                log_like_approx = None
+                logl_approx = None
+
+        # Accept new points
+        theta[mask] = theta_prime[mask]
+        u[mask] = u_prime[mask]
+        x[mask] = x_prime[mask]
+        logdetj[mask] = logdetj_prime[mask]
+        logdetj_flow[mask] = logdetj_flow_prime[mask]
+        logl[mask] = logl_prime[mask]
+        logp[mask] = logp_prime[mask]
+        logq[mask] = logq_prime[mask]
+        if have_blobs:
+            blobs[mask] = blobs_prime[mask]
+        if logl_approx is not None:
+            logl_approx[mask] = step['logl_approx'][mask]
+
+        # Update acceptance statistics of the two moves
+        sum_accept_independence += np.sum(mask[independence_mask])
+        n_independence += np.sum(independence_mask)
+        sum_accept_pcn += np.sum(mask[~independence_mask])
+        n_pcn += np.sum(~independence_mask)
+        accept_independence = sum_accept_independence / np.maximum(n_independence, 1)
+        accept_pcn = sum_accept_pcn / np.maximum(n_pcn, 1)
+
+        # Adapt scale parameter of tpCN moves using diminishing adaptation
+        if np.any(~independence_mask):
+            sigma = np.abs(np.minimum(sigma + 1 / (i + 1)**0.75 * (np.mean(mask[~independence_mask]) - 0.234),
+                                      np.minimum(2.38 / n_dim**0.5, 0.99)))
+
+        # Adapt mixture weight using diminishing adaptation. An accepted independence proposal
+        # decorrelates a walker completely, an accepted tpCN move only by 1 - sqrt(1 - sigma^2).
+        gain_independence = accept_independence
+        gain_pcn = accept_pcn * (1.0 - (1.0 - sigma ** 2.0) ** 0.5)
+        if gain_independence + gain_pcn > 0.0:
+            weight_target = gain_independence / (gain_independence + gain_pcn)
+            weight = np.clip(weight + 1 / (i + 1)**0.75 * (weight_target - weight), weight_min, weight_max)
+
+        # Adapt mean parameter using diminishing adaptation
+        mu = mu + 1.0 / (i + 1.0) * (np.mean(theta, axis=0) - mu)
+
+        # Update progress bar if available
+        if progress_bar is not None:
+            progress_bar.update_stats(
+                dict(calls=progress_bar.info['calls'] + step['calls'],
+                    acc=np.mean(mask),
+                    steps=i,
+                    logP=np.mean(logl + logp),
+                    eff=sigma / (2.38 / np.sqrt(n_dim)),
+                    )
+            )
+
+        # Loop termination criteria (accepted independence proposals shorten the plateau):
+        if termination is not None:
+            if termination.update(theta):
+                break
+        else:
+            logp2_val_new = np.mean(logl + logp)
+            if logp2_val_new > logp2_val:
+                cnt = 0
+                logp2_val = logp2_val_new
+            else:
+                cnt += 1
+                if cnt >= n_steps * ((2.38 / n_dim**0.5) / sigma)**2.0 * (1.0 - weight * accept_independence):
+                    break
+
+        if i >= n_max:
+            break
+
+    return dict(u=u, x=x, logdetj=logdetj, logl=logl, logp=logp, blobs=blobs, efficiency=sigma,
+                accept=np.mean(mask), steps=i, calls=n_calls, calls_approx=n_calls_approx,
+                threshold_rejections=n_threshold_rejections,
+                accept_stage1=n_screened / (i * n_walkers), accept_stage2=n_accepted / np.maximum(n_screened, 1),
+                proposal_scale=sigma, independence_weight=weight, accept_independence=accept_independence)
 
 
 def pcn(state_dict: dict,
@@ -339,8 +999,12 @@ def pcn(state_dict: dict,
     -------
     Results dictionary
     """
-    # Likelihood call counter
+    # Likelihood call counters
     n_calls = 0
+    n_threshold_rejections = 0
+    n_calls_approx = 0
+    n_screened = 0
+    n_accepted = 0
 
     # Clone state variables
     u = np.copy(state_dict.get('u'))
@@ -358,6 +1022,7 @@ def pcn(state_dict: dict,
     # Get functions
     log_like = function_dict.get('loglike')
     log_prior = function_dict.get('logprior')
+    log_like_approx = function_dict.get('loglike_approx')
     scaler = function_dict.get('scaler')
     geometry = function_dict.get('u_geometry')
 
@@ -365,113 +1030,146 @@ def pcn(state_dict: dict,
     n_max = option_dict.get('n_max')
     n_steps = option_dict.get('n_steps')
     progress_bar = option_dict.get('progress_bar')
+    termination = option_dict.get('termination')
+    threshold = option_dict.get('threshold', False)
+    approx_tolerance = option_dict.get('approx_tolerance')
     sigma = np.minimum(option_dict.get('proposal_scale'), 0.99)
 
     # Get number of particles and parameters/dimensions
     n_walkers, n_dim = x.shape
 
+    # Approximate log-likelihood of the current state for delayed acceptance
+    if log_like_approx is not None:
+        logl_approx = log_like_approx(x)
+        n_calls_approx += n_walkers
+    else:
+        logl_approx = None
+    approx_residuals = []
+
     mu = geometry.t_mean
-    cov = geometry.t_cov
     nu = geometry.t_nu
 
-    inv_cov = np.linalg.inv(cov)
-    chol_cov = np.linalg.cholesky(cov)
+    chol_cov = geometry.cov_factor('t')
+
+    # With a mixture of t distributions, each walker proposes relative to a component drawn
+    # from its responsibilities. The resulting proposal is reversible with respect to the
+    # mixture density, which replaces the t density in the Metropolis ratio.
+    mixture = geometry.n_components > 1
+    if mixture:
+        mixture_chols = np.linalg.cholesky(geometry.mixture_covs)
+        log_t = geometry.log_density(u)
+
+    # Output arrays of the scaler, reused at every step
+    x_prime = np.empty((n_walkers, n_dim))
+    logdetj_prime = np.empty(n_walkers)
 
     logp2_val = np.mean(logl + logp)
     #logp2_val = np.mean(logl * beta + logp)
     cnt = 0
 
+    if termination is not None:
+        termination.reset(u)
+
     i = 0
     while True:
         i += 1
 
-        diff = u - mu
-        s = np.empty(n_walkers)
-        for k in range(n_walkers):
-            s[k] = 1./np.random.gamma((n_dim + nu) / 2, 2.0/(nu + np.dot(diff[k],np.dot(inv_cov,diff[k]))))
-
         # Propose new points in u space
-        u_prime = np.empty((n_walkers, n_dim))
-        for k in range(n_walkers):
-            u_prime[k] = mu + (1.0 - sigma ** 2.0) ** 0.5 * diff[k] + sigma * np.sqrt(s[k]) * np.dot(chol_cov, np.random.randn(n_dim))        
+        if mixture:
+            components = geometry.sample_components(u)
+            u_prime = np.empty((n_walkers, n_dim))
+            for k in range(geometry.n_components):
+                idx = components == k
+                u_prime[idx] = _tpcn_propose(u[idx], geometry.mixture_means[k], mixture_chols[k],
+                                             geometry.mixture_nus[k], sigma)[0]
+        else:
+            u_prime, delta = _tpcn_propose(u, mu, chol_cov, nu, sigma)
 
         # Transform to x space
-        x_prime, logdetj_prime = scaler.inverse(u_prime)
+        x_prime, logdetj_prime = scaler.inverse(u_prime, out=(x_prime, logdetj_prime))
 
         # Compute finite mask
         finite_mask_logdetj_prime = np.isfinite(logdetj_prime)
         finite_mask_x_prime = np.isfinite(x_prime).all(axis=1)
         finite_mask = finite_mask_logdetj_prime & finite_mask_x_prime
 
-        # Compute log-likelihood, log-prior, and log-posterior
-        u_rand = np.random.rand(n_walkers)
-        logl_prime = np.empty(n_walkers)
-        logp_prime = np.empty(n_walkers)
-        if have_blobs:
-            blobs_prime = np.empty(n_walkers, dtype=np.dtype((blobs[0].dtype, blobs[0].shape)))
-            logl_prime[finite_mask], blobs_prime[finite_mask] = log_like(x_prime[finite_mask])
+        # Compute Metropolis factors (excluding likelihood and prior terms)
+        if mixture:
+            log_t_prime = geometry.log_density(u_prime)
+            log_ratio = logdetj_prime - logdetj - log_t_prime + log_t
         else:
-            logl_prime[finite_mask], _ = log_like(x_prime[finite_mask])
-        logp_prime[finite_mask] = log_prior(x_prime[finite_mask])
-        logl_prime[~finite_mask] = -np.inf
-        logp_prime[~finite_mask] = -np.inf
-        
-        n_calls += np.sum(finite_mask)
-
-        # Compute Metropolis factors
-        diff_prime = u_prime - mu
-        A = np.empty(n_walkers)
-        B = np.empty(n_walkers)
-        for k in range(n_walkers):
-            A[k] = -(n_dim+nu)/2*np.log(1+np.dot(diff_prime[k],np.dot(inv_cov,diff_prime[k]))/nu)
-            B[k] = -(n_dim+nu)/2*np.log(1+np.dot(diff[k],np.dot(inv_cov,diff[k]))/nu)
-        alpha = np.minimum(
-            np.ones(n_walkers),
-            np.exp(logl_prime * beta - logl * beta + logp_prime - logp + logdetj_prime - logdetj - A + B)
-        )
-        alpha[np.isnan(alpha)] = 0.0
-
-        # Metropolis criterion
-        mask = u_rand < alpha
+            A = -(n_dim+nu)/2*np.log(1+_mahalanobis(u_prime - mu, chol_cov)/nu)
+            B = -(n_dim+nu)/2*np.log(1+delta/nu)
+            log_ratio = logdetj_prime - logdetj - A + B
+
+        # Compute log-prior first, log-likelihood only where needed, and apply Metropolis criterion
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, beta, log_like, log_prior, blobs, threshold,
+                           log_like_approx, logl_approx)
+        logl_prime, logp_prime, blobs_prime = step['logl'], step['logp'], step['blobs']
+        mask = step['accept']
+
+        n_calls += step['calls']
+        n_threshold_rejections += step['threshold_rejections']
+        n_calls_approx += step['calls_approx']
+        n_screened += step['screened']
+        n_accepted += np.sum(mask)
+
+        # Fall back to standard Metropolis if the approximate likelihood is too inaccurate
+        if logl_approx is not None and approx_tolerance is not None:
+            approx_residuals.extend(step['residuals'])
+            if len(approx_residuals) >= n_walkers and beta * np.std(approx_residuals) > approx_tolerance:
+                log_like_approx = None
+                logl_approx = None
 
         # Accept new points
         u[mask] = u_prime[mask]
+        if mixture:
+            log_t[mask] = log_t_prime[mask]
         x[mask] = x_prime[mask]
         logdetj[mask] = logdetj_prime[mask]
         logl[mask] = logl_prime[mask]
         logp[mask] = logp_prime[mask]
         if have_blobs:
             blobs[mask] = blobs_prime[mask]
+        if logl_approx is not None:
+            logl_approx[mask] = step['logl_approx'][mask]
 
         # Adapt scale parameter using diminishing adaptation
-        sigma = np.abs(np.minimum(sigma + 1 / (i + 1)**0.75 * (np.mean(alpha) - 0.234), np.minimum(2.38 / n_dim**0.5, 0.99)))
-        #sigma = sigma + 1 / (i + 1)**0.75 * (np.mean(alpha) - 0.234)
+        sigma = np.abs(np.minimum(sigma + 1 / (i + 1)**0.75 * (np.mean(mask) - 0.234), np.minimum(2.38 / n_dim**0.5, 0.99)))
+        #sigma = sigma + 1 / (i + 1)**0.75 * (np.mean(mask) - 0.234)
 
         # Update progress bar if available
         if progress_bar is not None:
             progress_bar.update_stats(
-                dict(calls=progress_bar.info['calls'] + np.sum(finite_mask),
-                    acc=np.mean(alpha),
+                dict(calls=progress_bar.info['calls'] + step['calls'],
+                    acc=np.mean(mask),
                     steps=i,
                     logP=np.mean(logl + logp),
                     eff=sigma / (2.38 / np.sqrt(n_dim)))
             )
 
         # Loop termination criteria:
-        logp2_val_new = np.mean(logl + logp)
-        if logp2_val_new > logp2_val:
-            cnt = 0
-            logp2_val = logp2_val_new
-        else:
-            cnt += 1
-            if cnt >= n_steps * ((2.38 / n_dim**0.5) / sigma)**2.0:
+        if termination is not None:
+            if termination.update(u):
                 break
+        else:
+            logp2_val_new = np.mean(logl + logp)
+            if logp2_val_new > logp2_val:
+                cnt = 0
+                logp2_val = logp2_val_new
+            else:
+                cnt += 1
+                if cnt >= n_steps * ((2.38 / n_dim**0.5) / sigma)**2.0:
+                    break
 
         if i >= n_max:
             break
 
     return dict(u=u, x=x, logdetj=logdetj, logl=logl, logp=logp, blobs=blobs, efficiency=sigma, 
-                accept=np.mean(alpha), steps=i, calls=n_calls, proposal_scale=sigma)
+                accept=np.mean(mask), steps=i, calls=n_calls, calls_approx=n_calls_approx,
+                threshold_rejections=n_threshold_rejections,
+                accept_stage1=n_screened / (i * n_walkers), accept_stage2=n_accepted / np.maximum(n_screened, 1),
+                proposal_scale=sigma)
 
 def rwm(state_dict: dict,
         function_dict: dict,
@@ -492,8 +1190,12 @@ def rwm(state_dict: dict,
     -------
     Results dictionary
     """
-    # Likelihood call counter
+    # Likelihood call counters
     n_calls = 0
+    n_threshold_rejections = 0
+    n_calls_approx = 0
+    n_screened = 0
+    n_accepted = 0
 
     # Clone state variables
     u = np.copy(state_dict.get('u'))
@@ -511,6 +1213,7 @@ def rwm(state_dict: dict,
     # Get functions
     log_like = function_dict.get('loglike')
     log_prior = function_dict.get('logprior')
+    log_like_approx = function_dict.get('loglike_approx')
     scaler = function_dict.get('scaler')
     geometry = function_dict.get('u_geometry')
 
@@ -518,58 +1221,70 @@ def rwm(state_dict: dict,
     n_max = option_dict.get('n_max')
     n_steps = option_dict.get('n_steps')
     progress_bar = option_dict.get('progress_bar')
+    termination = option_dict.get('termination')
+    threshold = option_dict.get('threshold', False)
+    approx_tolerance = option_dict.get('approx_tolerance')
     sigma = option_dict.get('proposal_scale')
 
     # Get number of particles and parameters/dimensions
     n_walkers, n_dim = x.shape
 
-    cov = geometry.normal_cov
-    chol = np.linalg.cholesky(cov)
+    # Approximate log-likelihood of the current state for delayed acceptance
+    if log_like_approx is not None:
+        logl_approx = log_like_approx(x)
+        n_calls_approx += n_walkers
+    else:
+        logl_approx = None
+    approx_residuals = []
+
+    chol = geometry.cov_factor('normal')
+
+    # Output arrays of the scaler, reused at every step
+    x_prime = np.empty((n_walkers, n_dim))
+    logdetj_prime = np.empty(n_walkers)
 
     logp2_val = np.mean(logl + logp + logdetj)
     cnt = 0
 
+    if termination is not None:
+        termination.reset(u)
+
     i = 0
     while True:
         i += 1
 
         # Propose new points in theta space
-        u_prime = np.empty((n_walkers, n_dim))
-        for k in range(n_walkers):
-            u_prime[k] = u[k] + sigma * np.dot(chol, np.random.randn(n_dim))
+        u_prime = u + sigma * _correlated_normal(n_walkers, chol)
 
         # Transform to x space
-        x_prime, logdetj_prime = scaler.inverse(u_prime)
+        x_prime, logdetj_prime = scaler.inverse(u_prime, out=(x_prime, logdetj_prime))
 
         # Compute finite mask
         finite_mask_logdetj_prime = np.isfinite(logdetj_prime)
         finite_mask_x_prime = np.isfinite(x_prime).all(axis=1)
         finite_mask = finite_mask_logdetj_prime & finite_mask_x_prime
 
-        # Compute log-likelihood, log-prior, and log-posterior
-        u_rand = np.random.rand(n_walkers)
-        logl_prime = np.empty(n_walkers)
-        logp_prime = np.empty(n_walkers)
-        if have_blobs:
-            blobs_prime = np.empty(n_walkers, dtype=np.dtype((blobs[0].dtype, blobs[0].shape)))
-            logl_prime[finite_mask], blobs_prime[finite_mask] = log_like(x_prime[finite_mask])
-        else:
-            logl_prime[finite_mask], _ = log_like(x_prime[finite_mask])
-        logp_prime[finite_mask] = log_prior(x_prime[finite_mask])
-        logl_prime[~finite_mask] = -np.inf
-        logp_prime[~finite_mask] = -np.inf
+        # Compute Metropolis factors (excluding likelihood and prior terms)
+        log_ratio = logdetj_prime - logdetj
 
-        n_calls += np.sum(finite_mask)
+        # Compute log-prior first, log-likelihood only where needed, and apply Metropolis criterion
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, beta, log_like, log_prior, blobs, threshold,
+                           log_like_approx, logl_approx)
+        logl_prime, logp_prime, blobs_prime = step['logl'], step['logp'], step['blobs']
+        mask = step['accept']
 
-        # Compute Metropolis factors
-        alpha = np.minimum(
-            np.ones(n_walkers),
-            np.exp(logl_prime * beta - logl * beta + logp_prime - logp + logdetj_prime - logdetj)
-        )
-        alpha[np.isnan(alpha)] = 0.0
+        n_calls += step['calls']
+        n_threshold_rejections += step['threshold_rejections']
+        n_calls_approx += step['calls_approx']
+        n_screened += step['screened']
+        n_accepted += np.sum(mask)
 
-        # Metropolis criterion
-        mask = u_rand < alpha
+        # Fall back to standard Metropolis if the approximate likelihood is too inaccurate
+        if logl_approx is not None and approx_tolerance is not None:
+            approx_residuals.extend(step['residuals'])
+            if len(approx_residuals) >= n_walkers and beta * np.std(approx_residuals) > approx_tolerance:
+                log_like_approx = None
+                logl_approx = None
 
         # Accept new points
         u[mask] = u_prime[mask]
@@ -579,33 +1294,598 @@ def rwm(state_dict: dict,
         logp[mask] = logp_prime[mask]
         if have_blobs:
             blobs[mask] = blobs_prime[mask]
+        if logl_approx is not None:
+            logl_approx[mask] = step['logl_approx'][mask]
 
         # Adapt scale parameter using diminishing adaptation
-        sigma = np.abs(sigma + 1 / (i + 1) * (np.mean(alpha) - 0.234))
+        sigma = np.abs(sigma + 1 / (i + 1) * (np.mean(mask) - 0.234))
 
         # Update progress bar if available
         if progress_bar is not None:
             progress_bar.update_stats(
-                dict(calls=progress_bar.info['calls'] + np.sum(finite_mask),
-                    acc=np.mean(alpha),
+                dict(calls=progress_bar.info['calls'] + step['calls'],
+                    acc=np.mean(mask),
                     steps=i,
                     logP=np.mean(logl + logp),
                     eff=sigma / (2.38 / np.sqrt(n_dim)))
             )
 
         # Loop termination criteria:
-        logp2_val_new = np.mean(logl + logp + logdetj)
-        if logp2_val_new > logp2_val:
-            cnt = 0
-            logp2_val = logp2_val_new
-        else:
-            cnt += 1
-            if cnt >= n_steps * ((2.38 / n_dim**0.5) / sigma)**2.0:
+        if termination is not None:
+            if termination.update(u):
                 break
+        else:
+            logp2_val_new = np.mean(logl + logp + logdetj)
+            if logp2_val_new > logp2_val:
+                cnt = 0
+                logp2_val = logp2_val_new
+            else:
+                cnt += 1
+                if cnt >= n_steps * ((2.38 / n_dim**0.5) / sigma)**2.0:
+                    break
 
         if i >= n_max:
             break
 
 
     return dict(u=u, x=x, logdetj=logdetj, logl=logl, logp=logp, blobs=blobs, efficiency=sigma, 
-                accept=np.mean(alpha), steps=i, calls=n_calls, proposal_scale=sigma)
+                accept=np.mean(mask), steps=i, calls=n_calls, calls_approx=n_calls_approx,
+                threshold_rejections=n_threshold_rejections,
+                accept_stage1=n_screened / (i * n_walkers), accept_stage2=n_accepted / np.maximum(n_screened, 1),
+                proposal_scale=sigma)
+
+
+def _flow_forward_torch(flow, u):
+    # Transform u to theta with torch tensors, identity if no flow is provided
+    if flow is None:
+        return u.clone(), torch.zeros(len(u), dtype=torch.float64)
+    theta, logdetj_flow = flow.forward(u.float())
+    return theta.double(), -logdetj_flow.double()
+
+
+def _flow_inverse_torch(flow, theta):
+    # Transform theta to u with torch tensors, identity if no flow is provided
+    if flow is None:
+        return theta.clone(), torch.zeros(len(theta), dtype=torch.float64)
+    u, logdetj_flow = flow.inverse(theta.float())
+    return u.double(), logdetj_flow.double()
+
+
+@torch.no_grad()
+def preconditioned_pcn_torch(state_dict: dict,
+                             function_dict: dict,
+                             option_dict: dict):
+    """
+    Doubly Preconditioned Crank-Nicolson with torch likelihood
+
+    Torch backend of ``preconditioned_pcn``. Particles, proposals and acceptance
+    decisions are kept as tensors throughout the MCMC run and the likelihood
+    (``loglike_torch``) is called with tensors; the results are converted to numpy
+    only once at the end. If no flow is provided, it reduces to ``pcn``.
+
+    Parameters
+    ----------
+    state_dict : dict
+        Dictionary of current state
+    function_dict : dict
+        Dictionary of functions.
+    option_dict : dict
+        Dictionary of options.
+
+    Returns
+    -------
+    Results dictionary
+    """
+    # Likelihood call counters
+    n_calls = 0
+    n_threshold_rejections = 0
+
+    # Clone state variables
+    u = torch.tensor(state_dict.get('u'), dtype=torch.float64)
+    x = torch.tensor(state_dict.get('x'), dtype=torch.float64)
+    logdetj = torch.tensor(state_dict.get('logdetj'), dtype=torch.float64)
+    logl = torch.tensor(state_dict.get('logl'), dtype=torch.float64)
+    logp = torch.tensor(state_dict.get('logp'), dtype=torch.float64)
+    beta = state_dict.get('beta')
+
+    # Get functions
+    log_like = function_dict.get('loglike_torch')
+    log_prior = function_dict.get('logprior')
+    scaler = function_dict.get('scaler')
+    flow = function_dict.get('flow')
+    geometry = function_dict.get('theta_geometry').to_torch()
+
+    # Get MCMC options
+    n_max = option_dict.get('n_max')
+    n_steps = option_dict.get('n_steps')
+    progress_bar = option_dict.get('progress_bar')
+    termination = option_dict.get('termination')
+    threshold = option_dict.get('threshold', False)
+    sigma = np.minimum(option_dict.get('proposal_scale'), 0.99)
+
+    # Get number of particles and parameters/dimensions
+    n_walkers, n_dim = x.shape
+
+    # Transform u to theta
+    theta, logdetj_flow = _flow_forward_torch(flow, u)
+
+    mu = geometry.get('t_mean')
+    nu = geometry.get('t_nu')
+    inv_cov = geometry.get('t_inv_cov')
+    chol_cov = geometry.get('t_chol')
+
+    logp2_val = float(torch.mean(logl + logp))
+    cnt = 0
+
+    if termination is not None:
+        termination.reset(torch_to_numpy(theta))
+
+    i = 0
+    while True:
+        i += 1
+
+        diff = theta - mu
+        quad = torch.sum((diff @ inv_cov) * diff, dim=1)
+        s = 1.0 / torch.distributions.Gamma(torch.full((n_walkers,), (n_dim + nu) / 2, dtype=torch.float64),
+                                             (nu + quad) / 2.0).sample()
+
+        # Propose new points in theta space
+        noise = torch.randn(n_walkers, n_dim, dtype=torch.float64) @ chol_cov.T
+        theta_prime = mu + (1.0 - sigma ** 2.0) ** 0.5 * diff + sigma * torch.sqrt(s)[:, None] * noise
+
+        # Transform to u space
+        u_prime, logdetj_flow_prime = _flow_inverse_torch(flow, theta_prime)
+
+        # Transform to x space
+        x_prime, logdetj_prime = scaler.inverse_torch(u_prime)
+
+        # Compute finite mask
+        finite_mask = torch.isfinite(logdetj_prime) & torch.isfinite(x_prime).all(dim=1)
+
+        # Compute Metropolis factors (excluding likelihood and prior terms)
+        diff_prime = theta_prime - mu
+        quad_prime = torch.sum((diff_prime @ inv_cov) * diff_prime, dim=1)
+        A = -(n_dim + nu) / 2 * torch.log(1 + quad_prime / nu)
+        B = -(n_dim + nu) / 2 * torch.log(1 + quad / nu)
+        log_ratio = logdetj_prime - logdetj + logdetj_flow_prime - logdetj_flow - A + B
+
+        # Compute log-prior first, log-likelihood only where needed, and apply Metropolis criterion
+        step = _metropolis_torch(x_prime, finite_mask, log_ratio, logl, logp, beta, log_like, log_prior, threshold)
+        mask = step['accept']
+        mean_accept = float(torch.mean(mask.double()))
+
+        n_calls += step['calls']
+        n_threshold_rejections += step['threshold_rejections']
+
+        # Accept new points
+        theta[mask] = theta_prime[mask]
+        u[mask] = u_prime[mask]
+        x[mask] = x_prime[mask]
+        logdetj[mask] = logdetj_prime[mask]
+        logdetj_flow[mask] = logdetj_flow_prime[mask]
+        logl[mask] = step['logl'][mask]
+        logp[mask] = step['logp'][mask]
+
+        # Adapt scale parameter using diminishing adaptation
+        sigma = np.abs(np.minimum(sigma + 1 / (i + 1)**0.75 * (mean_accept - 0.234), np.minimum(2.38 / n_dim**0.5, 0.99)))
+
+        # Adapt mean parameter using diminishing adaptation
+        mu = mu + 1.0 / (i + 1.0) * (torch.mean(theta, dim=0) - mu)
+
+        # Update progress bar if available
+        if progress_bar is not None:
+            progress_bar.update_stats(
+                dict(calls=progress_bar.info['calls'] + step['calls'],
+                    acc=mean_accept,
+                    steps=i,
+                    logP=float(torch.mean(logl + logp)),
+                    eff=sigma / (2.38 / np.sqrt(n_dim)),
+                    )
+            )
+
+        # Loop termination criteria:
+        if termination is not None:
+            if termination.update(torch_to_numpy(theta)):
+                break
+        else:
+            logp2_val_new = float(torch.mean(logl + logp))
+            if logp2_val_new > logp2_val:
+                cnt = 0
+                logp2_val = logp2_val_new
+            else:
+                cnt += 1
+                if cnt >= n_steps * ((2.38 / n_dim**0.5) / sigma)**2.0:
+                    break
+
+        if i >= n_max:
+            break
+
+    return dict(u=torch_to_numpy(u), x=torch_to_numpy(x), logdetj=torch_to_numpy(logdetj), logl=torch_to_numpy(logl),
+                logp=torch_to_numpy(logp), blobs=None, efficiency=sigma, accept=mean_accept, steps=i, calls=n_calls,
+                threshold_rejections=n_threshold_rejections, calls_approx=0, accept_stage1=1.0,
+                accept_stage2=mean_accept, proposal_scale=sigma)
+
+
+@torch.no_grad()
+def preconditioned_rwm_torch(state_dict: dict,
+                             function_dict: dict,
+                             option_dict: dict):
+    """
+    Preconditioned Random-walk Metropolis with torch likelihood
+
+    Torch backend of ``preconditioned_rwm``. Particles, proposals and acceptance
+    decisions are kept as tensors throughout the MCMC run and the likelihood
+    (``loglike_torch``) is called with tensors; the results are converted to numpy
+    only once at the end. If no flow is provided, it reduces to ``rwm``.
+
+    Parameters
+    ----------
+    state_dict : dict
+        Dictionary of current state
+    function_dict : dict
+        Dictionary of functions.
+    option_dict : dict
+        Dictionary of options.
+
+    Returns
+    -------
+    Results dictionary
+    """
+    # Likelihood call counters
+    n_calls = 0
+    n_threshold_rejections = 0
+
+    # Clone state variables
+    u = torch.tensor(state_dict.get('u'), dtype=torch.float64)
+    x = torch.tensor(state_dict.get('x'), dtype=torch.float64)
+    logdetj = torch.tensor(state_dict.get('logdetj'), dtype=torch.float64)
+    logl = torch.tensor(state_dict.get('logl'), dtype=torch.float64)
+    logp = torch.tensor(state_dict.get('logp'), dtype=torch.float64)
+    beta = state_dict.get('beta')
+
+    # Get functions
+    log_like = function_dict.get('loglike_torch')
+    log_prior = function_dict.get('logprior')
+    scaler = function_dict.get('scaler')
+    flow = function_dict.get('flow')
+    geometry = function_dict.get('theta_geometry').to_torch()
+
+    # Get MCMC options
+    n_max = option_dict.get('n_max')
+    n_steps = option_dict.get('n_steps')
+    progress_bar = option_dict.get('progress_bar')
+    termination = option_dict.get('termination')
+    threshold = option_dict.get('threshold', False)
+    sigma = option_dict.get('proposal_scale')
+
+    # Get number of particles and parameters/dimensions
+    n_walkers, n_dim = x.shape
+
+    chol = geometry.get('normal_chol')
+
+    # Transform u to theta
+    theta, logdetj_flow = _flow_forward_torch(flow, u)
+
+    logp2_val = float(torch.mean(logl + logp + logdetj))
+    cnt = 0
+
+    if termination is not None:
+        termination.reset(torch_to_numpy(theta))
+
+    i = 0
+    while True:
+        i += 1
+
+        # Propose new points in theta space
+        theta_prime = theta + sigma * torch.randn(n_walkers, n_dim, dtype=torch.float64) @ chol.T
+
+        # Transform to u space
+        u_prime, logdetj_flow_prime = _flow_inverse_torch(flow, theta_prime)
+
+        # Transform to x space
+        x_prime, logdetj_prime = scaler.inverse_torch(u_prime)
+
+        # Compute finite mask
+        finite_mask = torch.isfinite(logdetj_prime) & torch.isfinite(x_prime).all(dim=1)
+
+        # Compute Metropolis factors (excluding likelihood and prior terms)
+        log_ratio = logdetj_prime - logdetj + logdetj_flow_prime - logdetj_flow
+
+        # Compute log-prior first, log-likelihood only where needed, and apply Metropolis criterion
+        step = _metropolis_torch(x_prime, finite_mask, log_ratio, logl, logp, beta, log_like, log_prior, threshold)
+        mask = step['accept']
+        mean_accept = float(torch.mean(mask.double()))
+
+        n_calls += step['calls']
+        n_threshold_rejections += step['threshold_rejections']
+
+        # Accept new points
+        theta[mask] = theta_prime[mask]
+        u[mask] = u_prime[mask]
+        x[mask] = x_prime[mask]
+        logdetj[mask] = logdetj_prime[mask]
+        logdetj_flow[mask] = logdetj_flow_prime[mask]
+        logl[mask] = step['logl'][mask]
+        logp[mask] = step['logp'][mask]
+
+        # Adapt scale parameter using diminishing adaptation
+        sigma = sigma + 1 / (i + 1) * (mean_accept - 0.234)
+
+        # Update progress bar if available
+        if progress_bar is not None:
+            progress_bar.update_stats(
+                dict(calls=progress_bar.info['calls'] + step['calls'],
+                    acc=mean_accept,
+                    steps=i,
+                    logP=float(torch.mean(logl + logp)),
+                    eff=sigma / (2.38 / np.sqrt(n_dim)))
+            )
+
+        # Loop termination criteria:
+        if termination is not None:
+            if termination.update(torch_to_numpy(theta)):
+                break
+        else:
+            logp2_val_new = float(torch.mean(logl + logp + logdetj))
+            if logp2_val_new > logp2_val:
+                cnt = 0
+                logp2_val = logp2_val_new
+            else:
+                cnt += 1
+                if cnt >= n_steps * (np.minimum(1.0, (2.38 / n_dim**0.5) / sigma))**2.0:
+                    break
+
+        if i >= n_max:
+            break
+
+    return dict(u=torch_to_numpy(u), x=torch_to_numpy(x), logdetj=torch_to_numpy(logdetj), logl=torch_to_numpy(logl),
+                logp=torch_to_numpy(logp), blobs=None, efficiency=sigma, accept=mean_accept, steps=i, calls=n_calls,
+                threshold_rejections=n_threshold_rejections, calls_approx=0, accept_stage1=1.0,
+                accept_stage2=mean_accept, proposal_scale=sigma)
+
+
+def pcn_torch(state_dict: dict,
+              function_dict: dict,
+              option_dict: dict):
+    """
+    t-preconditioned Crank-Nicolson with torch likelihood (without normalizing flow).
+
+    Parameters
+    ----------
+    state_dict : dict
+        Dictionary of current state
+    function_dict : dict
+        Dictionary of functions.
+    option_dict : dict
+        Dictionary of options.
+
+    Returns
+    -------
+    Results dictionary
+    """
+    return preconditioned_pcn_torch(state_dict,
+                                    dict(function_dict, flow=None, theta_geometry=function_dict.get('u_geometry')),
+                                    option_dict)
+
+
+def rwm_torch(state_dict: dict,
+              function_dict: dict,
+              option_dict: dict):
+    """
+    Random-walk Metropolis with torch likelihood (without normalizing flow).
+
+    Parameters
+    ----------
+    state_dict : dict
+        Dictionary of current state
+    function_dict : dict
+        Dictionary of functions.
+    option_dict : dict
+        Dictionary of options.
+
+    Returns
+    -------
+    Results dictionary
+    """
+    return preconditioned_rwm_torch(state_dict,
+                                    dict(function_dict, flow=None, theta_geometry=function_dict.get('u_geometry')),
+                                    option_dict)
+
+
+def preconditioned_hmc(state_dict: dict,
+                       function_dict: dict,
+                       option_dict: dict):
+    """
+    Preconditioned Hamiltonian Monte Carlo
+
+    Hamiltonian dynamics are simulated in the latent space of the normalizing flow
+    (or in the space of the scaler if no flow is provided) using a batched leapfrog
+    integrator for all walkers simultaneously. Gradients of the tempered log posterior
+    are computed with autograd through the inverse flow, the inverse scaler and the
+    likelihood, which must therefore be written in torch (see ``loglike_torch``).
+    Metropolis-adjusted Langevin algorithm (MALA) corresponds to a single leapfrog step.
+
+    Parameters
+    ----------
+    state_dict : dict
+        Dictionary of current state
+    function_dict : dict
+        Dictionary of functions.
+    option_dict : dict
+        Dictionary of options.
+
+    Returns
+    -------
+    Results dictionary
+
+    Notes
+    -----
+    The prior is evaluated with numpy and its gradient is not included in the
+    Hamiltonian dynamics. It is, however, included exactly in the Metropolis
+    correction, so the target distribution is preserved; informative priors only
+    lower the acceptance rate.
+    """
+    # Likelihood call counter
+    n_calls = 0
+
+    # Clone state variables
+    u = np.copy(state_dict.get('u'))
+    x = np.copy(state_dict.get('x'))
+    logdetj = np.copy(state_dict.get('logdetj'))
+    logl = np.copy(state_dict.get('logl'))
+    logp = np.copy(state_dict.get('logp'))
+    beta = state_dict.get('beta')
+
+    # Get functions
+    log_like = function_dict.get('loglike_torch')
+    log_prior = function_dict.get('logprior')
+    scaler = function_dict.get('scaler')
+    flow = function_dict.get('flow')
+
+    # Get MCMC options
+    n_max = option_dict.get('n_max')
+    n_steps = option_dict.get('n_steps')
+    progress_bar = option_dict.get('progress_bar')
+    termination = option_dict.get('termination')
+    n_leapfrog = option_dict.get('n_leapfrog', 10)
+    target_accept = option_dict.get('target_accept', 0.65)
+    step_size = option_dict.get('proposal_scale')
+
+    # Get number of particles and parameters/dimensions
+    n_walkers, n_dim = x.shape
+
+    def log_target(theta):
+        # Tempered log posterior without the prior and its gradient with respect to theta
+        theta = theta.detach().requires_grad_(True)
+        with torch.enable_grad():
+            u_, logdetj_flow_ = _flow_inverse_torch(flow, theta)
+            x_, logdetj_ = scaler.inverse_torch(u_)
+            logl_ = torch.as_tensor(log_like(x_), dtype=torch.float64).reshape(-1)
+            target = beta * logl_ + logdetj_ + logdetj_flow_
+            grad = torch.autograd.grad(target.sum(), theta)[0].double()
+        # Non-finite gradients are zeroed to keep the trajectory finite, and the walkers are rejected below
+        finite_grad = torch.isfinite(grad).all(dim=1)
+        grad[~finite_grad] = 0.0
+        return dict(u=u_.detach(), x=x_.detach(), logdetj=logdetj_.detach(),
+                    logl=logl_.detach(), target=target.detach(), grad=grad, finite_grad=finite_grad)
+
+    # Transform u to theta
+    with torch.no_grad():
+        theta, logdetj_flow = _flow_forward_torch(flow, torch.as_tensor(u, dtype=torch.float64))
+
+    # The likelihood is evaluated at the start points for the gradient only. The stored values
+    # are kept for the Hamiltonian, so that walkers that never move return a consistent state.
+    current = log_target(theta)
+    n_calls += n_walkers
+    current.update(u=torch.tensor(u, dtype=torch.float64), x=torch.tensor(x, dtype=torch.float64),
+                   logdetj=torch.tensor(logdetj, dtype=torch.float64), logl=torch.tensor(logl, dtype=torch.float64))
+    current['target'] = beta * current.get('logl') + current.get('logdetj') + logdetj_flow
+
+    logp2_val = np.mean(logl + logp + logdetj)
+    cnt = 0
+
+    if termination is not None:
+        termination.reset(torch_to_numpy(theta))
+
+    i = 0
+    while True:
+        i += 1
+
+        # Batched leapfrog integration for all walkers
+        momentum_0 = torch.randn(n_walkers, n_dim, dtype=torch.float64)
+        momentum = momentum_0 + 0.5 * step_size * current.get('grad')
+        theta_prime = theta.clone()
+        finite_grad = current.get('finite_grad').clone()
+        for l in range(n_leapfrog):
+            theta_prime = theta_prime + step_size * momentum
+            proposal = log_target(theta_prime)
+            finite_grad &= proposal.get('finite_grad')
+            if l < n_leapfrog - 1:
+                momentum = momentum + step_size * proposal.get('grad')
+        momentum = momentum + 0.5 * step_size * proposal.get('grad')
+        n_calls += n_walkers * n_leapfrog
+
+        # Compute log-prior of the final positions, rejecting trajectories with non-finite gradients
+        x_prime = torch_to_numpy(proposal.get('x'))
+        finite_mask = np.isfinite(x_prime).all(axis=1) & np.isfinite(torch_to_numpy(proposal.get('target')))
+        finite_mask &= torch_to_numpy(finite_grad)
+        logp_prime = np.full(n_walkers, -np.inf)
+        if np.any(finite_mask):
+            logp_prime[finite_mask] = log_prior(x_prime[finite_mask])
+
+        # Apply Metropolis criterion to the change of the Hamiltonian
+        hamiltonian = -torch_to_numpy(current.get('target')) - logp + 0.5 * torch_to_numpy(torch.sum(momentum_0 ** 2, dim=1))
+        hamiltonian_prime = -torch_to_numpy(proposal.get('target')) - logp_prime + 0.5 * torch_to_numpy(torch.sum(momentum ** 2, dim=1))
+        alpha = np.minimum(np.ones(n_walkers), np.exp(hamiltonian - hamiltonian_prime))
+        alpha[np.isnan(alpha)] = 0.0
+        alpha[~finite_mask] = 0.0
+
+        # Metropolis criterion
+        mask = np.random.rand(n_walkers) < alpha
+
+        # Accept new points
+        mask_torch = torch.as_tensor(mask)
+        theta[mask_torch] = theta_prime[mask_torch]
+        for key in current:
+            current[key][mask_torch] = proposal[key][mask_torch]
+        u[mask] = torch_to_numpy(proposal.get('u'))[mask]
+        x[mask] = x_prime[mask]
+        logdetj[mask] = torch_to_numpy(proposal.get('logdetj'))[mask]
+        logl[mask] = torch_to_numpy(proposal.get('logl'))[mask]
+        logp[mask] = logp_prime[mask]
+
+        # Adapt step size using diminishing adaptation
+        step_size = step_size * np.exp(1 / (i + 1) ** 0.75 * (np.mean(alpha) - target_accept))
+
+        # Update progress bar if available
+        if progress_bar is not None:
+            progress_bar.update_stats(
+                dict(calls=progress_bar.info['calls'] + n_walkers * n_leapfrog,
+                    acc=np.mean(alpha),
+                    steps=i,
+                    logP=np.mean(logl + logp),
+                    eff=step_size / (2.38 / np.sqrt(n_dim)))
+            )
+
+        # Loop termination criteria (counted in likelihood evaluations per walker):
+        if termination is not None:
+            if termination.update(torch_to_numpy(theta)):
+                break
+        else:
+            logp2_val_new = np.mean(logl + logp + logdetj)
+            if logp2_val_new > logp2_val:
+                cnt = 0
+                logp2_val = logp2_val_new
+            else:
+                cnt += n_leapfrog
+                if cnt >= n_steps:
+                    break
+
+        if i * n_leapfrog >= n_max:
+            break
+
+    return dict(u=u, x=x, logdetj=logdetj, logl=logl, logp=logp, blobs=None, efficiency=step_size,
+                accept=np.mean(alpha), steps=i, calls=n_calls, threshold_rejections=0, calls_approx=0,
+                accept_stage1=1.0, accept_stage2=np.mean(alpha), proposal_scale=step_size)
+
+
+def hmc(state_dict: dict,
+        function_dict: dict,
+        option_dict: dict):
+    """
+    Hamiltonian Monte Carlo in the space of the scaler (without normalizing flow).
+
+    Parameters
+    ----------
+    state_dict : dict
+        Dictionary of current state
+    function_dict : dict
+        Dictionary of functions.
+    option_dict : dict
+        Dictionary of options.
+
+    Returns
+    -------
+    Results dictionary
+    """
+    return preconditioned_hmc(state_dict, dict(function_dict, flow=None), option_dict)
@@ -1,4 +1,286 @@
 import numpy as np
+from scipy.linalg import solve_triangular
+from scipy.special import xlogy, xlog1py, gammaln
+
+
+# Log densities, up to a constant, of the scipy.stats families with an analytic
+# fast path, as functions of the standardized variable ``y = (x - loc) / scale``
+# and of the shape parameters (an array of shape ``(n_shapes, n_columns)``).
+_LOG_KERNELS = dict(
+    uniform=lambda y, shapes: np.where((y >= 0.0) & (y <= 1.0), 0.0, -np.inf),
+    norm=lambda y, shapes: -0.5 * y ** 2,
+    truncnorm=lambda y, shapes: np.where((y >= shapes[0]) & (y <= shapes[1]), -0.5 * y ** 2, -np.inf),
+    loguniform=lambda y, shapes: np.where((y >= shapes[0]) & (y <= shapes[1]), -np.log(y), -np.inf),
+    beta=lambda y, shapes: np.where((y >= 0.0) & (y <= 1.0),
+                                    xlogy(shapes[0] - 1.0, y) + xlog1py(shapes[1] - 1.0, -y), -np.inf),
+    gamma=lambda y, shapes: np.where(y >= 0.0, xlogy(shapes[0] - 1.0, y) - y, -np.inf),
+)
+_LOG_KERNELS['reciprocal'] = _LOG_KERNELS['loguniform']
+
+# Standardized samplers of the families with a fast path in ``rvs``. They draw from
+# the random state exactly as scipy does, so the samples are unchanged.
+_RVS_KERNELS = dict(
+    uniform=lambda random_state, size: random_state.uniform(0.0, 1.0, size),
+    norm=lambda random_state, size: random_state.standard_normal(size),
+)
+
+
+def _parse_dist(dist):
+    """
+    Family name, shape parameters, location and scale of a frozen distribution.
+
+    Parameters
+    ----------
+    dist : scipy.stats distribution
+        A frozen distribution.
+
+    Returns
+    -------
+    params : tuple or None
+        The tuple ``(name, shapes, loc, scale)``, or ``None`` if the distribution
+        has no fast path.
+    """
+    try:
+        name = dist.dist.name
+        shapes, loc, scale = dist.dist._parse_args(*dist.args, **dist.kwds)
+        shapes = np.array(shapes, dtype=np.float64)
+        loc, scale = float(loc), float(scale)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if name not in _LOG_KERNELS or shapes.ndim != 1 or not scale > 0.0:
+        return None
+    return name, shapes, loc, scale
+
+
+def _compile_dists(dists):
+    """
+    Group the distributions of the same family for vectorized evaluation.
+
+    The log density of each column of a group is the family kernel plus a constant,
+    which is computed once with scipy at the median of the distribution.
+
+    Parameters
+    ----------
+    dists : list of scipy.stats distributions or Block
+        A list of distributions for each parameter or block of parameters.
+
+    Returns
+    -------
+    groups : list of dict
+        Groups of columns of the same family, with the family name (``name``), the
+        column indices (``idx``), locations (``loc``), scales (``scale``), shape
+        parameters (``shapes``) and the sum of the log density constants (``const``).
+    fallback : list of tuple
+        Pairs ``(i, dist)`` of the columns evaluated with scipy.
+    blocks : list of tuple
+        Pairs ``(columns, block)`` of the slices of columns and their blocks.
+    """
+    families = {}
+    fallback = []
+    blocks = []
+    i = 0
+    for dist in dists:
+        if isinstance(dist, Block):
+            blocks.append((slice(i, i + dist.dim), dist))
+            i += dist.dim
+            continue
+        i += 1
+        params = _parse_dist(dist)
+        if params is None:
+            fallback.append((i - 1, dist))
+            continue
+        name, shapes, loc, scale = params
+        x0 = dist.median()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            const = dist.logpdf(x0) - _LOG_KERNELS[name](np.array([(x0 - loc) / scale]), shapes[:, None])[0]
+        if not np.isfinite(const):
+            fallback.append((i - 1, dist))
+            continue
+        family = families.setdefault(name, dict(idx=[], loc=[], scale=[], shapes=[], const=0.0))
+        family['idx'].append(i - 1)
+        family['loc'].append(loc)
+        family['scale'].append(scale)
+        family['shapes'].append(shapes)
+        family['const'] += const
+
+    groups = []
+    for name, family in families.items():
+        n_columns = len(family['idx'])
+        groups.append(dict(name=name,
+                           idx=np.array(family['idx']),
+                           loc=np.array(family['loc']),
+                           scale=np.array(family['scale']),
+                           shapes=np.array(family['shapes']).T.reshape(-1, n_columns),
+                           const=family['const']))
+    return groups, fallback, blocks
+
+
+class Block:
+    """
+    A joint prior over a block of parameters.
+
+    Blocks can be mixed with the one-dimensional ``scipy.stats`` distributions
+    in the list of distributions of a ``Prior``, where they take up ``dim``
+    consecutive parameters. This allows correlated and hierarchical priors
+    to be evaluated with the prior instead of inside the likelihood.
+
+    Parameters
+    ----------
+    logpdf : callable
+        Function that maps an array of shape (n, dim) to the array of shape (n,)
+        of the log of the probability density function.
+    rvs : callable
+        Function that maps ``size`` to an array of shape (size, dim) of samples.
+    bounds : ndarray
+        An array of shape (dim, 2) containing the lower and upper bounds for
+        each parameter of the block.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from scipy.stats import norm
+    >>> from pocomc.prior import Prior, Block
+    >>> def logpdf(x):
+    ...     return norm.logpdf(x[:, 0], 0, 3) + norm.logpdf(x[:, 1], x[:, 0], 1)
+    >>> def rvs(size=1):
+    ...     m = np.random.normal(0, 3, size)
+    ...     return np.array([m, np.random.normal(m, 1)]).T
+    >>> hierarchical = Block(logpdf, rvs, np.full((2, 2), [-np.inf, np.inf]))
+    >>> prior = Prior([hierarchical, norm(0, 1)])
+    >>> prior.dim
+    3
+    """
+
+    def __init__(self, logpdf, rvs, bounds):
+        self._logpdf = logpdf
+        self._rvs = rvs
+        self._bounds = np.atleast_2d(np.asarray(bounds, dtype=np.float64))
+
+    def logpdf(self, x):
+        """
+        Returns the log of the probability density function evaluated at x.
+
+        Parameters
+        ----------
+        x : ndarray
+            An array of shape (n, dim) containing n samples of the parameters.
+
+        Returns
+        -------
+        logp : ndarray
+            An array of shape (n,).
+        """
+        return self._logpdf(x)
+
+    def rvs(self, size=1):
+        """
+        Returns a random sample from the block.
+
+        Parameters
+        ----------
+        size : int, optional
+            The number of samples to return. The default is 1.
+
+        Returns
+        -------
+        samples : ndarray
+            An array of shape (size, dim) containing the samples.
+        """
+        return np.reshape(self._rvs(size), (size, self.dim))
+
+    @property
+    def bounds(self):
+        """
+        An array of shape (dim, 2) containing the lower and upper bounds for
+        each parameter of the block.
+        """
+        return self._bounds
+
+    @property
+    def dim(self):
+        """
+        The number of parameters of the block.
+        """
+        return len(self.bounds)
+
+
+class MultivariateNormal(Block):
+    """
+    A multivariate normal prior over a block of parameters.
+
+    Parameters
+    ----------
+    mean : ndarray
+        The mean vector of shape (dim,).
+    cov : ndarray
+        The covariance matrix of shape (dim, dim).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from scipy.stats import uniform
+    >>> from pocomc.prior import Prior, MultivariateNormal
+    >>> mvn = MultivariateNormal(np.zeros(2), np.array([[1.0, 0.9], [0.9, 1.0]]))
+    >>> prior = Prior([mvn, uniform(0, 1)])
+    >>> prior.dim
+    3
+    """
+
+    def __init__(self, mean, cov):
+        self.mean = np.atleast_1d(np.asarray(mean, dtype=np.float64))
+        self.cov = np.atleast_2d(np.asarray(cov, dtype=np.float64))
+        if self.cov.shape != (len(self.mean), len(self.mean)):
+            raise ValueError(f"The covariance matrix must have shape {(len(self.mean), len(self.mean))}.")
+        self.chol = np.linalg.cholesky(self.cov)
+        self._const = -0.5 * len(self.mean) * np.log(2.0 * np.pi) - np.sum(np.log(np.diag(self.chol)))
+        super().__init__(self._mvn_logpdf, self._mvn_rvs, np.tile([-np.inf, np.inf], (len(self.mean), 1)))
+
+    def _mvn_logpdf(self, x):
+        z = solve_triangular(self.chol, (x - self.mean).T, lower=True, check_finite=False)
+        return self._const - 0.5 * np.sum(z ** 2, axis=0)
+
+    def _mvn_rvs(self, size):
+        return self.mean + np.dot(np.random.randn(size, len(self.mean)), self.chol.T)
+
+
+class Dirichlet(Block):
+    """
+    A Dirichlet prior over a block of parameters.
+
+    The ``K`` fractions of a Dirichlet distribution with ``K`` concentration
+    parameters sum to one, so only the first ``K-1`` are parameters of the
+    model and the last is given by one minus their sum.
+
+    Parameters
+    ----------
+    alpha : ndarray
+        The concentration parameters of shape (K,).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pocomc.prior import Prior, Dirichlet
+    >>> prior = Prior([Dirichlet([1.0, 2.0, 3.0])])
+    >>> prior.dim
+    2
+    """
+
+    def __init__(self, alpha):
+        self.alpha = np.asarray(alpha, dtype=np.float64)
+        if self.alpha.ndim != 1 or len(self.alpha) < 2 or np.any(self.alpha <= 0.0):
+            raise ValueError("The concentration parameters must be a vector of at least two positive values.")
+        self._const = gammaln(np.sum(self.alpha)) - np.sum(gammaln(self.alpha))
+        super().__init__(self._dirichlet_logpdf, self._dirichlet_rvs, np.tile([0.0, 1.0], (len(self.alpha) - 1, 1)))
+
+    def _dirichlet_logpdf(self, x):
+        fractions = np.hstack([x, 1.0 - np.sum(x, axis=1, keepdims=True)])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logp = self._const + np.sum(xlogy(self.alpha - 1.0, fractions), axis=1)
+        return np.where(np.all(fractions >= 0.0, axis=1), logp, -np.inf)
+
+    def _dirichlet_rvs(self, size):
+        return np.random.dirichlet(self.alpha, size)[:, :-1]
+
 
 class Prior:
     """
@@ -6,15 +288,16 @@ class Prior:
 
     Parameters
     ----------
-    dists : list of scipy.stats distributions
-        A list of distributions for each parameter. The length of the list
-        determines the dimension of the prior.
+    dists : list of scipy.stats distributions or Block
+        A list of distributions for each parameter. Blocks, such as
+        ``MultivariateNormal`` and ``Dirichlet``, define a joint distribution
+        over several consecutive parameters. The length of the list and the
+        dimensions of the blocks determine the dimension of the prior.
 
     Attributes
     ----------
-    dists : list of scipy.stats distributions
-        A list of distributions for each parameter. The length of the list
-        determines the dimension of the prior.
+    dists : list of scipy.stats distributions or Block
+        A list of distributions for each parameter or block of parameters.
     bounds : ndarray
         An array of shape (dim, 2) containing the lower and upper bounds for
         each parameter.
@@ -49,23 +332,42 @@ class Prior:
     -----
     The logpdf method is implemented as a sum of the logpdf methods of the
     individual distributions. This is equivalent to assuming that the
-    parameters are independent.
+    parameters are independent, except within blocks. The uniform, normal, truncated normal,
+    log-uniform, beta and gamma distributions of ``scipy.stats`` are
+    evaluated analytically, all the columns of the same family at once,
+    while the other distributions fall back to their own logpdf method.
 
     The rvs method is implemented by sampling from each distribution
     independently and then transposing the result. This is equivalent to
-    assuming that the parameters are independent.
+    assuming that the parameters are independent. Uniform and normal
+    distributions are sampled directly from their random state.
 
     The bounds property is implemented by calling the support method of each
-    distribution. This is equivalent to assuming that the parameters are
-    independent.
+    distribution, or the bounds property of each block.
 
-    The dim property is implemented by returning the length of the dists
-    attribute. This is equivalent to assuming that the parameters are
-    independent.
+    The dim property is implemented by returning the number of
+    one-dimensional distributions plus the dimensions of the blocks.
     """
 
     def __init__(self, dists=None):
         self.dists = dists
+        self._compiled = None
+        self._groups = None
+        self._fallback = None
+        self._blocks = None
+
+    def _compile(self):
+        """
+        Group the distributions for vectorized evaluation, unless this has
+        already been done for the current distributions. The cache is keyed
+        on the distribution objects themselves, so that changing the list in
+        place also triggers a recompilation.
+        """
+        dists = tuple(self.dists)
+        if self._compiled is None or len(self._compiled) != len(dists) \
+                or any(a is not b for a, b in zip(self._compiled, dists)):
+            self._groups, self._fallback, self._blocks = _compile_dists(dists)
+            self._compiled = dists
 
     def logpdf(self, x):
         """
@@ -94,9 +396,16 @@ class Prior:
         >>> prior.logpdf(np.array([[0, 0], [0, 0]]))
         array([-1.83787707, -1.83787707])
         """
+        self._compile()
         logp = np.zeros(len(x))
-        for i, dist in enumerate(self.dists): 
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for group in self._groups:
+                y = (x[:, group['idx']] - group['loc']) / group['scale']
+                logp += np.sum(_LOG_KERNELS[group['name']](y, group['shapes']), axis=1) + group['const']
+        for i, dist in self._fallback:
             logp += dist.logpdf(x[:,i])
+        for columns, block in self._blocks:
+            logp += block.logpdf(x[:,columns])
         return logp
     
     def rvs(self, size=1):
@@ -128,8 +437,16 @@ class Prior:
         """
         samples = []
         for dist in self.dists:
-            samples.append(dist.rvs(size=size))
-        return np.transpose(samples)
+            if isinstance(dist, Block):
+                samples.append(dist.rvs(size=size))
+                continue
+            params = _parse_dist(dist)
+            if params is not None and params[0] in _RVS_KERNELS:
+                name, _, loc, scale = params
+                samples.append(loc + scale * _RVS_KERNELS[name](dist.random_state, size))
+            else:
+                samples.append(dist.rvs(size=size))
+        return np.column_stack(samples)
     
     @property
     def bounds(self):
@@ -150,7 +467,10 @@ class Prior:
         """
         bounds = []
         for dist in self.dists:
-            bounds.append(dist.support())
+            if isinstance(dist, Block):
+                bounds.extend(dist.bounds)
+            else:
+                bounds.append(dist.support())
         return np.array(bounds)
     
     @property
@@ -168,4 +488,4 @@ class Prior:
         >>> prior.dim
         2
         """
-        return len(self.dists)
\ No newline at end of file
+        return sum(dist.dim if isinstance(dist, Block) else 1 for dist in self.dists)
\ No newline at end of file
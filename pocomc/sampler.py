@@ -2,18 +2,23 @@ from pathlib import Path
 from typing import Union
 
 import os
+import time
 import dill
 import numpy as np
 from multiprocess import Pool
 import torch
 
-from .mcmc import preconditioned_pcn, preconditioned_rwm, pcn, rwm
+from .mcmc import preconditioned_pcn, preconditioned_rwm, pcn, rwm, preconditioned_hmc, hmc, preconditioned_independence
+from .mcmc import preconditioned_pcn_torch, preconditioned_rwm_torch, pcn_torch, rwm_torch
 from .tools import systematic_resample, FunctionWrapper, numpy_to_torch, torch_to_numpy, trim_weights, ProgressBar, flow_numpy_wrapper, effective_sample_size, unique_sample_size
 from .scaler import Reparameterize
 from .flow import Flow
 from .particles import Particles
 from .geometry import Geometry
 from .threading import configure_threads
+from .cache import LikelihoodCache
+from .emulator import Emulator
+from .termination import ESJDTermination
 
 class Sampler:
     r"""Preconditioned Monte Carlo class.
@@ -59,6 +64,57 @@ class Sampler:
         returned by the likelihood function (e.g., chi-squared values, residuals, etc.). Blobs are stored as a
         structured array with named fields when the data type is provided. Currently, the blobs feature is not
         compatible with vectorized likelihood calculations.
+    torch_likelihood : bool
+        If True, the likelihood is written in torch (default is ``torch_likelihood=False``). It is then called
+        with a ``torch.Tensor`` of shape ``(n, n_dim)`` and double precision and must return a ``torch.Tensor``
+        of shape ``(n,)``, so it is always vectorized. A torch likelihood is required by the gradient-based
+        samplers (``sample="hmc"`` or ``sample="mala"``) and cannot return blobs. With a torch likelihood the
+        MCMC kernels keep particles, proposals and acceptance decisions as tensors and only convert them to numpy
+        when they are stored, unless ``likelihood_cache``, ``approx_likelihood`` or ``emulator`` is used.
+    likelihood_cache : ``str``, ``Path``, ``LikelihoodCache`` or ``None``
+        Persistent on-disk cache of likelihood values (default is ``likelihood_cache=None``). If a path
+        is provided, an SQLite database is created at that location (or reused if it exists). Before every
+        batch of likelihood evaluations the whole batch is looked up in the cache and only the misses are
+        dispatched to the likelihood (or pool). This allows a crashed run, or a rerun with different sampler
+        settings, to reuse all previously computed likelihood values. Cached values are returned as float64.
+        Blobs are not stored in the cache, so caching is disabled if ``blobs_dtype`` is set or the likelihood
+        returns blobs: a cache hit would have to be evaluated again anyway to recover its blobs.
+    likelihood_version : ``str``
+        Version tag of the likelihood used as part of the cache key (default is ``likelihood_version=""``).
+        Change it whenever the likelihood function or data change to invalidate previous cache entries.
+        Ignored if ``likelihood_cache`` is a ``LikelihoodCache`` instance.
+    likelihood_threshold : bool
+        If True, the MCMC kernels pass the minimum log-likelihood value needed for the acceptance of each
+        proposal to the likelihood as the keyword argument ``threshold`` (default is ``likelihood_threshold=False``).
+        The uniform random numbers of the Metropolis criterion are drawn before the likelihood is evaluated, so
+        the threshold is known in advance. A likelihood that is a sum over data chunks can then stop as soon as
+        the partial sum guarantees rejection and return ``-np.inf`` (or any value not exceeding the threshold).
+        Only the cost changes: the acceptance decisions and the adaptation of the proposal scale, which is
+        driven by the acceptance mask, are the same as without the threshold, so the chains are unchanged.
+        The likelihood must also accept ``threshold=None`` (or no threshold), which is used outside of the MCMC
+        kernels. For vectorized likelihoods ``threshold`` is an array of shape ``(n,)``. The number of proposals
+        rejected by the threshold, i.e. skipped or with a returned value not exceeding it, is stored in
+        ``threshold_rejections``. Since a likelihood that stops early may return any such value, complete
+        evaluations that end below the threshold are counted too.
+    approx_likelihood : callable or None
+        Cheap approximation of the log likelihood (e.g. a surrogate model or a solver on a coarse grid) used for
+        delayed acceptance MCMC (default is ``approx_likelihood=None``). If provided, proposals are first screened
+        with a Metropolis criterion that uses the approximate likelihood, and only the survivors are evaluated with
+        the expensive likelihood and accepted using the second-stage ratio that corrects for the approximation error.
+        The target distribution is preserved exactly. It is called with the same ``likelihood_args``, ``likelihood_kwargs``
+        and ``vectorize`` settings as ``likelihood`` and must return only the log likelihood (no blobs). The number
+        of approximate likelihood calls is stored in ``calls_approx``.
+    emulator : bool
+        If True, train a surrogate model of the likelihood on the particle history and use its predictions for
+        delayed acceptance MCMC (default is ``emulator=False``). The emulator is retrained at every iteration and is
+        only used when its held-out prediction error of the tempered log likelihood is below a tolerance. Within each
+        MCMC run, the sampler also falls back to standard Metropolis if the observed errors grow too large. Cannot be
+        combined with ``approx_likelihood``.
+    emulator_config : dict or ``None``
+        Configuration of the emulator (default is ``emulator_config=None``). Options include a dictionary with the
+        following keys: ``"n_features"``, ``"max_samples"``, ``"validation_split"``, ``"tolerance"``,
+        ``"regularization"``. The defaults are those of ``Emulator``, except for ``"max_samples"``, which is
+        ``8 * n_effective`` in the sampler.
     pool : pool or int
         Number of processes to use for parallelisation (default is ``pool=None``). If ``pool`` is an integer
         greater than 1, a ``multiprocessing`` pool is created with the specified number of processes (e.g., ``pool=8``). 
@@ -83,12 +139,31 @@ class Sampler:
         (default is ``train_config=None``). Options include a dictionary with the following
         keys: ``"validation_split"``, ``"epochs"``, ``"batch_size"``, ``"patience"``,
         ``"learning_rate"``, ``"annealing"``, ``"gaussian_scale"``, ``"laplace_scale"``,
-        ``"noise"``, ``"shuffle"``, ``"clip_grad_norm"``.
+        ``"noise"``, ``"shuffle"``, ``"clip_grad_norm"``, ``"validation_frequency"``,
+        ``"warm_start"``, ``"warm_start_lr_factor"``, ``"warm_start_patience_factor"``,
+        ``"time_limit"``, ``"total_time_limit"``, ``"total_epochs"``. If
+        ``"warm_start"`` is ``True`` (default), the optimizer state carries over between trainings and
+        every training after the first one uses the learning rate and patience multiplied by
+        ``"warm_start_lr_factor"`` (default is 0.3) and ``"warm_start_patience_factor"`` (default is 0.5).
+        The wall-clock time in seconds of each training is limited by ``"time_limit"`` and, over the
+        whole run, the training time and the number of epochs are limited by ``"total_time_limit"``
+        and ``"total_epochs"`` (all default to ``None``, i.e. no budget). A training that exhausts a
+        budget stops at the best model so far, and once a run budget is exhausted the flow is no
+        longer retrained. The epochs and time of every training are recorded in ``train_history``.
     train_frequency : int or None
         Frequency of training the normalizing flow (default is ``train_frequency=None``).
         If ``train_frequency=None``, the normalizing flow is trained every ``n_effective//n_active``
         iterations. If ``train_frequency=1``, the normalizing flow is trained at every iteration.
         If ``train_frequency>1``, the normalizing flow is trained every ``train_frequency`` iterations.
+        Ignored if ``train_threshold`` is not ``None``.
+    train_threshold : float or None
+        Drift threshold for retraining the normalizing flow (default is ``train_threshold=None``, in
+        which case the flow is retrained according to ``train_frequency``). Otherwise, at every
+        iteration the Kullback-Leibler divergence of the flow from the current weighted particles is
+        estimated using their unnormalized log-posterior at the current temperature and the
+        log-evidence estimate, and the flow is retrained only if it has grown by more than
+        ``train_threshold`` nats since the last training. Every decision is recorded in
+        ``train_history``.
     precondition : bool
         If True, use preconditioned MCMC (default is ``precondition=True``). If False,
         use standard MCMC without normalizing flow. The use of preconditioned MCMC is
@@ -114,15 +189,55 @@ class Sampler:
         warm-up the sampler and ensure that the particles are well distributed across the prior volume.
     sample : ``str``
         Type of MCMC sampler to use (default is ``sample="tpcn"``). Options are
-        ``"pcn"`` (t-preconditioned Crank-Nicolson) or ``"rwm"`` (Random-walk Metropolis).
+        ``"pcn"`` (t-preconditioned Crank-Nicolson), ``"rwm"`` (Random-walk Metropolis),
+        ``"hmc"`` (Hamiltonian Monte Carlo), ``"mala"`` (Metropolis-adjusted Langevin algorithm) or
+        ``"independence"`` (flow independence sampler mixed with t-preconditioned Crank-Nicolson).
         t-preconditioned Crank-Nicolson is the default and recommended sampler for PMC as it
-        is more efficient and scales better with the number of parameters.
+        is more efficient and scales better with the number of parameters. The independence sampler
+        proposes new samples of the normalizing flow and adapts the fraction of such proposals to their
+        acceptance rate; it needs far fewer steps when the flow fits the target well (e.g. close to
+        ``beta=1``) and requires ``precondition=True``. If ``sample="adaptive"``, the walkers are split
+        between ``"tpcn"``, ``"rwm"`` and ``"independence"`` (only ``"tpcn"`` and ``"rwm"`` without
+        preconditioning), and the allocation is shifted at every iteration towards the kernel with the highest
+        expected squared jump distance per likelihood call (with a floor of 10% of the walkers per kernel);
+        the current allocation is stored in ``portfolio_weights``. The gradient-based
+        samplers ``"hmc"`` and ``"mala"`` require ``torch_likelihood=True`` and compute gradients
+        of the tempered posterior with autograd through the normalizing flow and the likelihood. They call
+        the likelihood directly, so they cannot be combined with ``likelihood_cache``, ``likelihood_threshold``,
+        ``approx_likelihood`` or ``emulator``.
+        They are useful for high-dimensional targets for which random-walk proposals need many steps.
+    n_leapfrog : int
+        Number of leapfrog steps per iteration of Hamiltonian Monte Carlo (default is ``n_leapfrog=10``).
+        Only used if ``sample="hmc"``; ``sample="mala"`` always uses a single leapfrog step.
     n_steps : int
         Number of MCMC steps after logP plateau (default is ``n_steps=n_dim``). This is used
         for early stopping of MCMC. Higher values can lead to better exploration but also
         increase the computational cost. If ``n_steps=None``, the default value is ``n_steps=n_dim``.
     n_max_steps : int
         Maximum number of MCMC steps (default is ``n_max_steps=10*n_dim``).
+    termination : ``str``, ``ESJDTermination`` or ``None``
+        Termination policy of the MCMC runs (default is ``termination=None``). If ``termination=None``
+        or ``termination="plateau"``, each run stops once the mean log posterior has not improved for a
+        number of steps set by ``n_steps`` and the proposal scale. If ``termination="esjd"``, each run
+        stops once the walkers have made one independent move on average, estimated from their cumulative
+        squared jump distance (see ``pocomc.termination.ESJDTermination``). Any object with ``reset(x)``
+        and ``update(x)`` methods, where ``update`` returns True to stop, can also be provided. In all
+        cases, the runs stop after at most ``n_max_steps`` steps.
+    max_components : int
+        Maximum number of components of the mixture of t distributions used by the t-preconditioned
+        Crank-Nicolson proposals (default is ``max_components=1``, i.e. a single t distribution). If larger
+        than one, the number of components is chosen at every iteration with the Bayesian Information Criterion,
+        and each walker proposes relative to a component drawn from its responsibilities. This helps on
+        multimodal targets, where a single t distribution keeps proposing into the valleys between the modes.
+    covariance : ``str``
+        Structure of the covariance matrices of the proposals (default is ``covariance="full"``). Options are
+        ``"full"`` (dense covariance matrices) or ``"lowrank"`` (diagonal plus rank ``covariance_rank`` covariance
+        matrices fitted by weighted probabilistic PCA). With ``covariance="lowrank"`` the proposals and Mahalanobis
+        distances cost ``O(n_dim * covariance_rank)`` per walker instead of ``O(n_dim ** 2)``, which is much faster
+        for high-dimensional targets (e.g. ``n_dim=1000``). It cannot be combined with ``max_components > 1``.
+    covariance_rank : int
+        Rank of the low-rank term of the covariance matrices if ``covariance="lowrank"``
+        (default is ``covariance_rank=10``).
     resample : ``str``
         Resampling scheme to use (default is ``resample="mult"``). Options are
         ``"syst"`` (systematic resampling) or ``"mult"`` (multinomial resampling).
@@ -150,18 +265,31 @@ class Sampler:
                  likelihood_kwargs: dict = None,
                  vectorize: bool = False,
                  blobs_dtype: str = None,
+                 torch_likelihood: bool = False,
+                 likelihood_cache: Union[str, Path, LikelihoodCache] = None,
+                 likelihood_version: str = "",
+                 likelihood_threshold: bool = False,
+                 approx_likelihood: callable = None,
+                 emulator: bool = False,
+                 emulator_config: dict = None,
                  pool=None,
                  pytorch_threads=1,
                  flow='nsf3',
                  train_config: dict = None,
                  train_frequency: int = None,
+                 train_threshold: float = None,
                  precondition: bool = True,
                  dynamic: bool = True,
                  metric: str = 'ess',
                  n_prior: int = None,
                  sample: str = 'tpcn',
+                 n_leapfrog: int = 10,
                  n_steps: int = None,
                  n_max_steps: int = None,
+                 termination=None,
+                 max_components: int = 1,
+                 covariance: str = 'full',
+                 covariance_rank: int = 10,
                  resample: str = 'mult',
                  output_dir: str = None,
                  output_label: str = None,
@@ -203,6 +331,25 @@ class Sampler:
         self.blobs_dtype = blobs_dtype
         self.have_blobs = blobs_dtype is not None
 
+        # Persistent likelihood cache
+        if likelihood_cache is None or isinstance(likelihood_cache, LikelihoodCache):
+            self.likelihood_cache = likelihood_cache
+        else:
+            self.likelihood_cache = LikelihoodCache(likelihood_cache, version=likelihood_version)
+
+        # Early rejection using acceptance thresholds
+        self.likelihood_threshold = likelihood_threshold
+
+        # Approximate log likelihood function for delayed acceptance
+        if approx_likelihood is None:
+            self.approx_log_likelihood = None
+        else:
+            self.approx_log_likelihood = FunctionWrapper(
+                approx_likelihood,
+                likelihood_args,
+                likelihood_kwargs
+            )
+
         # Number of parameters
         if n_dim is None:
             self.n_dim = self.prior.dim
@@ -237,6 +384,16 @@ class Sampler:
         else:
             self.n_max_steps = int(n_max_steps)
 
+        # Termination policy of MCMC runs
+        if termination is None or termination == 'plateau':
+            self.termination = None
+        elif termination == 'esjd':
+            self.termination = ESJDTermination()
+        elif isinstance(termination, str):
+            raise ValueError(f"Invalid termination {termination}. Options are 'plateau' or 'esjd'.")
+        else:
+            self.termination = termination
+
         # Total ESS for termination
         self.n_total = None
 
@@ -264,9 +421,20 @@ class Sampler:
         if self.vectorize and self.have_blobs:
             raise ValueError("Cannot vectorize likelihood with blobs.")
 
+        # Torch likelihood
+        self.torch_likelihood = torch_likelihood
+        if self.torch_likelihood:
+            if self.have_blobs:
+                raise ValueError("Cannot use torch likelihood with blobs.")
+            self.vectorize = True
+
         # Geometry
-        self.u_geometry = Geometry()
-        self.theta_geometry = Geometry()
+        self.max_components = int(max_components)
+        if self.max_components < 1:
+            raise ValueError(f"Invalid max_components {max_components}. It must be a positive integer.")
+        self.covariance = covariance
+        self.u_geometry = Geometry(max_components=self.max_components, covariance=covariance, rank=covariance_rank)
+        self.theta_geometry = Geometry(max_components=self.max_components, covariance=covariance, rank=covariance_rank)
 
         # Normalizing Flow
         self.flow = Flow(self.n_dim, flow)
@@ -281,6 +449,13 @@ class Sampler:
                                  noise=None,
                                  shuffle=True,
                                  clip_grad_norm=1.0,
+                                 validation_frequency=1,
+                                 warm_start=True,
+                                 warm_start_lr_factor=0.3,
+                                 warm_start_patience_factor=0.5,
+                                 time_limit=None,
+                                 total_time_limit=None,
+                                 total_epochs=None,
                                  verbose=0,
                                 )
         if train_config is not None:
@@ -292,8 +467,32 @@ class Sampler:
         else:
             self.train_frequency = int(train_frequency)
 
+        self.train_threshold = None if train_threshold is None else float(train_threshold)
+        self.train_history = []
+        self.training_time = 0.0
+        self.training_epochs = 0
+        self.sampling_time = 0.0
+        self.flow_drift_reference = None
         self.flow_untrained = True
 
+        # Likelihood emulator
+        if emulator and approx_likelihood is not None:
+            raise ValueError("Cannot use both an emulator and an approximate likelihood.")
+        if emulator:
+            self.emulator_config = dict(n_features=256,
+                                        max_samples=8 * self.n_effective,
+                                        validation_split=0.2,
+                                        tolerance=1.0,
+                                        regularization=1e-4,
+                                       )
+            if emulator_config is not None:
+                for key in emulator_config.keys():
+                    self.emulator_config[key] = emulator_config[key]
+            self.emulator = Emulator(self.n_dim, random_state=random_state, **self.emulator_config)
+        else:
+            self.emulator_config = None
+            self.emulator = None
+
         # Scaler
         self.scaler = Reparameterize(self.n_dim, bounds=self.bounds)
 
@@ -321,14 +520,43 @@ class Sampler:
         self.dynamic_ratio = unique_sample_size(np.ones(self.n_effective), k=self.n_active) / self.n_active
 
         # Sampling algorithm
-        if sample not in ['tpcn', 'rwm']:
-            raise ValueError(f"Invalid sample {sample}. Options are 'tpcn' or 'rwm'.")
+        if sample not in ['tpcn', 'rwm', 'hmc', 'mala', 'independence', 'adaptive']:
+            raise ValueError(f"Invalid sample {sample}. Options are 'tpcn', 'rwm', 'hmc', 'mala', 'independence' or 'adaptive'.")
+        elif sample in ['hmc', 'mala'] and not self.torch_likelihood:
+            raise ValueError(f"Sample {sample} requires a torch likelihood (torch_likelihood=True).")
+        elif sample in ['hmc', 'mala'] and (self.likelihood_cache is not None or self.likelihood_threshold
+                                            or self.approx_log_likelihood is not None or self.emulator is not None):
+            raise ValueError(f"Sample {sample} cannot be combined with likelihood_cache, likelihood_threshold, "
+                             f"approx_likelihood or emulator.")
+        elif sample == 'independence' and not self.preconditioned:
+            raise ValueError(f"Sample {sample} requires a normalizing flow (precondition=True).")
         else:
             self.sample = sample
 
+        # Leapfrog steps and target acceptance rate of gradient-based samplers
+        if self.sample == 'mala':
+            self.n_leapfrog = 1
+            self.target_accept = 0.574
+        else:
+            self.n_leapfrog = int(n_leapfrog)
+            self.target_accept = 0.65
+
         # Proposal scale
         self.proposal_scale = 2.38 / self.n_dim ** 0.5
 
+        # Fraction of flow independence proposals
+        self.independence_weight = 0.5
+
+        # Adaptive kernel portfolio
+        if self.preconditioned:
+            self.portfolio = ['tpcn', 'rwm', 'independence']
+        else:
+            self.portfolio = ['tpcn', 'rwm']
+        self.portfolio_floor = 0.1
+        self.portfolio_weights = {kernel: 1.0 / len(self.portfolio) for kernel in self.portfolio}
+        self.portfolio_scores = {kernel: None for kernel in self.portfolio}
+        self.portfolio_scales = {kernel: self.proposal_scale for kernel in self.portfolio}
+
         # Resampling algorithm
         if resample not in ['mult', 'syst']:
             raise ValueError(f"Invalid resample {resample}. Options are 'mult' or 'syst'.")
@@ -348,6 +576,8 @@ class Sampler:
         self.current_particles = None
         self.warmup = True
         self.calls = 0
+        self.calls_approx = 0
+        self.threshold_rejections = 0
         
         self.progress = None
         self.pbar = None
@@ -381,7 +611,13 @@ class Sampler:
             Argument which determines how often (i.e. every how many iterations) ``pocoMC`` saves
             state files to the ``output_dir`` directory. Default is ``None`` in which case no state
             files are stored during the run.
+
+        Notes
+        -----
+        The wall-clock time spent training the normalizing flow and the rest of the time spent in
+        ``run`` are accumulated in the ``training_time`` and ``sampling_time`` attributes in seconds.
         """
+        start_time = time.time()
         if resume_state_path is not None:
             self.load_state(resume_state_path)
             t0 = self.t
@@ -413,6 +649,7 @@ class Sampler:
             
         self.n_total = int(n_total)
         self.n_evidence = int(n_evidence)
+        training_time = self.training_time
 
         # Initialise particles
         if self.prior_samples is None:
@@ -426,7 +663,8 @@ class Sampler:
                         self.save_state(Path(self.output_dir) / f'{self.output_label}_{self.t}.state')
                 # Set state parameters
                 x = self.prior_samples[i*self.n_active:(i+1)*self.n_active]
-                u = self.scaler.forward(x)
+                # The prior samples have already been validated when fitting the scaler
+                u = self.scaler.forward(x, validate=False)
                 logdetj = self.scaler.inverse(u)[1]
                 logp = self.log_prior(x)
                 logl, blobs = self._log_like(x)
@@ -496,6 +734,9 @@ class Sampler:
             _, self.logz = self.particles.compute_logw_and_logz(1.0)
             self.logz_err = None
         
+        # Training time is accumulated in _train, the rest of the time is spent sampling
+        self.sampling_time += time.time() - start_time - (self.training_time - training_time)
+
         # Save final state
         if save_every is not None:
             self.save_state(Path(self.output_dir) / f'{self.output_label}_final.state')
@@ -557,6 +798,8 @@ class Sampler:
 
         function_dict = dict(
             loglike=self._log_like,
+            loglike_torch=self.log_likelihood if self.torch_likelihood else None,
+            loglike_approx=self._log_like_approx if self._use_approx(current_particles.get("beta")) else None,
             logprior=self.log_prior,
             scaler=self.scaler,
             flow=self.flow,
@@ -566,56 +809,221 @@ class Sampler:
 
         option_dict = dict(
             n_max=self.n_max_steps,
+            termination=self.termination,
             n_steps=self.n_steps,
             progress_bar=self.pbar,
             proposal_scale=self.proposal_scale,
+            threshold=self.likelihood_threshold,
+            approx_tolerance=self.emulator.tolerance if self.emulator is not None else None,
+            n_leapfrog=self.n_leapfrog,
+            target_accept=self.target_accept,
+            independence_weight=self.independence_weight,
         )
 
-        if self.preconditioned and self.sample == "tpcn":
+        if self.sample == "adaptive":
+            results = self._run_portfolio(state_dict, function_dict, option_dict)
+        else:
+            results = self._run_kernel(self.sample, state_dict, function_dict, option_dict)
+
+        current_particles["u"] = results.get('u').copy()
+        current_particles["x"] = results.get('x').copy()
+        current_particles["logdetj"] = results.get('logdetj').copy()
+        current_particles["logl"] = results.get('logl').copy()
+        current_particles["logp"] = results.get('logp').copy()
+        if self.have_blobs:
+            current_particles["blobs"] = results.get('blobs').copy()
+        current_particles["efficiency"] = results.get('efficiency') / (2.38 / self.n_dim ** 0.5)
+        current_particles["steps"] = results.get('steps')
+        current_particles["accept"] = results.get('accept')
+        current_particles["calls"] = current_particles.get("calls") + results.get('calls')
+        self.calls = current_particles.get("calls")
+        self.threshold_rejections += results.get('threshold_rejections')
+        if self._use_approx(current_particles.get("beta")):
+            self.calls_approx += results.get('calls_approx')
+            self.pbar.update_stats(dict(calls_approx=self.calls_approx,
+                                        acc1=results.get('accept_stage1'),
+                                        acc2=results.get('accept_stage2')))
+        self.proposal_scale = results.get('proposal_scale')
+        if results.get('independence_weight') is not None:
+            self.independence_weight = results.get('independence_weight')
+
+        return current_particles
+
+
+    def _run_kernel(self, sample, state_dict, function_dict, option_dict):
+        """
+        Run a single MCMC kernel.
+
+        Parameters
+        ----------
+        sample : str
+            Type of MCMC sampler.
+        state_dict : dict
+            Dictionary of current state.
+        function_dict : dict
+            Dictionary of functions.
+        option_dict : dict
+            Dictionary of options.
+
+        Returns
+        -------
+        results : dict
+            Results dictionary of the kernel.
+        """
+        # Keep the MCMC loop in torch tensors for torch likelihoods, unless the
+        # likelihood cache, delayed acceptance or a structured geometry require the numpy kernels
+        use_torch = self.torch_likelihood and self.likelihood_cache is None and function_dict.get('loglike_approx') is None
+        if (sample == "tpcn" and self.max_components > 1) or self.covariance == "lowrank":
+            use_torch = False
+
+        if use_torch and self.preconditioned and sample == "tpcn":
+            results = preconditioned_pcn_torch(
+                state_dict,
+                function_dict,
+                option_dict
+                )
+        elif use_torch and self.preconditioned and sample == "rwm":
+            results = preconditioned_rwm_torch(
+                state_dict,
+                function_dict,
+                option_dict
+                )
+        elif use_torch and not self.preconditioned and sample == "tpcn":
+            results = pcn_torch(
+                state_dict,
+                function_dict,
+                option_dict
+                )
+        elif use_torch and not self.preconditioned and sample == "rwm":
+            results = rwm_torch(
+                state_dict,
+                function_dict,
+                option_dict
+                )
+        elif self.preconditioned and sample == "tpcn":
             results = preconditioned_pcn(
                 state_dict,
                 function_dict,
                 option_dict
                 )
-        elif self.preconditioned and self.sample == "rwm":
+        elif self.preconditioned and sample == "rwm":
             results = preconditioned_rwm(
                 state_dict,
                 function_dict,
                 option_dict
                 )
-        elif not self.preconditioned and self.sample == "tpcn":
+        elif not self.preconditioned and sample == "tpcn":
             results = pcn(
                 state_dict,
                 function_dict,
                 option_dict
                 )
-        elif not self.preconditioned and self.sample == "rwm":
+        elif not self.preconditioned and sample == "rwm":
             results = rwm(
                 state_dict,
                 function_dict,
                 option_dict
                 )
+        elif self.preconditioned and sample == "independence":
+            results = preconditioned_independence(
+                state_dict,
+                function_dict,
+                option_dict
+                )
+        elif self.preconditioned and sample in ["hmc", "mala"]:
+            results = preconditioned_hmc(
+                state_dict,
+                function_dict,
+                option_dict
+                )
+        elif not self.preconditioned and sample in ["hmc", "mala"]:
+            results = hmc(
+                state_dict,
+                function_dict,
+                option_dict
+                )
 
-        current_particles["u"] = results.get('u').copy()
-        current_particles["x"] = results.get('x').copy()
-        current_particles["logdetj"] = results.get('logdetj').copy()
-        current_particles["logl"] = results.get('logl').copy()
-        current_particles["logp"] = results.get('logp').copy()
-        if self.have_blobs:
-            current_particles["blobs"] = results.get('blobs').copy()
-        current_particles["efficiency"] = results.get('efficiency') / (2.38 / self.n_dim ** 0.5)
-        current_particles["steps"] = results.get('steps')
-        current_particles["accept"] = results.get('accept')
-        current_particles["calls"] = current_particles.get("calls") + results.get('calls')
-        self.calls = current_particles.get("calls")
-        self.proposal_scale = results.get('proposal_scale')
+        return results
 
-        return current_particles
+    def _run_portfolio(self, state_dict, function_dict, option_dict):
+        """
+        Evolve particles with an adaptive portfolio of MCMC kernels.
+
+        The walkers are randomly split between the kernels in proportion to
+        their allocation weights. After the run, the expected squared jump
+        distance (ESJD) in the space of the scaler per likelihood call is measured
+        for every kernel and the weights are moved towards the kernels that give
+        the most decorrelation per likelihood evaluation. A floor on the weights
+        keeps every kernel in use so that its score stays up to date.
+
+        Parameters
+        ----------
+        state_dict : dict
+            Dictionary of current state.
+        function_dict : dict
+            Dictionary of functions.
+        option_dict : dict
+            Dictionary of options.
+
+        Returns
+        -------
+        results : dict
+            Merged results dictionary of all kernels.
+        """
+        n_walkers = len(state_dict.get("u"))
+        weights = np.array([self.portfolio_weights[kernel] for kernel in self.portfolio])
+
+        # Split walkers randomly between kernels
+        counts = np.maximum(np.floor(weights * n_walkers).astype(int), 1)
+        counts[np.argmax(weights)] += n_walkers - np.sum(counts)
+        splits = np.split(np.random.permutation(n_walkers), np.cumsum(counts)[:-1])
+
+        merged = {key: np.copy(state_dict.get(key)) for key in ["u", "x", "logdetj", "logl", "logp"]}
+        merged["blobs"] = None if state_dict.get("blobs") is None else np.copy(state_dict.get("blobs"))
+        merged.update(calls=0, threshold_rejections=0, calls_approx=0, steps=0, accept=0.0, efficiency=0.0,
+                      accept_stage1=0.0, accept_stage2=0.0)
+
+        for kernel, idx in zip(self.portfolio, splits):
+            sub_state_dict = dict(state_dict)
+            for key in ["u", "x", "logdetj", "logl", "logp", "blobs"]:
+                if state_dict.get(key) is not None:
+                    sub_state_dict[key] = state_dict.get(key)[idx]
+            sub_option_dict = dict(option_dict, proposal_scale=self.portfolio_scales[kernel])
+
+            results = self._run_kernel(kernel, sub_state_dict, function_dict, sub_option_dict)
+
+            for key in ["u", "x", "logdetj", "logl", "logp", "blobs"]:
+                if merged[key] is not None:
+                    merged[key][idx] = results.get(key)
+            for key in ["calls", "threshold_rejections", "calls_approx"]:
+                merged[key] += results.get(key)
+            for key in ["accept", "efficiency", "accept_stage1", "accept_stage2"]:
+                merged[key] += results.get(key) * len(idx) / n_walkers
+            merged["steps"] = max(merged["steps"], results.get("steps"))
+
+            # Expected squared jump distance per likelihood call
+            esjd = np.sum((results.get("u") - sub_state_dict.get("u")) ** 2) / max(results.get("calls"), 1)
+            if self.portfolio_scores[kernel] is None:
+                self.portfolio_scores[kernel] = esjd
+            else:
+                self.portfolio_scores[kernel] = 0.5 * (self.portfolio_scores[kernel] + esjd)
+            self.portfolio_scales[kernel] = results.get("proposal_scale")
+            if results.get("independence_weight") is not None:
+                merged["independence_weight"] = results.get("independence_weight")
 
+        # Move walkers towards the kernels with the highest ESJD per likelihood call
+        scores = np.array([self.portfolio_scores[kernel] for kernel in self.portfolio])
+        if np.sum(scores) > 0.0:
+            floor = self.portfolio_floor
+            weights = floor + (1.0 - len(self.portfolio) * floor) * scores / np.sum(scores)
+            self.portfolio_weights = dict(zip(self.portfolio, weights))
+
+        merged["proposal_scale"] = self.portfolio_scales["tpcn"]
+        return merged
 
     def _train(self, current_particles):
         """
-        Train normalizing flow.
+        Train normalizing flow and likelihood emulator.
 
         Parameters
         ----------
@@ -630,33 +1038,106 @@ class Sampler:
         u = current_particles.get("u")
         w = current_particles.get("weights")
 
-        if self.preconditioned and (self.t % self.train_frequency == 0 or current_particles.get("beta")==1.0 or self.flow_untrained):
+        if self.preconditioned:
+            if self.flow_untrained:
+                train, drift = True, np.nan
+            elif self.train_threshold is None:
+                train, drift = self.t % self.train_frequency == 0 or current_particles.get("beta")==1.0, np.nan
+            else:
+                drift = float(self._flow_divergence(current_particles) - self.flow_drift_reference)
+                train = not drift <= self.train_threshold
+
+            # Respect the training budgets of the run, except for the first training
+            epochs = self.train_config["epochs"]
+            time_limit = self.train_config["time_limit"]
+            if self.train_config["total_epochs"] is not None:
+                epochs = min(epochs, self.train_config["total_epochs"] - self.training_epochs)
+            if self.train_config["total_time_limit"] is not None:
+                remaining_time = self.train_config["total_time_limit"] - self.training_time
+                time_limit = remaining_time if time_limit is None else min(time_limit, remaining_time)
+            if self.flow_untrained:
+                epochs = max(epochs, 1)
+            elif epochs < 1 or (time_limit is not None and time_limit <= 0.0):
+                train = False
+        else:
+            train = False
+
+        if train:
+            # After the first training, restart from the previous optimizer state with a smaller
+            # learning rate and patience, since the flow only needs to follow the new particles.
+            warm_start = self.train_config["warm_start"] and not self.flow_untrained
+            if warm_start:
+                learning_rate = self.train_config["learning_rate"] * self.train_config["warm_start_lr_factor"]
+                patience = max(int(self.train_config["patience"] * self.train_config["warm_start_patience_factor"]), 1)
+            else:
+                learning_rate = self.train_config["learning_rate"]
+                patience = self.train_config["patience"]
             self.flow_untrained = False
-            self.flow.fit(numpy_to_torch(u),
-                          weights=numpy_to_torch(w),
-                          validation_split=self.train_config["validation_split"],
-                          epochs=self.train_config["epochs"],
-                          batch_size=int(np.minimum(len(u)//2, self.train_config["batch_size"])),
-                          gaussian_scale=self.train_config["gaussian_scale"],
-                          laplace_scale=self.train_config["laplace_scale"],
-                          patience=self.train_config["patience"],
-                          learning_rate=self.train_config["learning_rate"],
-                          annealing=self.train_config["annealing"],
-                          noise=self.train_config["noise"],
-                          shuffle=self.train_config["shuffle"],
-                          clip_grad_norm=self.train_config["clip_grad_norm"],
-                          verbose=self.train_config["verbose"],
-                          )
+            start_time = time.time()
+            history = self.flow.fit(numpy_to_torch(u),
+                                    weights=numpy_to_torch(w),
+                                    validation_split=self.train_config["validation_split"],
+                                    epochs=epochs,
+                                    batch_size=int(np.minimum(len(u)//2, self.train_config["batch_size"])),
+                                    gaussian_scale=self.train_config["gaussian_scale"],
+                                    laplace_scale=self.train_config["laplace_scale"],
+                                    patience=patience,
+                                    learning_rate=learning_rate,
+                                    annealing=self.train_config["annealing"],
+                                    noise=self.train_config["noise"],
+                                    shuffle=self.train_config["shuffle"],
+                                    clip_grad_norm=self.train_config["clip_grad_norm"],
+                                    validation_frequency=self.train_config["validation_frequency"],
+                                    warm_start=warm_start,
+                                    time_limit=time_limit,
+                                    verbose=self.train_config["verbose"],
+                                    )
+            train_time = time.time() - start_time
+            train_epochs = len(history["loss"])
+            self.training_time += train_time
+            self.training_epochs += train_epochs
+            if self.train_threshold is not None:
+                self.flow_drift_reference = self._flow_divergence(current_particles)
             
             theta = flow_numpy_wrapper(self.flow).forward(u)[0]
             self.theta_geometry.fit(theta, weights=w)
         else:
             self.u_geometry.fit(u, weights=w)
 
+        if self.preconditioned:
+            self.train_history.append(dict(iter=self.t, beta=current_particles.get("beta"), drift=drift, trained=train,
+                                           epochs=train_epochs if train else 0, time=train_time if train else 0.0))
+
+        if self.emulator is not None:
+            # Particles are accepted states, whose log-likelihoods are never truncated by a threshold
+            self.emulator.fit(self.particles.get("x", flat=True), self.particles.get("logl", flat=True))
 
 
         return current_particles
 
+    def _flow_divergence(self, current_particles):
+        """
+        Estimate the Kullback-Leibler divergence of the normalizing flow from the current particles.
+
+        Parameters
+        ----------
+        current_particles : dict
+            Dictionary containing the current particles.
+
+        Returns
+        -------
+        divergence : float
+            Weighted mean of the difference between the normalized log-posterior of the particles in
+            ``u`` space at the current temperature and their log-probability under the flow.
+        """
+        with torch.no_grad():
+            log_q = torch_to_numpy(self.flow.log_prob(numpy_to_torch(current_particles.get("u")))).astype(np.float64)
+        log_p = current_particles.get("beta") * current_particles.get("logl") + current_particles.get("logp") \
+            + current_particles.get("logdetj") - current_particles.get("logz")
+        w = current_particles.get("weights")
+        mask = w > 0.0
+        return np.sum(w[mask] * (log_p[mask] - log_q[mask]))
+
     def _resample(self, current_particles):
         """
         Resample particles.
@@ -784,7 +1265,50 @@ class Sampler:
 
         return current_particles
 
-    def _log_like(self, x):
+    def _log_like(self, x, threshold=None):
+        """
+        Compute log likelihood, looking up the whole batch in the likelihood
+        cache first (if available) and evaluating only the misses.
+
+        Parameters
+        ----------
+        x : array_like
+            Array of parameter values.
+        threshold : array_like or None
+            Minimum log likelihood required for acceptance of each point,
+            passed to the likelihood (default is ``None``).
+        
+        Returns
+        -------
+        logl : float
+            Log likelihood.
+        blob : array_like
+            Additional data (default is ``None``).
+        """
+        if self.likelihood_cache is None or self.have_blobs:
+            return self._evaluate_log_like(x, threshold)
+
+        logl, found = self.likelihood_cache.get(x)
+        if np.all(found):
+            return logl, None
+
+        threshold_miss = None if threshold is None else np.asarray(threshold)[~found]
+        logl_miss, blob = self._evaluate_log_like(x[~found], threshold_miss)
+        if blob is not None:
+            # Blobs cannot be recovered from the cache, evaluate the full batch instead
+            if np.any(found):
+                return self._evaluate_log_like(x, threshold)
+            return logl_miss, blob
+
+        # Values at or below the threshold may come from early-stopped evaluations and are not cached
+        logl_miss = np.asarray(logl_miss, dtype=np.float64)
+        complete = np.ones(len(logl_miss), dtype=bool) if threshold_miss is None else logl_miss > threshold_miss
+        self.likelihood_cache.put(x[~found][complete], logl_miss[complete])
+        logl[~found] = logl_miss
+
+        return logl, None
+
+    def _evaluate_log_like(self, x, threshold=None):
         """
         Compute log likelihood.
 
@@ -792,6 +1316,9 @@ class Sampler:
         ----------
         x : array_like
             Array of parameter values.
+        threshold : array_like or None
+            Minimum log likelihood required for acceptance of each point,
+            passed to the likelihood (default is ``None``).
         
         Returns
         -------
@@ -800,12 +1327,29 @@ class Sampler:
         blob : array_like
             Additional data (default is ``None``).
         """
+        if self.torch_likelihood:
+            with torch.no_grad():
+                x = torch.as_tensor(x, dtype=torch.float64)
+                if threshold is None:
+                    logl = self.log_likelihood(x)
+                else:
+                    logl = self.log_likelihood.call_with_threshold((x, torch.as_tensor(threshold, dtype=torch.float64)))
+            return torch_to_numpy(torch.as_tensor(logl, dtype=torch.float64)).reshape(-1), None
+
         if self.vectorize:
-            return self.log_likelihood(x), None
-        elif self.pool is not None:
-            results = list(self.distribute(self.log_likelihood, x))
+            if threshold is None:
+                return self.log_likelihood(x), None
+            return self.log_likelihood.call_with_threshold((x, threshold)), None
+
+        if threshold is None:
+            log_likelihood, tasks = self.log_likelihood, x
+        else:
+            log_likelihood, tasks = self.log_likelihood.call_with_threshold, list(zip(x, threshold))
+
+        if self.pool is not None:
+            results = list(self.distribute(log_likelihood, tasks))
         else:
-            results = list(map(self.log_likelihood, x))
+            results = list(map(log_likelihood, tasks))
 
 
         try:
@@ -840,6 +1384,50 @@ class Sampler:
 
         return logl, blob
         
+    def _use_approx(self, beta):
+        """
+        Check if delayed acceptance with an approximate likelihood should be used.
+
+        Parameters
+        ----------
+        beta : float
+            Inverse temperature.
+
+        Returns
+        -------
+        use_approx : bool
+            True if an approximate likelihood is provided or the emulator
+            is accurate enough at this temperature.
+        """
+        if self.emulator is not None:
+            return self.emulator.usable(beta)
+        return self.approx_log_likelihood is not None
+
+    def _log_like_approx(self, x):
+        """
+        Compute approximate log likelihood used for delayed acceptance.
+
+        Parameters
+        ----------
+        x : array_like
+            Array of parameter values.
+        
+        Returns
+        -------
+        logl : array_like
+            Approximate log likelihood.
+        """
+        if self.emulator is not None:
+            return self.emulator.predict(x)
+        elif self.vectorize:
+            return np.asarray(self.approx_log_likelihood(x), dtype=np.float64)
+        elif self.pool is not None:
+            results = list(self.distribute(self.approx_log_likelihood, x))
+        else:
+            results = list(map(self.approx_log_likelihood, x))
+
+        return np.array([float(l) for l in results])
+
     def evidence(self):
         """
         Return the log evidence estimate and error.
@@ -868,15 +1456,21 @@ class Sampler:
             logq = torch_to_numpy(logq)
 
         x_q, logdetj = self.scaler.inverse(theta_q)
-        logl, _ = self._log_like(x_q)
+
+        # Evaluate the likelihood only for samples with finite prior density
         logp = self.log_prior(x_q)
+        mask = np.isfinite(logp) & np.isfinite(logdetj)
+        logl = np.full(n, -np.inf)
+        if np.any(mask):
+            logl[mask], _ = self._log_like(x_q[mask])
 
         logw = logl + logp + logdetj - logq 
+        logw[~mask] = -np.inf
         logz = np.logaddexp.reduce(logw) - np.log(len(logw))
 
         dlogz = np.std([np.logaddexp.reduce(logw[np.random.choice(len(logw), len(logw))]) - np.log(len(logw)) for _ in range(np.maximum(n,1000))])
 
-        self.calls += n
+        self.calls += int(np.sum(mask))
         self.pbar.update_stats(dict(calls=self.calls))
 
         self.logz = logz
@@ -1,9 +1,10 @@
 from typing import Union, List
 
 import numpy as np
+import torch
 from scipy.special import erf, erfinv
 
-from .input_validation import assert_array_float, assert_array_within_interval
+from .input_validation import assert_array_float, assert_array_within_interval, array_within_interval
 
 class Reparameterize:
     """
@@ -80,6 +81,21 @@ class Reparameterize:
         self.diagonal = diagonal
 
         self._create_masks()
+        self._create_plan()
+
+    def __setstate__(self, state):
+        """
+        Set state information after unpickling. The precomputed plan, validation bounds
+        and affine constants are rebuilt for states pickled before they were introduced.
+        """
+        self.__dict__.update(state)
+        if '_plan' not in state or '_low_valid' not in state:
+            self._create_plan()
+        if self.mu is not None:
+            if self.diagonal and 'log_det_sigma' not in state:
+                self.log_det_sigma = np.sum(np.log(self.sigma))
+            elif not self.diagonal and 'L_T' not in state:
+                self.L_T = np.ascontiguousarray(self.L.T)
 
     def apply_boundary_conditions(self, x: np.ndarray):
         """
@@ -123,12 +139,14 @@ class Reparameterize:
         """
         if self.periodic is not None:
             x = x.copy()
-            for i in self.periodic:
-                for j in range(len(x)):
-                    while x[j, i] > self.high[i]:
-                        x[j, i] = self.low[i] + x[j, i] - self.high[i]
-                    while x[j, i] < self.low[i]:
-                        x[j, i] = self.high[i] + x[j, i] - self.low[i]
+            idx = np.asarray(self.periodic, dtype=int)
+            low, high = self.low[idx], self.high[idx]
+            period = high - low
+            xi = x[:, idx]
+            # Shift by the smallest number of periods that brings the values inside [low, high]
+            xi = np.where(xi > high, xi - period * np.ceil((xi - high) / period), xi)
+            xi = np.where(xi < low, xi + period * np.ceil((low - xi) / period), xi)
+            x[:, idx] = xi
         return x
 
     def _apply_reflective_boundary_conditions(self, x: np.ndarray):
@@ -147,12 +165,15 @@ class Reparameterize:
         """
         if self.reflective is not None:
             x = x.copy()
-            for i in self.reflective:
-                for j in range(len(x)):
-                    while x[j, i] > self.high[i]:
-                        x[j, i] = self.high[i] - x[j, i] + self.high[i]
-                    while x[j, i] < self.low[i]:
-                        x[j, i] = self.low[i] + self.low[i] - x[j, i]
+            idx = np.asarray(self.reflective, dtype=int)
+            low, high = self.low[idx], self.high[idx]
+            period = high - low
+            xi = x[:, idx]
+            # Triangular wave of period 2 * (high - low), so that values that are reflected
+            # more than once (e.g. beyond one bound and then the other) end up inside [low, high]
+            outside = (xi > high) | (xi < low)
+            y = np.mod(xi - low, 2.0 * period)
+            x[:, idx] = np.where(outside, low + np.where(y > period, 2.0 * period - y, y), xi)
 
         return x
 
@@ -165,19 +186,21 @@ class Reparameterize:
         x : np.ndarray
             Input data used for training.
         """
-        assert_array_within_interval(x, self.low, self.high)
+        self._validate(x)
 
         u = self._forward(x)
         self.mu = np.mean(u, axis=0)
         if self.diagonal:
             self.sigma = np.std(u, axis=0)
+            self.log_det_sigma = np.sum(np.log(self.sigma))
         else:
             self.cov = np.cov(u.T)
             self.L = np.linalg.cholesky(self.cov)
             self.L_inv = np.linalg.inv(self.L)
             self.log_det_L = np.linalg.slogdet(self.L)[1]
+            self.L_T = np.ascontiguousarray(self.L.T)
 
-    def forward(self, x: np.ndarray):
+    def forward(self, x: np.ndarray, validate: bool = True):
         """
         Forward transformation (both logit/probit for bounds and affine for all parameters).
 
@@ -185,12 +208,16 @@ class Reparameterize:
         ----------
         x : np.ndarray
             Input data
+        validate : bool
+            Check that the input is within the bounds (default is ``validate=True``). Can be
+            set to False for inputs that have already been validated (e.g. by ``fit``).
         Returns
         -------
         u : np.ndarray
             Transformed input data
         """
-        assert_array_within_interval(x, self.low, self.high)
+        if validate:
+            self._validate(x)
 
         u = self._forward(x)
         if self.scale:
@@ -198,14 +225,21 @@ class Reparameterize:
 
         return u
 
-    def inverse(self, u: np.ndarray):
+    def inverse(self, u: np.ndarray, out: tuple = None):
         """
         Inverse transformation (both logit^-1/probit^-1 for bounds and affine for all parameters).
 
+        The affine and bound transformations are fused and applied in place, using
+        the index arrays and constant log-Jacobian terms precomputed in ``__init__``
+        and ``fit``.
+
         Parameters
         ----------
         u : np.ndarray
             Input data
+        out : tuple or None
+            Optional tuple ``(x, log_det_J)`` of float64 arrays of shapes ``u.shape``
+            and ``(len(u),)`` in which the results are written (default is ``None``).
         Returns
         -------
         x : np.ndarray
@@ -213,14 +247,85 @@ class Reparameterize:
         log_det_J : np.array
             Logarithm of determinant of Jacobian matrix transformation.
         """
+        u = np.asarray(u, dtype=np.float64)
+        if out is None:
+            x = np.empty(u.shape)
+            log_det_J = np.empty(len(u))
+        else:
+            x, log_det_J = out
+
         if self.scale:
-            x, log_det_J = self._inverse_affine(u)
-            x, log_det_J_prime = self._inverse(x)
-            log_det_J += log_det_J_prime
+            if self.diagonal:
+                np.multiply(u, self.sigma, out=x)
+                log_det_J.fill(self.log_det_sigma)
+            else:
+                np.dot(u, self.L_T, out=x)
+                log_det_J.fill(self.log_det_L)
+            x += self.mu
         else:
-            x, log_det_J = self._inverse(u)
+            x[...] = u
+            log_det_J.fill(0.0)
 
-        return x, log_det_J
+        return self._inverse_inplace(x, log_det_J)
+
+    def inverse_torch(self, u: torch.Tensor):
+        """
+        Differentiable inverse transformation of torch tensors (both logit^-1/probit^-1
+        for bounds and affine for all parameters).
+
+        Parameters
+        ----------
+        u : torch.Tensor
+            Input data
+        Returns
+        -------
+        x : torch.Tensor
+            Transformed input data
+        log_det_J : torch.Tensor
+            Logarithm of determinant of Jacobian matrix transformation.
+        """
+        def as_tensor(a):
+            return torch.as_tensor(a, dtype=u.dtype, device=u.device)
+
+        if self.scale:
+            mu = as_tensor(self.mu)
+            if self.diagonal:
+                x = mu + as_tensor(self.sigma) * u
+                log_det_J = torch.sum(torch.log(as_tensor(self.sigma))) * torch.ones(len(u), dtype=u.dtype, device=u.device)
+            else:
+                x = mu + u @ as_tensor(self.L).T
+                log_det_J = as_tensor(self.log_det_L) * torch.ones(len(u), dtype=u.dtype, device=u.device)
+        else:
+            x = u
+            log_det_J = torch.zeros(len(u), dtype=u.dtype, device=u.device)
+
+        x_out = x.clone()
+        J = torch.zeros_like(x)
+
+        if np.any(self.mask_left):
+            idx = torch.as_tensor(np.flatnonzero(self.mask_left))
+            x_out[:, idx] = torch.exp(x[:, idx]) + as_tensor(self.low[self.mask_left])
+            J[:, idx] = x[:, idx]
+
+        if np.any(self.mask_right):
+            idx = torch.as_tensor(np.flatnonzero(self.mask_right))
+            x_out[:, idx] = as_tensor(self.high[self.mask_right]) - torch.exp(x[:, idx])
+            J[:, idx] = x[:, idx]
+
+        if np.any(self.mask_both):
+            idx = torch.as_tensor(np.flatnonzero(self.mask_both))
+            low = as_tensor(self.low[self.mask_both])
+            high = as_tensor(self.high[self.mask_both])
+            u_both = x[:, idx]
+            if self.transform == "logit":
+                p = torch.sigmoid(u_both)
+                J[:, idx] = torch.log(high - low) + torch.nn.functional.logsigmoid(u_both) + torch.nn.functional.logsigmoid(-u_both)
+            elif self.transform == "probit":
+                p = (torch.erf(u_both / np.sqrt(2.0)) + 1.0) / 2.0
+                J[:, idx] = torch.log(high - low) + (-u_both**2.0 / 2.0) - np.log(np.sqrt(2.0 * np.pi))
+            x_out[:, idx] = p * (high - low) + low
+
+        return x_out, log_det_J + torch.sum(J, dim=1)
 
     def _forward(self, x: np.ndarray):
         """
@@ -258,15 +363,54 @@ class Reparameterize:
         log_det_J : np.array
             Logarithm of determinant of Jacobian matrix transformation.
         """
-        x = np.empty(u.shape)
-        J = np.empty(u.shape)
+        return self._inverse_inplace(np.array(u, dtype=np.float64), np.zeros(len(u)))
 
-        x[:, self.mask_none], J[:, self.mask_none] = self._inverse_none(u)
-        x[:, self.mask_left], J[:, self.mask_left] = self._inverse_left(u)
-        x[:, self.mask_right], J[:, self.mask_right] = self._inverse_right(u)
-        x[:, self.mask_both], J[:, self.mask_both] = self._inverse_both(u)
+    def _inverse_inplace(self, x: np.ndarray, log_det_J: np.ndarray):
+        """
+        Inverse transformation for bounded parameters, applied in place.
 
-        log_det_J = np.sum(J, axis=1)
+        Parameters
+        ----------
+        x : np.ndarray
+            Input data, overwritten with the transformed data.
+        log_det_J : np.ndarray
+            Logarithm of determinant of Jacobian matrix, incremented in place.
+        Returns
+        -------
+        x : np.ndarray
+            Transformed input data
+        log_det_J : np.array
+            Logarithm of determinant of Jacobian matrix transformation.
+        """
+        plan = self._plan
+
+        if plan['left'] is not None:
+            v = x[:, plan['left']]
+            log_det_J += np.sum(v, axis=1)
+            np.exp(v, out=v)
+            v += plan['low_left']
+            x[:, plan['left']] = v
+
+        if plan['right'] is not None:
+            v = x[:, plan['right']]
+            log_det_J += np.sum(v, axis=1)
+            np.exp(v, out=v)
+            x[:, plan['right']] = plan['high_right'] - v
+
+        if plan['both'] is not None:
+            v = x[:, plan['both']]
+            if self.transform == "logit":
+                # log(p) + log(1 - p) = -log(1 + exp(-v)) - log(1 + exp(v))
+                log_det_J += plan['log_det_both'] - np.sum(np.logaddexp(0.0, -v) + np.logaddexp(0.0, v), axis=1)
+                p = np.exp(-np.logaddexp(0.0, -v))
+            else:
+                log_det_J += plan['log_det_both'] - 0.5 * np.einsum('ij,ij->i', v, v)
+                p = erf(v * (1.0 / np.sqrt(2.0)))
+                p += 1.0
+                p *= 0.5
+            p *= plan['range_both']
+            p += plan['low_both']
+            x[:, plan['both']] = p
 
         return x, log_det_J
 
@@ -285,7 +429,7 @@ class Reparameterize:
         if self.diagonal:
             return (x - self.mu) / self.sigma
         else:
-            return np.array([np.dot(self.L_inv, xi - self.mu) for xi in x])
+            return np.dot(x - self.mu, self.L_inv.T)
 
     def _inverse_affine(self, u: np.ndarray):
         """
@@ -306,7 +450,7 @@ class Reparameterize:
             log_det_J = np.sum(np.log(self.sigma))
             return self.mu + self.sigma * u, log_det_J * np.ones(len(u))
         else:
-            x = self.mu + np.array([np.dot(self.L, ui) for ui in u])
+            x = self.mu + np.dot(u, self.L.T)
             return x, self.log_det_L * np.ones(len(u))
 
     def _forward_left(self, x: np.ndarray):
@@ -453,6 +597,52 @@ class Reparameterize:
         """
         return u[:, self.mask_none], np.zeros(u.shape)[:, self.mask_none]
 
+    def _validate(self, x: np.ndarray):
+        """
+        Check that the input is within the bounds.
+
+        The column-wise minima and maxima are compared with the cached bounds and
+        the detailed error message is only built if the check fails.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            Input data
+        """
+        if not array_within_interval(x, self._low_valid, self._high_valid):
+            assert_array_within_interval(x, self.low, self.high)
+
+    def _create_plan(self):
+        """
+        Precompute the column indices (slices when contiguous) and constants
+        of the inverse transformation for bounded parameters.
+        """
+        def index(mask):
+            idx = np.flatnonzero(mask)
+            if len(idx) == 0:
+                return None
+            if np.all(np.diff(idx) == 1):
+                return slice(int(idx[0]), int(idx[-1]) + 1)
+            return idx
+
+        range_both = self.high[self.mask_both].astype(np.float64) - self.low[self.mask_both]
+        log_det_both = np.sum(np.log(range_both))
+        if self.transform == "probit":
+            log_det_both -= len(range_both) * np.log(np.sqrt(2.0 * np.pi))
+
+        # Bounds used for validation, with missing bounds replaced by infinities
+        self._low_valid = np.where(np.isnan(self.low), -np.inf, self.low)
+        self._high_valid = np.where(np.isnan(self.high), np.inf, self.high)
+
+        self._plan = dict(left=index(self.mask_left),
+                          right=index(self.mask_right),
+                          both=index(self.mask_both),
+                          low_left=self.low[self.mask_left].astype(np.float64),
+                          high_right=self.high[self.mask_right].astype(np.float64),
+                          low_both=self.low[self.mask_both].astype(np.float64),
+                          range_both=range_both.astype(np.float64),
+                          log_det_both=log_det_both)
+
     def _create_masks(self):
         """
         Create parameter masks for bounded parameters
@@ -1,6 +1,7 @@
 import numpy as np
 from scipy import optimize
 from scipy import special
+from scipy import linalg
 
 def fit_mvstud(data, tolerance=1e-6, max_iter=100):
     """
@@ -83,3 +84,478 @@ def fit_mvstud(data, tolerance=1e-6, max_iter=100):
         print("Current nu: ", nu)
 
     return mu.T[0], Sigma, nu
+
+
+_NU_MIN, _NU_MAX = 1e-3, 1e6
+
+
+def _opt_nu(delta_iobs, weights, dim, nu):
+    """
+    Update the degrees of freedom of a weighted multivariate Student's t fit.
+
+    Parameters
+    ----------
+    delta_iobs : ndarray
+        Squared Mahalanobis distances of the samples.
+    weights : ndarray
+        Normalized weights of the samples.
+    dim : int
+        Dimension of the samples.
+    nu : float
+        Current degrees of freedom, used as the starting point.
+
+    Returns
+    -------
+    nu : float
+        The degrees of freedom (``np.inf`` if the likelihood still increases at ``nu=1e6``).
+    """
+    def func0(nu):
+        w_iobs = (nu + dim) / (nu + delta_iobs)
+        return -special.psi(nu/2) + np.log(nu/2) + np.dot(weights, np.log(w_iobs) - w_iobs) + 1 + special.psi((nu+dim)/2) - np.log((nu+dim)/2)
+
+    def dfunc0(nu):
+        dw_iobs = (delta_iobs - dim) / (nu + delta_iobs) ** 2
+        w_iobs = (nu + dim) / (nu + delta_iobs)
+        return -special.polygamma(1, nu/2)/2 + 1/nu + np.dot(weights, dw_iobs / w_iobs - dw_iobs) + special.polygamma(1, (nu+dim)/2)/2 - 1/(nu+dim)
+
+    # The derivative is evaluated at a finite upper limit, since at nu=1e300
+    # it rounds to exactly zero and the fit would always return nu=inf
+    if func0(_NU_MAX) >= 0:
+        return np.inf
+
+    # Safeguarded Newton iterations in log(nu), starting from the previous value.
+    # The root is bracketed by [_NU_MIN, _NU_MAX] since func0 is positive at small nu.
+    log_lo, log_hi = np.log(_NU_MIN), np.log(_NU_MAX)
+    log_nu = np.log(np.clip(nu, _NU_MIN, _NU_MAX))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(100):
+            nu = np.exp(log_nu)
+            f = func0(nu)
+            if f > 0:
+                log_lo = log_nu
+            else:
+                log_hi = log_nu
+            step = f / (nu * dfunc0(nu))
+            log_nu_new = log_nu - step
+            if not np.isfinite(log_nu_new) or log_nu_new <= log_lo or log_nu_new >= log_hi:
+                # Bisection step if Newton leaves the bracket
+                log_nu_new = 0.5 * (log_lo + log_hi)
+            if np.abs(log_nu_new - log_nu) < 1e-10 or log_hi - log_lo < 1e-10:
+                return np.exp(log_nu_new)
+            log_nu = log_nu_new
+
+    return optimize.bisect(func0, _NU_MIN, _NU_MAX)
+
+
+def fit_mvstud_weighted(data, weights=None, mu=None, Sigma=None, nu=None, tolerance=1e-4, max_iter=100):
+    """
+    Fit a multivariate Student's t distribution to weighted data using the EM algorithm.
+
+    Unlike ``fit_mvstud``, the importance weights are used directly (no resampling),
+    the iterations can be warm-started from a previous fit, the Mahalanobis distances
+    are computed with a Cholesky factorization and the degrees of freedom are updated
+    with a Newton solve in ``log(nu)`` (with a bisection fallback).
+
+    Parameters
+    ----------
+    data : ndarray
+        An array of shape (n, dim) containing n samples of dimension dim.
+    weights : ndarray, optional
+        An array of shape (n,) containing the (unnormalized) weights of the samples.
+        The default is None, in which case all samples have equal weight.
+    mu : ndarray, optional
+        Initial mean of the distribution (e.g. from a previous fit). The default is None,
+        in which case the weighted median is used.
+    Sigma : ndarray, optional
+        Initial covariance matrix of the distribution. The default is None, in which
+        case the weighted covariance of the data is used.
+    nu : float, optional
+        Initial degrees of freedom of the distribution. The default is None, in which
+        case ``nu=20`` is used.
+    tolerance : float, optional
+        The tolerance for convergence, relative to the degrees of freedom. The default is 1e-4.
+    max_iter : int, optional
+        The maximum number of iterations. The default is 100.
+
+    Returns
+    -------
+    mu : ndarray
+        The mean of the distribution.
+    Sigma : ndarray
+        The covariance matrix of the distribution.
+    nu : float
+        The degrees of freedom of the distribution (``np.inf`` if the likelihood
+        still increases at ``nu=1e6``).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pocomc.student import fit_mvstud_weighted
+    >>> data = np.random.randn(100, 2)
+    >>> weights = np.random.rand(100)
+    >>> mu, Sigma, nu = fit_mvstud_weighted(data, weights)
+    >>> mu, Sigma, nu = fit_mvstud_weighted(data, weights, mu=mu, Sigma=Sigma, nu=nu)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if weights is None:
+        weights = np.ones(len(data))
+    weights = np.asarray(weights, dtype=np.float64)
+    mask = weights > 0
+    data, weights = data[mask], weights[mask] / np.sum(weights[mask])
+    (n, dim) = data.shape
+
+    if mu is None or Sigma is None or np.shape(mu) != (dim,):
+        idx = np.argsort(data, axis=0)
+        cdf = np.cumsum(weights[idx], axis=0)
+        mu = data[idx[np.argmax(cdf >= 0.5, axis=0), np.arange(dim)], np.arange(dim)]
+        diffs = data - np.dot(weights, data)
+        Sigma = np.dot(weights * diffs.T, diffs) + np.diag(np.dot(weights, diffs ** 2)) / n
+    mu = np.array(mu, dtype=np.float64)
+    Sigma = np.array(Sigma, dtype=np.float64)
+    if nu is None or not np.isfinite(nu):
+        nu = 20
+    nu = float(np.clip(nu, _NU_MIN, _NU_MAX))
+
+    last_nu = 0
+    i = 0
+    while np.abs(last_nu - nu) > tolerance * np.maximum(1.0, nu) and i < max_iter:
+        i += 1
+        diffs = data - mu
+        try:
+            L = linalg.cholesky(Sigma, lower=True)
+        except linalg.LinAlgError:
+            L = linalg.cholesky(Sigma + np.eye(dim) * 1e-10 * np.trace(Sigma) / dim, lower=True)
+        L_inv = linalg.solve_triangular(L, np.eye(dim), lower=True, check_finite=False)
+        delta_iobs = np.sum(np.dot(diffs, L_inv.T) ** 2, axis=1)
+
+        # update nu
+        last_nu = nu
+        nu = _opt_nu(delta_iobs, weights, dim, nu)
+        if nu == np.inf:
+            # Gaussian limit, the EM update reduces to the weighted mean and covariance
+            mu = np.dot(weights, data)
+            diffs_w = (data - mu) * np.sqrt(weights)[:, None]
+            return mu, np.dot(diffs_w.T, diffs_w), nu
+
+        # update Sigma
+        w_iobs = weights * (nu + dim) / (nu + delta_iobs)
+        diffs_w = diffs * np.sqrt(w_iobs)[:, None]
+        Sigma = np.dot(diffs_w.T, diffs_w)
+
+        # update mu
+        mu = np.dot(w_iobs, data) / np.sum(w_iobs)
+
+    return mu, Sigma, nu
+
+
+def mvstud_logpdf(data, mu, Sigma, nu):
+    """
+    Log probability density of a multivariate Student's t distribution.
+
+    Parameters
+    ----------
+    data : ndarray
+        An array of shape (n, dim) containing n samples of dimension dim.
+    mu : ndarray
+        The mean of the distribution.
+    Sigma : ndarray
+        The covariance (scale) matrix of the distribution.
+    nu : float
+        The degrees of freedom of the distribution.
+
+    Returns
+    -------
+    logpdf : ndarray
+        An array of shape (n,) containing the log density of the samples.
+    """
+    dim = len(mu)
+    L = linalg.cholesky(Sigma, lower=True)
+    delta = np.sum(linalg.solve_triangular(L, (data - mu).T, lower=True, check_finite=False) ** 2, axis=0)
+    return (special.gammaln((nu + dim) / 2) - special.gammaln(nu / 2) - dim / 2 * np.log(nu * np.pi)
+            - np.sum(np.log(np.diag(L))) - (nu + dim) / 2 * np.log1p(delta / nu))
+
+
+def fit_mixture_mvstud_weighted(data, weights=None, n_components=2, init=None, tolerance=1e-5, max_iter=50):
+    """
+    Fit a mixture of multivariate Student's t distributions to weighted data using the EM algorithm.
+
+    Every M-step updates each component with one iteration of ``fit_mvstud_weighted``
+    using the importance weights multiplied by the responsibilities of the component.
+
+    Parameters
+    ----------
+    data : ndarray
+        An array of shape (n, dim) containing n samples of dimension dim.
+    weights : ndarray, optional
+        An array of shape (n,) containing the (unnormalized) weights of the samples.
+        The default is None, in which case all samples have equal weight.
+    n_components : int, optional
+        Number of mixture components. The default is 2.
+    init : tuple, optional
+        Initial mixture weights, means, covariance matrices and degrees of freedom
+        (e.g. from a previous fit with the same number of components). The default is
+        None, in which case the components are initialized with weighted k-means++.
+    tolerance : float, optional
+        The tolerance for convergence of the weighted mean log-likelihood. The default is 1e-5.
+    max_iter : int, optional
+        The maximum number of iterations. The default is 50.
+
+    Returns
+    -------
+    pi : ndarray
+        The mixture weights of shape (n_components,).
+    mu : ndarray
+        The means of the components of shape (n_components, dim).
+    Sigma : ndarray
+        The covariance matrices of the components of shape (n_components, dim, dim).
+    nu : ndarray
+        The degrees of freedom of the components of shape (n_components,).
+    loglike : float
+        The weighted mean log-likelihood of the data, or ``-np.inf`` if a component collapsed.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pocomc.student import fit_mixture_mvstud_weighted
+    >>> data = np.vstack([np.random.randn(100, 2) - 5, np.random.randn(100, 2) + 5])
+    >>> pi, mu, Sigma, nu, loglike = fit_mixture_mvstud_weighted(data, n_components=2)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if weights is None:
+        weights = np.ones(len(data))
+    weights = np.asarray(weights, dtype=np.float64)
+    mask = weights > 0
+    data, weights = data[mask], weights[mask] / np.sum(weights[mask])
+    (n, dim) = data.shape
+    n_eff = 1.0 / np.sum(weights ** 2)
+
+    if init is not None and len(init[0]) == n_components:
+        pi, mu, Sigma, nu = (np.array(p, dtype=np.float64) for p in init)
+    else:
+        # Weighted k-means++ seeding followed by a few Lloyd iterations
+        centers = data[np.random.choice(n, p=weights)][None, :]
+        for _ in range(1, n_components):
+            d2 = np.min(np.sum((data[:, None, :] - centers[None, :, :]) ** 2, axis=2), axis=1)
+            p = weights * d2
+            centers = np.vstack([centers, data[np.random.choice(n, p=p / np.sum(p))]])
+        for _ in range(10):
+            labels = np.argmin(np.sum((data[:, None, :] - centers[None, :, :]) ** 2, axis=2), axis=1)
+            for k in range(n_components):
+                w_k = weights * (labels == k)
+                if np.sum(w_k) > 0:
+                    centers[k] = np.dot(w_k, data) / np.sum(w_k)
+        diffs = data - np.dot(weights, data)
+        Sigma_global = np.dot(weights * diffs.T, diffs)
+        pi = np.empty(n_components)
+        mu = centers
+        Sigma = np.empty((n_components, dim, dim))
+        for k in range(n_components):
+            w_k = weights * (labels == k)
+            pi[k] = np.sum(w_k)
+            if pi[k] > 0:
+                diffs = data - mu[k]
+                Sigma[k] = np.dot(w_k * diffs.T, diffs) / pi[k] + 1e-3 * Sigma_global
+            else:
+                Sigma[k] = Sigma_global
+        pi = np.maximum(pi, 1e-3)
+        pi /= np.sum(pi)
+        nu = np.full(n_components, 20.0)
+
+    loglike = -np.inf
+    for _ in range(max_iter):
+        # E-step
+        try:
+            log_r = np.log(pi) + np.stack([mvstud_logpdf(data, mu[k], Sigma[k], nu[k])
+                                           for k in range(n_components)], axis=1)
+        except linalg.LinAlgError:
+            return pi, mu, Sigma, nu, -np.inf
+        log_norm = special.logsumexp(log_r, axis=1)
+        loglike_new = np.dot(weights, log_norm)
+        r = np.exp(log_r - log_norm[:, None])
+
+        # M-step
+        pi = np.dot(weights, r)
+        if np.any(pi * n_eff < dim + 2):
+            return pi, mu, Sigma, nu, -np.inf
+        for k in range(n_components):
+            mu[k], Sigma[k], nu[k] = fit_mvstud_weighted(data, weights * r[:, k], mu=mu[k], Sigma=Sigma[k],
+                                                         nu=nu[k], max_iter=1)
+        nu = np.minimum(nu, 1e6)
+
+        if np.abs(loglike_new - loglike) < tolerance:
+            loglike = loglike_new
+            break
+        loglike = loglike_new
+
+    return pi, mu, Sigma, nu, loglike
+
+
+def lowrank_factor(diffs_w, rank):
+    """
+    Fit a low-rank plus diagonal covariance matrix ``diag(D) + W W^T`` by weighted probabilistic PCA.
+
+    The leading eigenvectors of the weighted covariance matrix are found with a randomized
+    range finder, so the cost is ``O(n * dim * rank)`` and the dense covariance matrix is
+    never formed. The diagonal is chosen such that the variances are matched exactly.
+
+    Parameters
+    ----------
+    diffs_w : ndarray
+        An array of shape (n, dim) containing the centred samples multiplied by the square
+        root of their normalized weights, such that the weighted covariance matrix is
+        ``diffs_w.T @ diffs_w``.
+    rank : int
+        Rank of the low-rank term (at most dim - 1).
+
+    Returns
+    -------
+    D : ndarray
+        The diagonal term of shape (dim,).
+    W : ndarray
+        The low-rank factor of shape (dim, rank).
+    """
+    (n, dim) = diffs_w.shape
+    rank = int(max(min(rank, dim - 1, n), 0))
+    var = np.sum(diffs_w ** 2, axis=0)
+    if rank == 0:
+        return var, np.zeros((dim, 0))
+
+    # Randomized range finder with power iterations
+    omega = np.random.default_rng(0).standard_normal((dim, min(rank + 10, dim)))
+    Q = np.dot(diffs_w.T, np.dot(diffs_w, omega))
+    for _ in range(2):
+        Q, _ = np.linalg.qr(Q)
+        Q = np.dot(diffs_w.T, np.dot(diffs_w, Q))
+    Q, _ = np.linalg.qr(Q)
+    B = np.dot(diffs_w, Q)
+    eigvals, eigvecs = np.linalg.eigh(np.dot(B.T, B))
+    eigvals, eigvecs = eigvals[::-1][:rank], np.dot(Q, eigvecs[:, ::-1][:, :rank])
+
+    # Probabilistic PCA, with the remaining variance assigned to the diagonal
+    sigma2 = np.maximum((np.sum(var) - np.sum(eigvals)) / (dim - rank), 1e-12 * np.max(var))
+    W = eigvecs * np.sqrt(np.maximum(eigvals - sigma2, 0.0))
+    D = np.maximum(var - np.sum(W ** 2, axis=1), 1e-3 * sigma2)
+    return D, W
+
+
+def lowrank_mahalanobis(diff, D, W):
+    """
+    Squared Mahalanobis distances for a covariance matrix ``diag(D) + W W^T``.
+
+    The inverse is applied with the Woodbury identity in ``O(n * dim * rank)``.
+
+    Parameters
+    ----------
+    diff : ndarray
+        An array of shape (n, dim) containing the differences from the mean.
+    D : ndarray
+        The diagonal term of shape (dim,).
+    W : ndarray
+        The low-rank factor of shape (dim, rank).
+
+    Returns
+    -------
+    delta : ndarray
+        An array of shape (n,).
+    """
+    y = diff / D
+    L = linalg.cholesky(np.eye(W.shape[1]) + np.dot(W.T, W / D[:, None]), lower=True)
+    z = linalg.solve_triangular(L, np.dot(y, W).T, lower=True, check_finite=False)
+    return np.sum(diff * y, axis=1) - np.sum(z ** 2, axis=0)
+
+
+def fit_mvstud_lowrank_weighted(data, weights=None, rank=10, mu=None, D=None, W=None, nu=None,
+                                tolerance=1e-4, max_iter=100):
+    """
+    Fit a multivariate Student's t distribution with a low-rank plus diagonal covariance
+    matrix ``diag(D) + W W^T`` to weighted data using the EM algorithm.
+
+    The iterations are the same as in ``fit_mvstud_weighted``, except that the covariance
+    update is projected onto the low-rank plus diagonal structure with ``lowrank_factor``,
+    so that every iteration costs ``O(n * dim * rank)``.
+
+    Parameters
+    ----------
+    data : ndarray
+        An array of shape (n, dim) containing n samples of dimension dim.
+    weights : ndarray, optional
+        An array of shape (n,) containing the (unnormalized) weights of the samples.
+        The default is None, in which case all samples have equal weight.
+    rank : int, optional
+        Rank of the low-rank term. The default is 10.
+    mu : ndarray, optional
+        Initial mean of the distribution (e.g. from a previous fit). The default is None,
+        in which case the weighted median is used.
+    D : ndarray, optional
+        Initial diagonal term of the covariance matrix. The default is None.
+    W : ndarray, optional
+        Initial low-rank factor of the covariance matrix. The default is None.
+    nu : float, optional
+        Initial degrees of freedom of the distribution. The default is None, in which
+        case ``nu=20`` is used.
+    tolerance : float, optional
+        The tolerance for convergence, relative to the degrees of freedom. The default is 1e-4.
+    max_iter : int, optional
+        The maximum number of iterations. The default is 100.
+
+    Returns
+    -------
+    mu : ndarray
+        The mean of the distribution.
+    D : ndarray
+        The diagonal term of the covariance matrix.
+    W : ndarray
+        The low-rank factor of the covariance matrix.
+    nu : float
+        The degrees of freedom of the distribution (``np.inf`` if the likelihood
+        still increases at ``nu=1e6``).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pocomc.student import fit_mvstud_lowrank_weighted
+    >>> data = np.random.randn(1000, 100)
+    >>> mu, D, W, nu = fit_mvstud_lowrank_weighted(data, rank=5)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if weights is None:
+        weights = np.ones(len(data))
+    weights = np.asarray(weights, dtype=np.float64)
+    mask = weights > 0
+    data, weights = data[mask], weights[mask] / np.sum(weights[mask])
+    (n, dim) = data.shape
+
+    if mu is None or D is None or W is None or np.shape(mu) != (dim,):
+        idx = np.argsort(data, axis=0)
+        cdf = np.cumsum(weights[idx], axis=0)
+        mu = data[idx[np.argmax(cdf >= 0.5, axis=0), np.arange(dim)], np.arange(dim)]
+        D, W = lowrank_factor((data - np.dot(weights, data)) * np.sqrt(weights)[:, None], rank)
+    mu = np.array(mu, dtype=np.float64)
+    if nu is None or not np.isfinite(nu):
+        nu = 20
+    nu = float(np.clip(nu, _NU_MIN, _NU_MAX))
+
+    last_nu = 0
+    i = 0
+    while np.abs(last_nu - nu) > tolerance * np.maximum(1.0, nu) and i < max_iter:
+        i += 1
+        diffs = data - mu
+        delta_iobs = lowrank_mahalanobis(diffs, D, W)
+
+        # update nu
+        last_nu = nu
+        nu = _opt_nu(delta_iobs, weights, dim, nu)
+        if nu == np.inf:
+            # Gaussian limit, the EM update reduces to the weighted mean and covariance
+            mu = np.dot(weights, data)
+            D, W = lowrank_factor((data - mu) * np.sqrt(weights)[:, None], rank)
+            return mu, D, W, nu
+
+        # update D and W
+        w_iobs = weights * (nu + dim) / (nu + delta_iobs)
+        D, W = lowrank_factor(diffs * np.sqrt(w_iobs)[:, None], rank)
+
+        # update mu
+        mu = np.dot(w_iobs, data) / np.sum(w_iobs)
+
+    return mu, D, W, nu
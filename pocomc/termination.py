@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class ESJDTermination:
+    """
+    Termination policy of the MCMC kernels based on the cumulative squared jump distance.
+
+    The squared jump distance of every walker is accumulated online. Since the
+    expected squared distance between two independent draws of a distribution with
+    covariance matrix ``Sigma`` is ``2 * trace(Sigma)``, the number of independent
+    moves made by a walker is estimated as its cumulative squared jump distance
+    divided by ``2 * trace(Sigma)``, where ``Sigma`` is estimated from the walkers at
+    the beginning of the MCMC run. The run stops once a summary of the number of
+    independent moves over the walkers reaches the target, so that easy iterations
+    stop early and hard iterations run for longer.
+
+    Parameters
+    ----------
+    n_independent : ``float``
+        Target number of independent moves per walker (default is ``n_independent=1.0``).
+    statistic : ``str``
+        Summary of the number of independent moves over the walkers that has to reach the
+        target. Options are ``"mean"`` (default) or ``"median"``.
+
+    Examples
+    --------
+    >>> from pocomc import Sampler
+    >>> from pocomc.termination import ESJDTermination
+    >>> sampler = Sampler(prior, likelihood, termination=ESJDTermination(n_independent=2.0))
+    """
+
+    def __init__(self, n_independent: float = 1.0, statistic: str = "mean"):
+        if statistic not in ["mean", "median"]:
+            raise ValueError(f"Invalid statistic {statistic}. Options are 'mean' or 'median'.")
+        self.n_independent = float(n_independent)
+        self.statistic = statistic
+
+        self.x = None
+        self.scale = None
+        self.csjd = None
+
+    def reset(self, x: np.ndarray):
+        """
+        Start a new MCMC run.
+
+        Parameters
+        ----------
+        x : ``np.ndarray``
+            Array of shape ``(n_walkers, n_dim)`` with the initial positions of the walkers
+            in the space in which the kernel proposes new points.
+        """
+        self.x = np.array(x, dtype=np.float64)
+        self.scale = 2.0 * np.sum(np.var(self.x, axis=0))
+        self.csjd = np.zeros(len(self.x))
+
+    def independent_moves(self):
+        """
+        Number of independent moves of every walker since the beginning of the run.
+
+        Returns
+        -------
+        n_independent : ``np.ndarray``
+            Array of shape ``(n_walkers,)``.
+        """
+        return self.csjd / np.maximum(self.scale, 1e-300)
+
+    def update(self, x: np.ndarray):
+        """
+        Record an MCMC step and check whether the run should stop.
+
+        Parameters
+        ----------
+        x : ``np.ndarray``
+            Array of shape ``(n_walkers, n_dim)`` with the current positions of the walkers.
+
+        Returns
+        -------
+        stop : ``bool``
+            True if the target number of independent moves has been reached.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        self.csjd += np.sum((x - self.x) ** 2, axis=1)
+        self.x[:] = x
+        if self.statistic == "mean":
+            n_independent = np.mean(self.independent_moves())
+        else:
+            n_independent = np.median(self.independent_moves())
+        return n_independent >= self.n_independent
@@ -259,6 +259,24 @@ class FunctionWrapper(object):
         """
         return self.f(x, *self.args, **self.kwargs)
 
+    def call_with_threshold(self, x_and_threshold):
+        """
+            Evaluate log-likelihood function passing the minimum
+            log-likelihood value required for acceptance.
+
+        Parameters
+        ----------
+        x_and_threshold : tuple
+            Input position array and acceptance threshold.
+
+        Returns
+        -------
+        f : float or ``np.ndarray``
+            f(x, threshold=threshold)
+        """
+        x, threshold = x_and_threshold
+        return self.f(x, *self.args, threshold=threshold, **self.kwargs)
+
 
 def torch_to_numpy(x: torch.Tensor) -> np.ndarray:
     """
@@ -319,6 +337,12 @@ class flow_numpy_wrapper:
     """
     Wrapper class for numpy flows.
 
+    Inputs are copied into preallocated single precision staging buffers (one per
+    batch shape) that are shared with torch through ``torch.from_numpy`` views, so no
+    new input tensors are allocated on repeated calls. Outputs are returned as numpy
+    views of the flow outputs or, if ``out`` is provided, written into caller-provided
+    arrays.
+
     Parameters
     ----------
     flow : Flow object
@@ -331,19 +355,80 @@ class flow_numpy_wrapper:
     """
     def __init__(self, flow):
         self.flow = flow
+        self.buffers = dict()
+
+    def _stage(self, v):
+        """
+        Return a single precision torch view of the input.
+
+        Parameters
+        ----------
+        v : np.ndarray
+            Input array.
+
+        Returns
+        -------
+            Torch tensor sharing memory with ``v`` or with the staging buffer of its shape.
+        """
+        v = np.asarray(v)
+        if v.dtype == np.float32 and v.flags.c_contiguous:
+            return torch.from_numpy(v)
+        buffer = self.buffers.get(v.shape)
+        if buffer is None:
+            buffer = self.buffers[v.shape] = np.empty(v.shape, dtype=np.float32)
+        np.copyto(buffer, v, casting='same_kind')
+        return torch.from_numpy(buffer)
 
     @torch.no_grad()
-    def forward(self, v):
-        v = numpy_to_torch(v)
-        theta, logdetj = self.flow.forward(v)
-        theta = torch_to_numpy(theta)
-        logdetj = - torch_to_numpy(logdetj)
-        return theta, logdetj
+    def forward(self, v, out=None):
+        """
+        Forward transformation.
+
+        Parameters
+        ----------
+        v : np.ndarray
+            Samples to transform.
+        out : tuple or None
+            Arrays ``(theta, logdetj)`` in which the results are written
+            (default is ``out=None``, in which case new arrays are returned).
+
+        Returns
+        -------
+        theta : np.ndarray
+            Transformed samples.
+        logdetj : np.ndarray
+            Logarithm of the determinant of the Jacobian of the inverse transformation.
+        """
+        theta, logdetj = self.flow.forward(self._stage(v))
+        if out is None:
+            return torch_to_numpy(theta), - torch_to_numpy(logdetj)
+        np.copyto(out[0], torch_to_numpy(theta))
+        np.negative(torch_to_numpy(logdetj), out=out[1])
+        return out
 
     @torch.no_grad()
-    def inverse(self, theta):
-        theta = numpy_to_torch(theta)
-        v, logdetj = self.flow.inverse(theta)
-        v = torch_to_numpy(v)
-        logdetj = torch_to_numpy(logdetj)
-        return v, logdetj
\ No newline at end of file
+    def inverse(self, theta, out=None):
+        """
+        Inverse transformation.
+
+        Parameters
+        ----------
+        theta : np.ndarray
+            Samples to transform.
+        out : tuple or None
+            Arrays ``(v, logdetj)`` in which the results are written
+            (default is ``out=None``, in which case new arrays are returned).
+
+        Returns
+        -------
+        v : np.ndarray
+            Transformed samples.
+        logdetj : np.ndarray
+            Logarithm of the determinant of the Jacobian of the inverse transformation.
+        """
+        v, logdetj = self.flow.inverse(self._stage(theta))
+        if out is None:
+            return torch_to_numpy(v), torch_to_numpy(logdetj)
+        np.copyto(out[0], torch_to_numpy(v))
+        np.copyto(out[1], torch_to_numpy(logdetj))
+        return out
@@ -0,0 +1,87 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+import dill
+import numpy as np
+from scipy.stats import norm
+
+from pocomc.cache import LikelihoodCache
+from pocomc.sampler import Sampler
+from pocomc.prior import Prior
+
+
+class LikelihoodCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name) / "logl.db"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_put(self):
+        # Test that stored values are found and unknown ones are reported as misses
+        np.random.seed(0)
+        cache = LikelihoodCache(self.path, version="v1")
+        x = np.random.randn(10, 3)
+        logl = np.random.randn(10)
+
+        cache.put(x[:6], logl[:6])
+        logl_cached, found = cache.get(x)
+
+        self.assertTrue(np.all(found[:6]))
+        self.assertFalse(np.any(found[6:]))
+        self.assertTrue(np.allclose(logl_cached[:6], logl[:6]))
+        self.assertTrue(np.all(np.isnan(logl_cached[6:])))
+        self.assertEqual(cache.hits, 6)
+        self.assertEqual(cache.misses, 4)
+
+    def test_version(self):
+        # Test that entries written with another version tag are not returned
+        np.random.seed(0)
+        x = np.random.randn(5, 2)
+        LikelihoodCache(self.path, version="v1").put(x, np.zeros(5))
+
+        _, found = LikelihoodCache(self.path, version="v2").get(x)
+        self.assertFalse(np.any(found))
+
+        _, found = LikelihoodCache(self.path, version="v1").get(x)
+        self.assertTrue(np.all(found))
+
+    def test_pickle(self):
+        # Test that the cache survives pickling and keeps pointing to the same file
+        np.random.seed(0)
+        x = np.random.randn(5, 2)
+        cache = LikelihoodCache(self.path)
+        cache.put(x, np.arange(5.0))
+
+        cache = dill.loads(dill.dumps(cache))
+        logl, found = cache.get(x)
+        self.assertTrue(np.all(found))
+        self.assertTrue(np.allclose(logl, np.arange(5.0)))
+
+    def test_sampler_rerun(self):
+        # Test that a rerun of the sampler is served from the cache
+        calls = []
+
+        def log_likelihood(x):
+            calls.append(len(x))
+            return np.sum(-0.5 * x ** 2, axis=1)
+
+        prior = Prior([norm(0, 1), norm(0, 1)])
+        kwargs = dict(vectorize=True, train_config=dict(epochs=1), likelihood_cache=self.path, random_state=0)
+
+        sampler = Sampler(prior, log_likelihood, **kwargs)
+        sampler.run(n_total=256, n_evidence=0, progress=False)
+        n_first = sum(calls)
+
+        calls.clear()
+        sampler = Sampler(prior, log_likelihood, **kwargs)
+        sampler.run(n_total=256, n_evidence=0, progress=False)
+
+        self.assertGreater(n_first, 0)
+        self.assertEqual(sum(calls), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
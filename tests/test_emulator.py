@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+
+from pocomc.emulator import Emulator
+
+
+class EmulatorTestCase(unittest.TestCase):
+    @staticmethod
+    def make_data(n_data=2000, n_dim=3):
+        # Make a dataset to use in tests
+        np.random.seed(0)
+        x = np.random.randn(n_data, n_dim)
+        logl = -0.5 * np.sum((x - 0.5) ** 2 / 0.3 ** 2, axis=1) + np.sin(x[:, 0])
+        return x, logl
+
+    def test_fit_predict(self):
+        # Test that the emulator reproduces a smooth log-likelihood
+        x, logl = self.make_data()
+        emulator = Emulator(n_dim=x.shape[1], random_state=0)
+        emulator.fit(x[:1500], logl[:1500])
+
+        mean, std = emulator.predict(x[1500:], return_std=True)
+
+        self.assertTrue(emulator.trained)
+        self.assertEqual(mean.shape, (500,))
+        self.assertEqual(std.shape, (500,))
+        self.assertTrue(np.all(std > 0.0))
+        self.assertLess(np.sqrt(np.mean((mean - logl[1500:]) ** 2)), 0.05 * np.std(logl))
+        self.assertLess(emulator.error, 0.05 * np.std(logl))
+
+    def test_non_finite(self):
+        # Test that samples with infinite log-likelihood are ignored during training
+        x, logl = self.make_data()
+        logl[::10] = -np.inf
+        emulator = Emulator(n_dim=x.shape[1], random_state=0)
+        emulator.fit(x, logl)
+        self.assertTrue(np.all(np.isfinite(emulator.predict(x))))
+
+    def test_usable(self):
+        # Test that the emulator is only usable when trained and accurate enough
+        x, logl = self.make_data()
+        emulator = Emulator(n_dim=x.shape[1], tolerance=1.0, random_state=0)
+        self.assertFalse(emulator.usable(1.0))
+        self.assertRaises(RuntimeError, emulator.predict, x)
+
+        emulator.fit(x, logl)
+        self.assertTrue(emulator.usable(1.0))
+        self.assertFalse(emulator.usable(2.0 / emulator.error))
+
+    def test_too_few_samples(self):
+        # Test that the emulator is not trained on too few samples
+        x, logl = self.make_data(n_data=5)
+        emulator = Emulator(n_dim=x.shape[1])
+        emulator.fit(x, logl)
+        self.assertFalse(emulator.trained)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
+import pickle
 import unittest
 import torch
-from pocomc.flow import Flow
+from pocomc.flow import Flow, nearest_neighbour_distances
 
 class FlowTestCase(unittest.TestCase):
     @staticmethod
@@ -192,6 +193,118 @@ class FlowTestCase(unittest.TestCase):
         self.assertEqual(x.shape, x_samples.shape)
         self.assertEqual(x.dtype, x_samples.dtype)
 
+    def test_fit_validation_frequency(self):
+        torch.manual_seed(0)
+
+        x = self.make_data()
+        weights = torch.rand(x.shape[0])
+        flow = Flow(n_dim=x.shape[1], flow='maf3')
+        history = flow.fit(x, weights=weights, validation_split=0.5, epochs=6, batch_size=16,
+                           validation_frequency=3, annealing=True)
+
+        self.assertEqual(len(history['loss']), 6)
+        self.assertEqual(len(history['val_loss']), 2)
+        self.assertTrue(all(torch.isfinite(torch.tensor(history['loss'] + history['val_loss']))))
+
+    def test_fit_warm_start(self):
+        torch.manual_seed(0)
+
+        x = self.make_data()
+        flow = Flow(n_dim=x.shape[1], flow='maf3')
+        flow.fit(x, epochs=2, batch_size=16, annealing=True)
+        optimizer, scheduler = flow.optimizer, flow.scheduler
+        step = optimizer.state[next(flow.flow.parameters())]['step'].clone()
+
+        flow.fit(x, epochs=2, batch_size=16, annealing=True, learning_rate=1e-4, warm_start=True)
+        self.assertIs(flow.optimizer, optimizer)
+        self.assertIs(flow.scheduler, scheduler)
+        self.assertEqual(optimizer.param_groups[0]['lr'], 1e-4)
+        self.assertTrue(torch.all(optimizer.state[next(flow.flow.parameters())]['step'] > step))
+
+        flow.fit(x, epochs=2, batch_size=16, annealing=True)
+        self.assertIsNot(flow.optimizer, optimizer)
+
+        exp_avg = flow.optimizer.state[next(flow.flow.parameters())]['exp_avg']
+        flow = pickle.loads(pickle.dumps(flow))
+        torch.testing.assert_close(flow.optimizer.state[next(flow.flow.parameters())]['exp_avg'], exp_avg)
+        flow.fit(x, epochs=2, batch_size=16, annealing=True, warm_start=True)
+
+    def test_setstate_without_optimizer(self):
+        torch.manual_seed(0)
+
+        # State of a flow pickled before the optimizer, scheduler and best state were stored
+        x = self.make_data()
+        state = Flow(n_dim=x.shape[1], flow='maf3').__dict__.copy()
+        for key in ['optimizer', 'scheduler', 'best_state']:
+            del state[key]
+
+        flow = Flow.__new__(Flow)
+        flow.__setstate__(state)
+        self.assertIsNone(flow.optimizer)
+        self.assertIsNone(flow.scheduler)
+        flow.fit(x, epochs=2, batch_size=16, warm_start=True)
+
+    def test_fit_best_state(self):
+        torch.manual_seed(0)
+
+        x = self.make_data()
+        flow = Flow(n_dim=x.shape[1], flow='maf3')
+        flow.fit(x, epochs=2, batch_size=16)
+        best_state = flow.best_state
+        flow.fit(x, epochs=2, batch_size=16)
+        for a, b in zip(best_state, flow.best_state):
+            self.assertIs(a, b)
+
+        tensors = list(flow.flow.state_dict().values())
+        flow._snapshot(tensors)
+        snapshot = [t.clone() for t in tensors]
+        with torch.no_grad():
+            for p in flow.flow.parameters():
+                p.add_(1.0)
+        flow._restore(tensors)
+        for a, b in zip(flow.flow.state_dict().values(), snapshot):
+            torch.testing.assert_close(a, b)
+
+    def test_nearest_neighbour_distances(self):
+        x = self.make_data()
+        x[1] = x[0]
+        dists = torch.linalg.norm(x[:, None] - x[None, :], dim=-1)
+        dists[dists == 0.0] = torch.inf
+        expected = torch.min(dists, dim=1).values
+
+        for max_elements in [1, 1000, 2**22]:
+            torch.testing.assert_close(nearest_neighbour_distances(x, max_elements=max_elements), expected)
+
+    def test_fit_noise(self):
+        torch.manual_seed(0)
+
+        x = self.make_data()
+        flow = Flow(n_dim=x.shape[1], flow='maf3')
+        history = flow.fit(x, epochs=2, batch_size=16, noise=0.5)
+        self.assertTrue(all(torch.isfinite(torch.tensor(history['loss']))))
+
+    def test_fit_time_limit(self):
+        torch.manual_seed(0)
+
+        x = self.make_data()
+        flow = Flow(n_dim=x.shape[1], flow='maf3')
+        history = flow.fit(x, epochs=1000, batch_size=16, patience=1000, time_limit=0.0)
+        self.assertEqual(len(history['loss']), 1)
+        for a, b in zip(flow.flow.state_dict().values(), flow.best_state):
+            torch.testing.assert_close(a, b)
+
+    def test_fit_time_limit_before_validation(self):
+        torch.manual_seed(0)
+
+        x = self.make_data()
+        flow = Flow(n_dim=x.shape[1], flow='maf3')
+        initial_state = [t.clone() for t in flow.flow.state_dict().values()]
+        history = flow.fit(x, validation_split=0.5, validation_frequency=5, epochs=1000, batch_size=16,
+                           patience=1000, time_limit=0.0)
+        self.assertEqual(len(history['loss']), 1)
+        self.assertEqual(len(history['val_loss']), 0)
+        self.assertTrue(any(not torch.equal(a, b) for a, b in zip(flow.flow.state_dict().values(), initial_state)))
+
     def test_logj(self):
         torch.manual_seed(0)
 
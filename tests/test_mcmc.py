@@ -0,0 +1,235 @@
+import unittest
+import numpy as np
+import torch
+
+from pocomc.mcmc import _metropolis, _metropolis_torch, hmc, preconditioned_hmc
+from pocomc.flow import Flow
+from pocomc.scaler import Reparameterize
+from pocomc.tools import torch_to_numpy
+
+
+class MetropolisTestCase(unittest.TestCase):
+    @staticmethod
+    def log_prior(x):
+        # Uniform prior on the unit square
+        inside = np.all((x >= 0.0) & (x <= 1.0), axis=1)
+        return np.where(inside, 0.0, -np.inf)
+
+    @staticmethod
+    def make_state(n_walkers=100):
+        np.random.seed(0)
+        x_prime = np.random.uniform(-1.0, 2.0, size=(n_walkers, 2))
+        finite_mask = np.ones(n_walkers, dtype=bool)
+        finite_mask[:10] = False
+        logl = -np.ones(n_walkers)
+        logp = np.zeros(n_walkers)
+        log_ratio = np.random.randn(n_walkers)
+        return x_prime, finite_mask, log_ratio, logl, logp
+
+    def test_prior_first(self):
+        # Test that the likelihood is only called for points with finite prior density
+        x_prime, finite_mask, log_ratio, logl, logp = self.make_state()
+
+        evaluated = []
+
+        def log_like(x):
+            evaluated.append(x)
+            return -np.sum(x ** 2, axis=1), None
+
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, 0.5, log_like, self.log_prior)
+
+        expected_mask = finite_mask & np.isfinite(self.log_prior(x_prime))
+        self.assertEqual(len(evaluated), 1)
+        self.assertEqual(len(evaluated[0]), np.sum(expected_mask))
+        self.assertEqual(step['calls'], np.sum(expected_mask))
+        self.assertTrue(np.all(np.isfinite(self.log_prior(evaluated[0]))))
+        self.assertTrue(np.all(np.isneginf(step['logl'][~expected_mask])))
+        self.assertTrue(np.all(np.isneginf(step['logp'][~expected_mask])))
+        self.assertFalse(np.any(step['accept'][~expected_mask]))
+        self.assertIsNone(step['blobs'])
+
+    def test_no_valid_proposals(self):
+        # Test that the likelihood is not called at all when every proposal has zero prior density
+        x_prime = np.full((5, 2), 3.0)
+
+        def log_like(x):
+            raise AssertionError("Likelihood should not be called.")
+
+        step = _metropolis(x_prime, np.ones(5, dtype=bool), np.zeros(5), np.zeros(5), np.zeros(5),
+                           1.0, log_like, self.log_prior)
+        self.assertEqual(step['calls'], 0)
+        self.assertFalse(np.any(step['accept']))
+
+    def test_threshold(self):
+        # Test that a likelihood stopping early below the threshold gives the same decisions
+        x_prime, finite_mask, log_ratio, logl, logp = self.make_state()
+
+        def log_like(x, threshold=None):
+            logl = -np.sum(x ** 2, axis=1)
+            if threshold is not None:
+                logl[logl <= threshold] = -np.inf
+            return logl, None
+
+        np.random.seed(1)
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, 0.5, log_like, self.log_prior)
+        np.random.seed(1)
+        step_threshold = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, 0.5, log_like, self.log_prior,
+                                     threshold=True)
+
+        self.assertTrue(np.array_equal(step['accept'], step_threshold['accept']))
+        self.assertTrue(np.allclose(step['logl'][step['accept']], step_threshold['logl'][step['accept']]))
+        self.assertEqual(step['threshold_rejections'], 0)
+        self.assertEqual(step_threshold['threshold_rejections'], np.sum(np.isneginf(step_threshold['logl']) & finite_mask
+                                                         & np.isfinite(self.log_prior(x_prime))))
+
+    def test_threshold_zero_beta(self):
+        # Test that at beta = 0 proposals that are rejected regardless of the likelihood are not evaluated
+        x_prime, finite_mask, log_ratio, logl, logp = self.make_state()
+
+        def log_like(x, threshold=None):
+            self.assertTrue(np.all(np.isneginf(threshold)))
+            return -np.sum(x ** 2, axis=1), None
+
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, 0.0, log_like, self.log_prior, threshold=True)
+        self.assertEqual(step['calls'] + step['threshold_rejections'], np.sum(finite_mask & np.isfinite(self.log_prior(x_prime))))
+
+    def test_delayed_acceptance_exact_approximation(self):
+        # Test that with an exact approximation every screened proposal is accepted in the second stage
+        x_prime, finite_mask, log_ratio, logl, logp = self.make_state()
+        logl = -np.sum(np.random.uniform(0.0, 1.0, size=x_prime.shape) ** 2, axis=1)
+
+        def log_like(x):
+            return -np.sum(x ** 2, axis=1), None
+
+        def log_like_approx(x):
+            return -np.sum(x ** 2, axis=1)
+
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, 0.5, log_like, self.log_prior,
+                           log_like_approx=log_like_approx, logl_approx=logl.copy())
+
+        self.assertEqual(step['calls'], step['screened'])
+        self.assertEqual(np.sum(step['accept']), step['screened'])
+        self.assertEqual(step['calls_approx'], np.sum(finite_mask & np.isfinite(self.log_prior(x_prime))))
+
+    def test_delayed_acceptance_threshold_residuals(self):
+        # Test that likelihood values truncated at the threshold are left out of the residuals
+        x_prime, finite_mask, log_ratio, logl, logp = self.make_state()
+        logl = -np.sum(np.random.uniform(0.0, 1.0, size=x_prime.shape) ** 2, axis=1)
+
+        def log_like(x, threshold=None):
+            logl = -np.sum(x ** 2, axis=1)
+            if threshold is not None:
+                # Stop early and return a bound below the threshold
+                logl = np.where(logl <= threshold, threshold - 1.0, logl)
+            return logl, None
+
+        def log_like_approx(x):
+            return -np.sum(x ** 2, axis=1) + 2.0 * x[:, 0]
+
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, 0.5, log_like, self.log_prior, threshold=True,
+                           log_like_approx=log_like_approx, logl_approx=logl.copy())
+
+        self.assertGreater(step['calls'], np.sum(step['accept']))
+        self.assertTrue(np.allclose(step['residuals'], -2.0 * x_prime[step['accept'], 0]))
+
+    def test_delayed_acceptance_screening(self):
+        # Test that proposals rejected in the first stage never reach the likelihood
+        x_prime, finite_mask, log_ratio, logl, logp = self.make_state()
+
+        def log_like(x):
+            return np.zeros(len(x)), None
+
+        def log_like_approx(x):
+            return np.full(len(x), -1e3)
+
+        step = _metropolis(x_prime, finite_mask, log_ratio, logl, logp, 1.0, log_like, self.log_prior,
+                           log_like_approx=log_like_approx, logl_approx=np.zeros(len(x_prime)))
+
+        self.assertEqual(step['calls'], 0)
+        self.assertEqual(step['screened'], 0)
+        self.assertFalse(np.any(step['accept']))
+
+    def test_torch_prior_first(self):
+        # Test that the torch criterion only calls the likelihood for points with finite prior density
+        x_prime, finite_mask, log_ratio, logl, logp = self.make_state()
+
+        evaluated = []
+
+        def log_like(x):
+            self.assertIsInstance(x, torch.Tensor)
+            evaluated.append(x)
+            return -torch.sum(x ** 2, dim=1)
+
+        as_tensor = lambda a: torch.as_tensor(a)
+        step = _metropolis_torch(as_tensor(x_prime), as_tensor(finite_mask), as_tensor(log_ratio), as_tensor(logl),
+                                 as_tensor(logp), 0.5, log_like, self.log_prior)
+
+        expected_mask = finite_mask & np.isfinite(self.log_prior(x_prime))
+        self.assertEqual(len(evaluated), 1)
+        self.assertEqual(len(evaluated[0]), np.sum(expected_mask))
+        self.assertEqual(step['calls'], np.sum(expected_mask))
+        self.assertTrue(torch.all(torch.isneginf(step['logl'][~torch.as_tensor(expected_mask)])))
+        self.assertFalse(torch.any(step['accept'][~torch.as_tensor(expected_mask)]))
+
+
+
+class HMCTestCase(unittest.TestCase):
+    def test_non_finite_gradient(self):
+        # Test that trajectories through points with finite likelihood but non-finite gradient are rejected
+        def log_like(x):
+            return -0.5 * torch.sum(x ** 2, dim=1) + 0.0 * torch.nan_to_num(torch.sqrt(-x[:, 0]), nan=0.0)
+
+        def log_prior(x):
+            return np.zeros(len(x))
+
+        np.random.seed(0)
+        torch.manual_seed(0)
+        n_walkers, n_dim = 100, 2
+        x = np.random.randn(n_walkers, n_dim)
+        x[:, 0] = -np.abs(x[:, 0]) - 0.5
+        scaler = Reparameterize(n_dim=n_dim, bounds=np.array(n_dim * [[-np.inf, np.inf]]))
+        scaler.fit(x)
+        u = scaler.forward(x)
+
+        state_dict = dict(u=u, x=x, logdetj=scaler.inverse(u)[1], logp=log_prior(x),
+                          logl=torch_to_numpy(log_like(torch.as_tensor(x))), beta=1.0)
+        function_dict = dict(loglike_torch=log_like, logprior=log_prior, scaler=scaler)
+        option_dict = dict(n_max=20, n_steps=20, progress_bar=None, termination=None, n_leapfrog=5,
+                           proposal_scale=0.5)
+        results = hmc(state_dict, function_dict, option_dict)
+
+        self.assertTrue(np.all(results['x'][:, 0] < 0.0))
+        self.assertTrue(np.all(np.isfinite(results['logl'])))
+
+
+    def test_rejected_walkers_keep_state(self):
+        # Test that walkers that never move return their stored state, not a re-evaluation at the flow round trip
+        def log_like(x):
+            return -0.5 * torch.sum(x ** 2, dim=1)
+
+        def log_prior(x):
+            return np.zeros(len(x))
+
+        np.random.seed(0)
+        torch.manual_seed(0)
+        n_walkers, n_dim = 100, 2
+        x = np.random.randn(n_walkers, n_dim)
+        scaler = Reparameterize(n_dim=n_dim, bounds=np.array(n_dim * [[-np.inf, np.inf]]))
+        scaler.fit(x)
+        u = scaler.forward(x)
+        logl = torch_to_numpy(log_like(torch.as_tensor(x)))
+
+        state_dict = dict(u=u, x=x, logdetj=scaler.inverse(u)[1], logp=log_prior(x), logl=logl, beta=1.0)
+        function_dict = dict(loglike_torch=log_like, logprior=log_prior, scaler=scaler, flow=Flow(n_dim=n_dim))
+        option_dict = dict(n_max=1, n_steps=1, progress_bar=None, termination=None, n_leapfrog=1,
+                           proposal_scale=1e3)
+        results = preconditioned_hmc(state_dict, function_dict, option_dict)
+
+        self.assertEqual(results['accept'], 0.0)
+        self.assertEqual(results['calls'], 2 * n_walkers)
+        for key in ['u', 'x', 'logdetj', 'logl']:
+            self.assertTrue(np.array_equal(results[key], state_dict[key]))
+
+
+if __name__ == '__main__':
+    unittest.main()
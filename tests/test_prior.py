@@ -1,9 +1,9 @@
 import unittest
 
 import numpy as np
-from scipy.stats import norm
+from scipy.stats import norm, uniform, truncnorm, loguniform, beta, gamma, t, multivariate_normal, dirichlet
 
-from pocomc.prior import Prior
+from pocomc.prior import Prior, Block, MultivariateNormal, Dirichlet
 
 class PriorTestCase(unittest.TestCase):
 
@@ -51,4 +51,67 @@ class PriorTestCase(unittest.TestCase):
         self.assertEqual(prior.dim, 2)
 
 
-    
\ No newline at end of file
+    
+
+    def test_log_prob_fast_path(self):
+        dists = [uniform(1, 2), norm(0.5, 2), truncnorm(-1, 2, loc=1, scale=2), loguniform(1e-2, 10),
+                 beta(2, 3, loc=1, scale=2), gamma(2, scale=3), t(3), norm(0, 1)]
+        prior = Prior(dists)
+        np.random.seed(0)
+        x = np.vstack([prior.rvs(50), np.random.uniform(-3, 12, size=(50, len(dists)))])
+        log_prob = np.sum([dist.logpdf(x[:, i]) for i, dist in enumerate(dists)], axis=0)
+        self.assertTrue(np.any(np.isinf(log_prob)))
+        np.testing.assert_allclose(prior.logpdf(x), log_prob, rtol=1e-12)
+
+    def test_log_prob_recompile(self):
+        prior = Prior([norm(0, 1), norm(0, 1)])
+        x = np.array([[0.5, 1.5]])
+        prior.logpdf(x)
+        prior.dists = [uniform(0, 1), norm(0, 1)]
+        self.assertAlmostEqual(prior.logpdf(x)[0], norm(0, 1).logpdf(1.5))
+        prior.dists[1] = uniform(0, 1)
+        self.assertEqual(prior.logpdf(x)[0], -np.inf)
+        self.assertTrue(np.all(prior.rvs(10)[:, 1] < 1.0))
+
+    def test_sample_fast_path(self):
+        dists = [uniform(1, 2), norm(0.5, 2), beta(2, 3)]
+        prior = Prior(dists)
+        np.random.seed(0)
+        x = prior.rvs(10)
+        np.random.seed(0)
+        np.testing.assert_allclose(x, np.transpose([dist.rvs(size=10) for dist in dists]))
+
+    def test_blocks(self):
+        mean, cov = np.array([1.0, 2.0]), np.array([[1.0, 0.9], [0.9, 2.0]])
+        alpha = np.array([1.0, 2.0, 3.0])
+        prior = Prior([norm(0, 1), MultivariateNormal(mean, cov), Dirichlet(alpha), uniform(0, 1)])
+        self.assertEqual(prior.dim, 6)
+        np.testing.assert_array_equal(prior.bounds[3:], np.tile([0.0, 1.0], (3, 1)))
+        np.testing.assert_array_equal(prior.bounds[:3], np.tile([-np.inf, np.inf], (3, 1)))
+
+        x = prior.rvs(20)
+        self.assertEqual(np.shape(x), (20, 6))
+        self.assertTrue(np.all(np.sum(x[:, 3:5], axis=1) <= 1.0))
+        fractions = np.hstack([x[:, 3:5], 1.0 - np.sum(x[:, 3:5], axis=1, keepdims=True)])
+        log_prob = norm(0, 1).logpdf(x[:, 0]) + multivariate_normal(mean, cov).logpdf(x[:, 1:3]) \
+            + dirichlet(alpha).logpdf(fractions.T) + uniform(0, 1).logpdf(x[:, 5])
+        np.testing.assert_allclose(prior.logpdf(x), log_prob)
+
+        x[0, 3:5] = [0.9, 0.5]
+        self.assertEqual(prior.logpdf(x)[0], -np.inf)
+
+    def test_custom_block(self):
+        block = Block(lambda x: norm.logpdf(x[:, 0], 0, 3) + norm.logpdf(x[:, 1], x[:, 0], 1),
+                      lambda size: np.random.normal(0, 3, (size, 2)),
+                      np.tile([-np.inf, np.inf], (2, 1)))
+        prior = Prior([uniform(0, 1), block])
+        self.assertEqual(prior.dim, 3)
+        x = prior.rvs(10)
+        self.assertEqual(np.shape(x), (10, 3))
+        np.testing.assert_allclose(prior.logpdf(x), block.logpdf(x[:, 1:]))
+
+    def test_block_invalid(self):
+        with self.assertRaises(ValueError):
+            MultivariateNormal(np.zeros(2), np.eye(3))
+        with self.assertRaises(ValueError):
+            Dirichlet([1.0, -1.0])
@@ -1,5 +1,7 @@
+import tempfile
 import unittest
 import numpy as np
+import torch
 
 from scipy.stats import norm
 
@@ -43,6 +45,306 @@ class SamplerTestCase(unittest.TestCase):
         )
         sampler.run()
 
+    def test_run_threshold(self):
+
+        def log_likelihood(x, threshold=None):
+            logl = np.sum(-0.5 * np.log(2 * np.pi) - 0.5 * x ** 2, axis=1)
+            if threshold is not None:
+                logl[logl <= threshold] = -np.inf
+            return logl
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        sampler = Sampler(
+            prior=prior,
+            likelihood=log_likelihood,
+            vectorize=True,
+            likelihood_threshold=True,
+            train_config={'epochs': 1},
+            random_state=0,
+        )
+        sampler.run()
+        self.assertGreater(sampler.threshold_rejections, 0)
+        self.assertTrue(np.all(np.isfinite(sampler.posterior()[2])))
+
+    def test_threshold_adaptation(self):
+        # Test that passing the threshold leaves the adapted proposal scale and the chains unchanged
+        def log_likelihood(x, threshold=None):
+            logl = np.sum(-0.5 * (x / 0.1) ** 2, axis=1)
+            if threshold is not None:
+                logl[logl <= threshold] = -np.inf
+            return logl
+
+        n_dim = 8
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        results = []
+        for likelihood_threshold in [False, True]:
+            sampler = Sampler(
+                prior=prior,
+                likelihood=log_likelihood,
+                vectorize=True,
+                likelihood_threshold=likelihood_threshold,
+                train_config={'epochs': 1},
+                random_state=0,
+            )
+            sampler.run(n_total=1000, progress=False)
+            results.append((sampler.calls, sampler.proposal_scale, sampler.posterior()[0]))
+
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(results[0][1], results[1][1])
+        self.assertTrue(np.array_equal(results[0][2], results[1][2]))
+
+    def test_run_torch_likelihood(self):
+
+        def log_likelihood(x):
+            return torch.sum(-0.5 * np.log(2 * np.pi) - 0.5 * x ** 2, dim=1)
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        for sample, precondition in [('tpcn', True), ('rwm', True), ('tpcn', False), ('rwm', False)]:
+            sampler = Sampler(
+                prior=prior,
+                likelihood=log_likelihood,
+                torch_likelihood=True,
+                sample=sample,
+                precondition=precondition,
+                train_config={'epochs': 1},
+                random_state=0,
+            )
+            sampler.run()
+            samples, weights, _, _ = sampler.posterior()
+            self.assertTrue(np.allclose(np.average(samples, weights=weights, axis=0), 0.0, atol=0.1))
+            self.assertTrue(np.allclose(np.sqrt(np.average(samples ** 2, weights=weights, axis=0)), np.sqrt(0.5), atol=0.1))
+
+    def test_run_independence(self):
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        sampler = Sampler(
+            prior=prior,
+            likelihood=self.log_likelihood_vectorized,
+            vectorize=True,
+            sample='independence',
+            train_config={'epochs': 1},
+            random_state=0,
+        )
+        sampler.run()
+        samples, weights, _, _ = sampler.posterior()
+        self.assertTrue(np.allclose(np.average(samples, weights=weights, axis=0), 0.0, atol=0.1))
+        self.assertTrue(np.allclose(np.sqrt(np.average(samples ** 2, weights=weights, axis=0)), np.sqrt(0.5), atol=0.1))
+        self.assertTrue(0.05 <= sampler.independence_weight <= 0.95)
+
+        with self.assertRaises(ValueError):
+            Sampler(prior=prior, likelihood=self.log_likelihood_vectorized, vectorize=True,
+                    sample='independence', precondition=False)
+
+    def test_run_adaptive(self):
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        for precondition in [True, False]:
+            sampler = Sampler(
+                prior=prior,
+                likelihood=self.log_likelihood_vectorized,
+                vectorize=True,
+                sample='adaptive',
+                precondition=precondition,
+                train_config={'epochs': 1},
+                random_state=0,
+            )
+            sampler.run()
+            samples, weights, _, _ = sampler.posterior()
+            self.assertTrue(np.allclose(np.average(samples, weights=weights, axis=0), 0.0, atol=0.1))
+            self.assertTrue(np.allclose(np.sqrt(np.average(samples ** 2, weights=weights, axis=0)), np.sqrt(0.5), atol=0.1))
+
+            portfolio_weights = np.array(list(sampler.portfolio_weights.values()))
+            self.assertEqual(len(portfolio_weights), 3 if precondition else 2)
+            self.assertAlmostEqual(np.sum(portfolio_weights), 1.0)
+            self.assertTrue(np.all(portfolio_weights >= sampler.portfolio_floor - 1e-12))
+            self.assertTrue(all(score is not None for score in sampler.portfolio_scores.values()))
+
+    def test_run_mixture(self):
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 3)])
+
+        def log_likelihood(x):
+            # Bimodal Gaussian log likelihood with modes at -2 and 2
+            return np.logaddexp(np.sum(-0.5 * (x + 2.0) ** 2 / 0.1, axis=1),
+                                np.sum(-0.5 * (x - 2.0) ** 2 / 0.1, axis=1))
+
+        sampler = Sampler(
+            prior=prior,
+            likelihood=log_likelihood,
+            vectorize=True,
+            precondition=False,
+            max_components=3,
+            random_state=0,
+        )
+        sampler.run()
+        samples, weights, _, _ = sampler.posterior()
+        self.assertAlmostEqual(np.sum(weights[samples[:, 0] > 0.0]), 0.5, delta=0.1)
+        self.assertGreater(sampler.u_geometry.n_components, 1)
+
+        with self.assertRaises(ValueError):
+            Sampler(prior=prior, likelihood=log_likelihood, vectorize=True, max_components=0)
+
+    def test_run_train_threshold(self):
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        sampler = Sampler(
+            prior=prior,
+            likelihood=self.log_likelihood_vectorized,
+            vectorize=True,
+            train_config={'epochs': 1},
+            train_threshold=np.inf,
+            random_state=0,
+        )
+        sampler.run()
+        self.assertEqual(sampler.train_history[0]['trained'], True)
+        self.assertTrue(np.isnan(sampler.train_history[0]['drift']))
+        self.assertEqual(sum(h['trained'] for h in sampler.train_history), 1)
+        self.assertTrue(np.all(np.isfinite([h['drift'] for h in sampler.train_history[1:]])))
+        # Iterations without training still refit the geometry in u space
+        self.assertIsNotNone(sampler.u_geometry.t_mean)
+
+    def test_run_training_budget(self):
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        sampler = Sampler(
+            prior=prior,
+            likelihood=self.log_likelihood_vectorized,
+            vectorize=True,
+            train_config={'epochs': 5, 'total_epochs': 7},
+            train_frequency=1,
+            random_state=0,
+        )
+        sampler.run()
+        self.assertEqual(sampler.training_epochs, 7)
+        self.assertEqual(sum(h['epochs'] for h in sampler.train_history), 7)
+        self.assertEqual(sum(h['trained'] for h in sampler.train_history), 2)
+        self.assertGreater(sampler.training_time, 0.0)
+        self.assertGreater(sampler.sampling_time, 0.0)
+
+    def test_run_lowrank(self):
+
+        n_dim = 4
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        for precondition in [True, False]:
+            sampler = Sampler(
+                prior=prior,
+                likelihood=self.log_likelihood_vectorized,
+                vectorize=True,
+                precondition=precondition,
+                covariance='lowrank',
+                covariance_rank=2,
+                train_config={'epochs': 1},
+                random_state=0,
+            )
+            sampler.run()
+            samples, weights, _, _ = sampler.posterior()
+            self.assertTrue(np.allclose(np.average(samples, weights=weights, axis=0), 0.0, atol=0.1))
+            self.assertTrue(np.allclose(np.sqrt(np.average(samples ** 2, weights=weights, axis=0)), np.sqrt(0.5), atol=0.1))
+
+    def test_run_hmc(self):
+
+        def log_likelihood(x):
+            return torch.sum(-0.5 * np.log(2 * np.pi) - 0.5 * x ** 2, dim=1)
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        for sample, precondition in [('hmc', True), ('mala', True), ('hmc', False)]:
+            sampler = Sampler(
+                prior=prior,
+                likelihood=log_likelihood,
+                torch_likelihood=True,
+                sample=sample,
+                precondition=precondition,
+                n_leapfrog=3,
+                train_config={'epochs': 1},
+                random_state=0,
+            )
+            sampler.run()
+            samples, weights, _, _ = sampler.posterior()
+            self.assertTrue(np.allclose(np.average(samples, weights=weights, axis=0), 0.0, atol=0.1))
+            self.assertTrue(np.allclose(np.sqrt(np.average(samples ** 2, weights=weights, axis=0)), np.sqrt(0.5), atol=0.1))
+
+    def test_hmc_requires_torch_likelihood(self):
+        prior = Prior(2*[norm(0, 1)])
+        with self.assertRaises(ValueError):
+            Sampler(prior=prior, likelihood=self.log_likelihood_vectorized, vectorize=True, sample='hmc')
+
+    def test_hmc_unsupported_options(self):
+        def log_likelihood(x):
+            return torch.sum(-0.5 * x ** 2, dim=1)
+
+        prior = Prior(2*[norm(0, 1)])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for sample in ['hmc', 'mala']:
+                for options in [dict(likelihood_cache=tmpdir + '/cache.sqlite'), dict(likelihood_threshold=True),
+                                dict(emulator=True), dict(approx_likelihood=self.log_likelihood_vectorized)]:
+                    with self.assertRaises(ValueError):
+                        Sampler(prior=prior, likelihood=log_likelihood, torch_likelihood=True, sample=sample,
+                                **options)
+
+    def test_run_delayed_acceptance(self):
+
+        def log_likelihood_approx(x):
+            # Deliberately biased approximation of the likelihood
+            return np.sum(-0.4 * x ** 2 + 0.1 * x, axis=1)
+
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        sampler = Sampler(
+            prior=prior,
+            likelihood=self.log_likelihood_vectorized,
+            approx_likelihood=log_likelihood_approx,
+            vectorize=True,
+            train_config={'epochs': 1},
+            random_state=0,
+        )
+        sampler.run()
+        self.assertGreater(sampler.calls_approx, 0)
+
+        # The posterior is a normal distribution with zero mean and variance 1/2
+        samples, _, _ = sampler.posterior(resample=True)
+        self.assertTrue(np.allclose(np.mean(samples, axis=0), 0.0, atol=0.1))
+        self.assertTrue(np.allclose(np.std(samples, axis=0), 0.5 ** 0.5, atol=0.1))
+
+    def test_run_emulator(self):
+        
+        n_dim = 2
+        prior = Prior(n_dim*[norm(0, 1)])
+
+        sampler = Sampler(
+            prior=prior,
+            likelihood=self.log_likelihood_vectorized,
+            vectorize=True,
+            emulator=True,
+            train_config={'epochs': 1},
+            random_state=0,
+        )
+        sampler.run()
+        self.assertTrue(sampler.emulator.trained)
+        self.assertGreater(sampler.calls_approx, 0)
+
+    def test_emulator_and_approx_likelihood(self):
+        prior = Prior(2*[norm(0, 1)])
+        self.assertRaises(ValueError, Sampler, prior, self.log_likelihood_vectorized, vectorize=True,
+                          emulator=True, approx_likelihood=self.log_likelihood_vectorized)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 import numpy as np
+import torch
 
 from pocomc.scaler import Reparameterize
+from pocomc.input_validation import array_within_interval, assert_array_within_interval
 
 
 class ReparameterizeTestCase(unittest.TestCase):
@@ -139,6 +141,146 @@ class ReparameterizeTestCase(unittest.TestCase):
         r = Reparameterize(n_dim=x.shape[1], bounds=(lb, ub))
         self.assertRaises(ValueError, r.fit, x)
 
+    def test_inverse_torch(self):
+        # Test that the torch inverse agrees with the numpy inverse and is differentiable
+        np.random.seed(0)
+        x = np.column_stack([np.random.randn(100), np.random.exponential(size=100),
+                             -np.random.exponential(size=100), np.random.uniform(size=100)])
+        bounds = np.array([[np.nan, np.nan], [0, np.nan], [np.nan, 0], [0, 1]])
+        for transform in ['probit', 'logit']:
+            for diagonal in [True, False]:
+                r = Reparameterize(n_dim=4, bounds=bounds, transform=transform, diagonal=diagonal)
+                r.fit(x)
+                u = r.forward(x)
+                x_r, log_det_J = r.inverse(u)
+
+                u_torch = torch.tensor(u, requires_grad=True)
+                x_torch, log_det_J_torch = r.inverse_torch(u_torch)
+                self.assertTrue(np.allclose(x_r, x_torch.detach().numpy()))
+                self.assertTrue(np.allclose(log_det_J, log_det_J_torch.detach().numpy()))
+
+                log_det_J_torch.sum().backward()
+                self.assertTrue(torch.all(torch.isfinite(u_torch.grad)))
+
+    def test_boundary_conditions(self):
+        # Test that periodic and reflective boundary conditions agree with the loop-based reference
+        np.random.seed(0)
+        low, high = np.array([0.0, -1.0, 2.0]), np.array([2.0 * np.pi, 1.0, 5.0])
+        r = Reparameterize(n_dim=3, bounds=np.column_stack([low, high]), periodic=[0], reflective=[1])
+        x = np.random.uniform(low - (high - low), high + (high - low), size=(1000, 3))
+        x[:5] = low
+        x[5:10] = high
+
+        x_ref = x.copy()
+        for j in range(len(x)):
+            while x_ref[j, 0] > high[0]:
+                x_ref[j, 0] = low[0] + x_ref[j, 0] - high[0]
+            while x_ref[j, 0] < low[0]:
+                x_ref[j, 0] = high[0] + x_ref[j, 0] - low[0]
+            while x_ref[j, 1] > high[1]:
+                x_ref[j, 1] = high[1] - x_ref[j, 1] + high[1]
+            while x_ref[j, 1] < low[1]:
+                x_ref[j, 1] = low[1] + low[1] - x_ref[j, 1]
+
+        x_new = r.apply_boundary_conditions(x)
+        self.assertTrue(np.allclose(x_new, x_ref))
+        self.assertTrue(np.array_equal(x_new[:, 2], x[:, 2]))
+
+        # Values reflected more than once end up inside the bounds
+        x_far = np.array([[1.0, 3.5, 3.0], [1.0, -4.5, 3.0]])
+        self.assertTrue(np.allclose(r.apply_boundary_conditions(x_far)[:, 1], [-0.5, -0.5]))
+
+    def test_full_affine(self):
+        # Test the vectorized non-diagonal affine transformation
+        np.random.seed(0)
+        x = np.random.multivariate_normal([1.0, -2.0, 0.5], [[2.0, 0.5, 0.1], [0.5, 1.0, 0.3], [0.1, 0.3, 0.5]],
+                                          size=200)
+        r = Reparameterize(n_dim=3, bounds=np.full((3, 2), np.nan), diagonal=False)
+        r.fit(x)
+        u = r.forward(x)
+        self.assertTrue(np.allclose(u, np.array([np.dot(r.L_inv, xi - r.mu) for xi in x])))
+        self.assertTrue(np.allclose(np.cov(u.T), np.eye(3)))
+        x_r, log_det_J = r.inverse(u)
+        self.assertTrue(np.allclose(x, x_r))
+        self.assertTrue(np.allclose(log_det_J, np.linalg.slogdet(r.cov)[1] / 2))
+
+    def test_inverse_fused(self):
+        # Test that the fused inverse agrees with the step-by-step transformations and fills the output buffers
+        np.random.seed(0)
+        x = np.column_stack([np.random.uniform(size=100), np.random.randn(100), np.random.exponential(size=100),
+                             np.random.uniform(size=100), -np.random.exponential(size=100)])
+        bounds = np.array([[0, 1], [np.nan, np.nan], [0, np.nan], [-1, 2], [np.nan, 0]])
+        for transform in ['probit', 'logit']:
+            for diagonal in [True, False]:
+                r = Reparameterize(n_dim=5, bounds=bounds, transform=transform, diagonal=diagonal)
+                r.fit(x)
+                u = r.forward(x)
+
+                x_ref, log_det_J_ref = r._inverse_affine(u)
+                parts = [r._inverse_none(x_ref), r._inverse_left(x_ref), r._inverse_right(x_ref), r._inverse_both(x_ref)]
+                log_det_J_ref = log_det_J_ref + sum(np.sum(J, axis=1) for _, J in parts)
+                x_ref = np.empty_like(x)
+                for mask, (x_part, _) in zip([r.mask_none, r.mask_left, r.mask_right, r.mask_both], parts):
+                    x_ref[:, mask] = x_part
+
+                out = (np.empty_like(u), np.empty(len(u)))
+                x_r, log_det_J = r.inverse(u, out=out)
+                self.assertIs(x_r, out[0])
+                self.assertIs(log_det_J, out[1])
+                self.assertTrue(np.allclose(x_r, x_ref))
+                self.assertTrue(np.allclose(x_r, x))
+                self.assertTrue(np.allclose(log_det_J, log_det_J_ref))
+
+    def test_setstate_without_plan(self):
+        # Test that a scaler pickled before the precomputed plan was introduced still transforms correctly
+        np.random.seed(0)
+        x = np.column_stack([np.random.uniform(size=100), np.random.randn(100), np.random.exponential(size=100)])
+        bounds = np.array([[0, 1], [np.nan, np.nan], [0, np.nan]])
+        for diagonal in [True, False]:
+            r = Reparameterize(n_dim=3, bounds=bounds, diagonal=diagonal)
+            r.fit(x)
+            u = r.forward(x)
+
+            state = r.__dict__.copy()
+            for key in ['_plan', '_low_valid', '_high_valid', 'log_det_sigma', 'L_T']:
+                state.pop(key, None)
+            r_old = Reparameterize.__new__(Reparameterize)
+            r_old.__setstate__(state)
+
+            x_r, log_det_J = r_old.inverse(u)
+            self.assertTrue(np.allclose(x_r, x))
+            self.assertTrue(np.allclose(log_det_J, r.inverse(u)[1]))
+            self.assertTrue(np.allclose(r_old.forward(x), u))
+
+    def test_interval_validation(self):
+        # Test that the column-wise check agrees with the element-wise definition
+        np.random.seed(0)
+        left, right = np.array([0.0, -np.inf, -1.0]), np.array([1.0, 0.0, np.inf])
+        for _ in range(100):
+            x = np.random.uniform(-1.5, 1.5, size=(5, 3))
+            x[np.random.rand(*x.shape) < 0.1] = np.random.choice([0.0, 1.0])
+            for left_open in [True, False]:
+                for right_open in [True, False]:
+                    lower = (left < x) if left_open else (left <= x)
+                    upper = (x < right) if right_open else (x <= right)
+                    self.assertEqual(array_within_interval(x, left, right, left_open, right_open),
+                                     bool(np.all(lower & upper)))
+
+        x = np.array([[0.5, -1.0, 0.0], [np.nan, -1.0, 0.0]])
+        self.assertFalse(array_within_interval(x, left, right))
+        with self.assertRaises(ValueError):
+            assert_array_within_interval(x, np.array([0.0, np.nan, -1.0]), np.array([1.0, 0.0, np.nan]))
+        assert_array_within_interval(x[:1], np.array([0.0, np.nan, -1.0]), np.array([1.0, 0.0, np.nan]))
+
+    def test_forward_validation(self):
+        # Test that forward only validates the input when requested
+        x, lb, ub = self.make_lower_and_upper_bounded_data()
+        r = Reparameterize(n_dim=x.shape[1], bounds=(lb, ub))
+        r.fit(x)
+        x[0, 0] = ub + 1
+        self.assertRaises(ValueError, r.forward, x)
+        self.assertEqual(r.forward(x, validate=False).shape, x.shape)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,172 @@
+import unittest
+import numpy as np
+from scipy.stats import multivariate_t
+
+from pocomc.student import fit_mvstud_weighted, fit_mixture_mvstud_weighted, mvstud_logpdf
+from pocomc.student import fit_mvstud_lowrank_weighted, lowrank_factor, lowrank_mahalanobis
+from pocomc.geometry import Geometry
+
+
+class StudentTestCase(unittest.TestCase):
+    @staticmethod
+    def make_data(n=5000, n_dim=3, df=5.0):
+        mean = np.arange(n_dim, dtype=float)
+        shape = 2.0 * np.eye(n_dim)
+        return multivariate_t(loc=mean, shape=shape, df=df).rvs(n, random_state=0), mean, shape
+
+    def test_fit(self):
+        # Test that the parameters of a Student's t distribution are recovered
+        x, mean, shape = self.make_data()
+        mu, Sigma, nu = fit_mvstud_weighted(x)
+        self.assertTrue(np.allclose(mu, mean, atol=0.1))
+        self.assertTrue(np.allclose(Sigma, shape, atol=0.2))
+        self.assertAlmostEqual(nu, 5.0, delta=0.75)
+
+    def test_weights(self):
+        # Test that integer weights are equivalent to repeated samples
+        x, _, _ = self.make_data(n=1000)
+        weights = np.random.default_rng(0).integers(0, 4, size=len(x))
+        mu_w, Sigma_w, nu_w = fit_mvstud_weighted(x, weights)
+        mu_r, Sigma_r, nu_r = fit_mvstud_weighted(np.repeat(x, weights, axis=0))
+        self.assertTrue(np.allclose(mu_w, mu_r, atol=1e-6))
+        self.assertTrue(np.allclose(Sigma_w, Sigma_r, atol=1e-6))
+        self.assertAlmostEqual(nu_w, nu_r, delta=1e-3 * nu_r)
+
+    def test_warm_start(self):
+        # Test that a warm start converges to the same solution
+        x, _, _ = self.make_data()
+        mu, Sigma, nu = fit_mvstud_weighted(x, tolerance=1e-8)
+        mu_warm, Sigma_warm, nu_warm = fit_mvstud_weighted(x, mu=mu * 1.1, Sigma=Sigma * 0.9, nu=2.0 * nu,
+                                                           tolerance=1e-8)
+        self.assertTrue(np.allclose(mu, mu_warm, atol=1e-4))
+        self.assertTrue(np.allclose(Sigma, Sigma_warm, atol=1e-4))
+        self.assertAlmostEqual(nu, nu_warm, delta=1e-3 * nu)
+
+    def test_gaussian(self):
+        # Test that Gaussian data give large degrees of freedom
+        x = np.random.default_rng(0).standard_normal((5000, 3))
+        _, _, nu = fit_mvstud_weighted(x)
+        self.assertGreater(nu, 50.0)
+
+    def test_gaussian_warm_start(self):
+        # Test that a warm start on shifted and contracted Gaussian data moves to the new fit
+        x = np.random.default_rng(0).standard_normal((5000, 3))
+        mu, Sigma, nu = fit_mvstud_weighted(x)
+        mu, Sigma, nu = fit_mvstud_weighted(0.5 * x + 1.0, mu=mu, Sigma=Sigma, nu=nu)
+        self.assertTrue(np.allclose(mu, 1.0, atol=0.05))
+        self.assertTrue(np.allclose(np.diag(Sigma), 0.25, atol=0.02))
+
+    def test_geometry(self):
+        # Test that the geometry is fitted with weights and warm-started
+        x, mean, _ = self.make_data()
+        weights = np.random.default_rng(0).random(len(x))
+        geometry = Geometry()
+        geometry.fit(x, weights)
+        self.assertTrue(np.allclose(geometry.t_mean, mean, atol=0.1))
+        self.assertTrue(np.isfinite(geometry.t_nu))
+        geometry.fit(x, weights)
+        self.assertTrue(np.allclose(geometry.t_mean, mean, atol=0.1))
+
+    def test_geometry_setstate(self):
+        # Test that a geometry pickled before the mixture and low-rank options were introduced still works
+        x, mean, _ = self.make_data()
+        geometry = Geometry()
+        geometry.fit(x)
+        state = {key: geometry.__dict__[key] for key in ['normal_mean', 'normal_cov', 't_mean', 't_cov', 't_nu']}
+
+        geometry_old = Geometry.__new__(Geometry)
+        geometry_old.__setstate__(state)
+        self.assertEqual(geometry_old.n_components, 1)
+        self.assertEqual(geometry_old.covariance, 'full')
+        self.assertTrue(np.allclose(geometry_old.log_density(x[:10]), geometry.log_density(x[:10])))
+        geometry_old.fit(x)
+        self.assertTrue(np.allclose(geometry_old.t_mean, mean, atol=0.1))
+
+    def test_logpdf(self):
+        # Test the log density against scipy
+        x, mean, shape = self.make_data(n=10)
+        self.assertTrue(np.allclose(mvstud_logpdf(x, mean, shape, 5.0),
+                                    multivariate_t(loc=mean, shape=shape, df=5.0).logpdf(x)))
+
+    @staticmethod
+    def make_bimodal(n=2000, n_dim=3):
+        rng = np.random.default_rng(0)
+        x = rng.standard_normal((n, n_dim))
+        x[:n // 2] -= 5.0
+        x[n // 2:] += 5.0
+        return x
+
+    def test_mixture(self):
+        # Test that the components of a bimodal distribution are recovered
+        np.random.seed(0)
+        x = self.make_bimodal()
+        pi, mu, Sigma, nu, loglike = fit_mixture_mvstud_weighted(x, n_components=2)
+        order = np.argsort(mu[:, 0])
+        self.assertTrue(np.allclose(pi, 0.5, atol=0.05))
+        self.assertTrue(np.allclose(mu[order], [[-5.0] * 3, [5.0] * 3], atol=0.2))
+        self.assertTrue(np.allclose(Sigma, np.eye(3), atol=0.2))
+        self.assertTrue(np.isfinite(loglike))
+
+    def test_geometry_mixture(self):
+        # Test that the number of components is chosen by the BIC
+        np.random.seed(0)
+        geometry = Geometry(max_components=4)
+        geometry.fit(self.make_bimodal())
+        self.assertEqual(geometry.n_components, 2)
+
+        x = np.array([[-5.0] * 3, [5.0] * 3])
+        components = geometry.sample_components(x)
+        self.assertTrue(np.array_equal(components, np.argsort(np.argsort(geometry.mixture_means[:, 0]))))
+        self.assertTrue(np.allclose(geometry.log_density(x), np.log(0.5) + mvstud_logpdf(x, x[0], np.eye(3), 1e6)[0],
+                                    atol=0.2))
+
+        x, _, _ = self.make_data()
+        geometry.fit(x)
+        self.assertEqual(geometry.n_components, 1)
+
+    @staticmethod
+    def make_lowrank(n=20000, n_dim=20, rank=2):
+        rng = np.random.default_rng(0)
+        W = rng.standard_normal((n_dim, rank))
+        D = rng.uniform(0.5, 2.0, n_dim)
+        cov = np.diag(D) + W @ W.T
+        return rng.multivariate_normal(np.zeros(n_dim), cov, size=n), cov
+
+    def test_lowrank_factor(self):
+        # Test that a low-rank plus diagonal covariance matrix is recovered
+        x, cov = self.make_lowrank()
+        D, W = lowrank_factor(x / np.sqrt(len(x)), 2)
+        self.assertEqual(W.shape, (20, 2))
+        self.assertLess(np.max(np.abs(np.diag(D) + W @ W.T - cov)), 0.1 * np.max(np.abs(cov)))
+
+    def test_lowrank_mahalanobis(self):
+        # Test the Woodbury identity against the dense computation
+        x, _ = self.make_lowrank(n=100)
+        D, W = lowrank_factor(x / np.sqrt(len(x)), 3)
+        cov = np.diag(D) + W @ W.T
+        self.assertTrue(np.allclose(lowrank_mahalanobis(x, D, W), np.sum(x * np.linalg.solve(cov, x.T).T, axis=1)))
+
+    def test_lowrank_fit(self):
+        # Test the low-rank Student's t fit and the low-rank geometry
+        x, mean, shape = self.make_data(n_dim=10)
+        mu, D, W, nu = fit_mvstud_lowrank_weighted(x, rank=2)
+        self.assertTrue(np.allclose(mu, mean, atol=0.1))
+        self.assertTrue(np.allclose(np.diag(D) + W @ W.T, shape, atol=0.3))
+        self.assertAlmostEqual(nu, 5.0, delta=1.0)
+
+        geometry = Geometry(covariance="lowrank", rank=2)
+        geometry.fit(x, np.ones(len(x)))
+        self.assertIsNone(geometry.t_cov)
+        D, W = geometry.cov_factor("t")
+        self.assertTrue(np.allclose(np.diag(D) + W @ W.T, shape, atol=0.3))
+        D, W = geometry.cov_factor("normal")
+        self.assertEqual(W.shape, (10, 2))
+
+        with self.assertRaises(ValueError):
+            Geometry(covariance="sparse")
+        with self.assertRaises(ValueError):
+            Geometry(covariance="lowrank", max_components=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+from scipy.stats import norm
+
+from pocomc.termination import ESJDTermination
+from pocomc.sampler import Sampler
+from pocomc.prior import Prior
+
+
+class ESJDTerminationTestCase(unittest.TestCase):
+    def test_independent_draws(self):
+        # Test that a step to an independent draw counts as one independent move
+        np.random.seed(0)
+        termination = ESJDTermination(n_independent=2.0)
+        termination.reset(np.random.randn(10_000, 3) * 2.0)
+
+        self.assertFalse(termination.update(np.random.randn(10_000, 3) * 2.0))
+        self.assertAlmostEqual(np.mean(termination.independent_moves()), 1.0, delta=0.05)
+        self.assertTrue(termination.update(np.random.randn(10_000, 3) * 2.0))
+
+    def test_no_moves(self):
+        # Test that walkers that do not move never reach the target
+        np.random.seed(0)
+        x = np.random.randn(100, 2)
+        termination = ESJDTermination()
+        termination.reset(x)
+        for _ in range(10):
+            self.assertFalse(termination.update(x))
+        self.assertTrue(np.all(termination.independent_moves() == 0.0))
+
+    def test_invalid_statistic(self):
+        with self.assertRaises(ValueError):
+            ESJDTermination(statistic="max")
+
+    def test_sampler(self):
+        # Test that the sampler runs with the ESJD termination policy
+        def log_likelihood(x):
+            return np.sum(-0.5 * np.log(2 * np.pi) - 0.5 * x ** 2, axis=1)
+
+        prior = Prior(2 * [norm(0, 1)])
+        for sample in ['tpcn', 'rwm']:
+            sampler = Sampler(prior, log_likelihood, vectorize=True, sample=sample, termination='esjd',
+                              train_config={'epochs': 1}, random_state=0)
+            sampler.run()
+            samples, weights, _, _ = sampler.posterior()
+            self.assertTrue(np.allclose(np.average(samples, weights=weights, axis=0), 0.0, atol=0.1))
+            self.assertTrue(np.allclose(np.sqrt(np.average(samples ** 2, weights=weights, axis=0)), np.sqrt(0.5), atol=0.1))
+
+        with self.assertRaises(ValueError):
+            Sampler(prior, log_likelihood, vectorize=True, termination='autocorrelation')
+
+
+if __name__ == '__main__':
+    unittest.main()
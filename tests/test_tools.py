@@ -2,7 +2,8 @@ import unittest
 
 import numpy as np
 
-from pocomc.tools import compute_ess
+from pocomc.flow import Flow
+from pocomc.tools import compute_ess, flow_numpy_wrapper
 
 
 class ESSTestCase(unittest.TestCase):
@@ -14,5 +15,43 @@ class ESSTestCase(unittest.TestCase):
         self.assertEqual(compute_ess(np.array([0.0])), 1.0)
 
 
+class FlowNumpyWrapperTestCase(unittest.TestCase):
+    def test_out(self):
+        # Test that results written into provided arrays match the returned arrays
+        np.random.seed(0)
+        flow = flow_numpy_wrapper(Flow(n_dim=3, flow='maf3'))
+        theta = np.random.randn(10, 3)
+
+        u, logdetj = flow.inverse(theta)
+        u_out, logdetj_out = np.empty((10, 3)), np.empty(10)
+        flow.inverse(theta, out=(u_out, logdetj_out))
+        self.assertTrue(np.allclose(u, u_out))
+        self.assertTrue(np.allclose(logdetj, logdetj_out))
+
+        theta_r, logdetj_r = flow.forward(u_out)
+        theta_out, logdetj_r_out = np.empty((10, 3)), np.empty(10)
+        flow.forward(u_out, out=(theta_out, logdetj_r_out))
+        self.assertTrue(np.allclose(theta_r, theta_out))
+        self.assertTrue(np.allclose(logdetj_r, logdetj_r_out))
+        self.assertTrue(np.allclose(theta, theta_out, atol=1e-4))
+
+    def test_staging_buffers(self):
+        # Test that one staging buffer is kept per batch shape and that inputs are not modified
+        np.random.seed(0)
+        flow = flow_numpy_wrapper(Flow(n_dim=3, flow='maf3'))
+        theta = np.random.randn(10, 3)
+        theta_copy = theta.copy()
+
+        u_1, _ = flow.inverse(theta)
+        u_1 = u_1.copy()
+        u_2, _ = flow.inverse(theta + 1.0)
+        flow.inverse(np.random.randn(5, 3))
+
+        self.assertEqual(len(flow.buffers), 2)
+        self.assertTrue(np.array_equal(theta, theta_copy))
+        self.assertFalse(np.allclose(u_1, u_2))
+        self.assertTrue(np.allclose(u_1, flow.inverse(theta)[0]))
+
+
 if __name__ == '__main__':
     unittest.main()